@@ -21,7 +21,16 @@ def create_app(config_name=None):
         r"/api/*": {
             "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+            "expose_headers": [
+                "ETag",
+                "Retry-After",
+                "X-RateLimit-Limit",
+                "X-RateLimit-Remaining",
+                "X-RateLimit-Tokens-Limit",
+                "X-RateLimit-Tokens-Remaining",
+                "X-Queue-Wait-Ms"
+            ]
         }
     })
     
@@ -40,17 +49,39 @@ def create_app(config_name=None):
     def missing_token_callback(error):
         return jsonify({'error': 'Authorization token is missing'}), 401
     
+    @jwt.token_verification_loader
+    def token_scope_callback(jwt_header, jwt_payload):
+        from routes.events import token_allowed_here
+        return token_allowed_here(jwt_payload)
+    
+    @jwt.token_verification_failed_loader
+    def token_scope_failed_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Token not valid for this endpoint'}), 401
+    
     # Initialize database
     init_db(app)
     
     # Register blueprints
-    from routes import auth_bp, books_bp, notes_bp, ai_bp, addons_bp, reminders_bp
+    from routes import auth_bp, books_bp, notes_bp, ai_bp, addons_bp, reminders_bp, admin_bp, events_bp, workspace_bp, sync_bp, collab_bp
     app.register_blueprint(auth_bp)
     app.register_blueprint(books_bp)
     app.register_blueprint(notes_bp)
     app.register_blueprint(ai_bp)
     app.register_blueprint(addons_bp)
     app.register_blueprint(reminders_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(workspace_bp)
+    app.register_blueprint(sync_bp)
+    app.register_blueprint(collab_bp)
+    
+    # Start this worker's reminder scheduler, event tailer and collaboration hub
+    from services.reminder_scheduler import start_reminder_scheduler
+    from services.events import event_broker
+    from services.collab import collab_hub
+    start_reminder_scheduler(app)
+    event_broker.start(app)
+    collab_hub.start(app)
     
     # Health check endpoint
     @app.route('/api/health')
@@ -62,6 +93,10 @@ def create_app(config_name=None):
     def not_found(error):
         return jsonify({'error': 'Not found'}), 404
     
+    @app.errorhandler(413)
+    def too_large(error):
+        return jsonify({'error': 'Request body too large'}), 413
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'error': 'Internal server error'}), 500
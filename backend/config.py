@@ -1,4 +1,5 @@
 """Application configuration."""
+import json
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -18,6 +19,11 @@ class Config:
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
+    JWT_QUERY_STRING_NAME = 'token'  # Only stream tickets, only on the event stream and collab socket (browsers can't set headers)
+    STREAM_TICKET_SECONDS = int(os.getenv('STREAM_TICKET_SECONDS', 60))
+    
+    # Admin endpoints are limited to these (comma-separated) emails
+    ADMIN_EMAILS = [e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()]
     
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
@@ -27,6 +33,95 @@ class Config:
     AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai')
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+    AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv('AI_REQUEST_TIMEOUT_SECONDS', 60))
+    
+    # Per-model pricing overrides for AI cost metrics, USD per million tokens:
+    # {"gpt-4o": [2.5, 10.0]}
+    AI_PRICING = {model: tuple(prices) for model, prices in json.loads(os.getenv('AI_PRICING', '{}')).items()}
+    
+    # Local mock provider for load testing (AI_PROVIDER=mock); never enable in production
+    MOCK_AI_ENABLED = os.getenv('MOCK_AI_ENABLED', 'false').lower() == 'true'
+    MOCK_AI_LATENCY = os.getenv('MOCK_AI_LATENCY', 'lognormal:800,0.5')
+    MOCK_AI_TOKENS_PER_SECOND = float(os.getenv('MOCK_AI_TOKENS_PER_SECOND', 50))
+    MOCK_AI_ERROR_RATE = float(os.getenv('MOCK_AI_ERROR_RATE', 0.0))
+    
+    # AI routing: 'single' or 'hedged' (hedge slow primaries to AI_HEDGE_PROVIDER
+    # once they exceed their recent AI_HEDGE_PERCENTILE latency)
+    AI_ROUTING = os.getenv('AI_ROUTING', 'single')
+    AI_HEDGE_PROVIDER = os.getenv('AI_HEDGE_PROVIDER', 'anthropic')
+    AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', 95))
+    AI_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv('AI_HEDGE_DEFAULT_DELAY_SECONDS', 2.0))
+    
+    # Coalescing of identical in-flight AI requests across workers
+    AI_COALESCE_ACROSS_WORKERS = os.getenv('AI_COALESCE_ACROSS_WORKERS', 'true').lower() == 'true'
+    AI_COALESCE_LEASE_SECONDS = int(os.getenv('AI_COALESCE_LEASE_SECONDS', 60))
+    
+    # AI admission control (token buckets are per worker process)
+    AI_RATE_USER_REQUESTS_PER_MIN = int(os.getenv('AI_RATE_USER_REQUESTS_PER_MIN', 20))
+    AI_RATE_USER_BURST = int(os.getenv('AI_RATE_USER_BURST', 5))
+    AI_RATE_USER_TOKENS_PER_MIN = int(os.getenv('AI_RATE_USER_TOKENS_PER_MIN', 40000))
+    AI_RATE_GLOBAL_REQUESTS_PER_MIN = int(os.getenv('AI_RATE_GLOBAL_REQUESTS_PER_MIN', 300))
+    AI_RATE_GLOBAL_TOKENS_PER_MIN = int(os.getenv('AI_RATE_GLOBAL_TOKENS_PER_MIN', 400000))
+    AI_QUEUE_MAX_WAIT_SECONDS = float(os.getenv('AI_QUEUE_MAX_WAIT_SECONDS', 5))
+    
+    # Note summaries: blocks shorter than this skip the per-block digest step
+    SUMMARY_DIGEST_MIN_CHARS = int(os.getenv('SUMMARY_DIGEST_MIN_CHARS', 600))
+    
+    # Semantic search: 'hashing' (local, no model) or 'sentence-transformers'
+    EMBEDDER = os.getenv('EMBEDDER', 'hashing')
+    EMBEDDER_HASHING_DIM = int(os.getenv('EMBEDDER_HASHING_DIM', 256))
+    EMBEDDER_MODEL = os.getenv('EMBEDDER_MODEL', 'all-MiniLM-L6-v2')
+    # Upper bound on vectors held in memory per worker (least recently searched users are dropped)
+    SEMANTIC_INDEX_MAX_VECTORS = int(os.getenv('SEMANTIC_INDEX_MAX_VECTORS', 200000))
+    
+    # Reminder scheduler (one thread per worker)
+    REMINDER_SCHEDULER_ENABLED = os.getenv('REMINDER_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    REMINDER_SCHEDULER_HORIZON_MINUTES = int(os.getenv('REMINDER_SCHEDULER_HORIZON_MINUTES', 10))
+    REMINDER_SCHEDULER_SCAN_SECONDS = float(os.getenv('REMINDER_SCHEDULER_SCAN_SECONDS', 5))
+    REMINDER_SCHEDULER_RELOAD_SECONDS = float(os.getenv('REMINDER_SCHEDULER_RELOAD_SECONDS', 60))
+    
+    # Push events: capped collection size (shared history for Last-Event-ID replay) and heartbeat
+    EVENTS_CAPPED_BYTES = int(os.getenv('EVENTS_CAPPED_BYTES', 64 * 1024 * 1024))
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 25))
+    
+    # Per-worker user cache; other workers' saves are noticed within one sweep interval
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+    USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+    USER_CACHE_SWEEP_SECONDS = float(os.getenv('USER_CACHE_SWEEP_SECONDS', 2))
+    
+    # Password hashing: bcrypt cost (existing hashes are upgraded on login), pool size, auth concurrency per worker
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    AUTH_MAX_CONCURRENT = int(os.getenv('AUTH_MAX_CONCURRENT', 4))
+    AUTH_QUEUE_TIMEOUT_SECONDS = float(os.getenv('AUTH_QUEUE_TIMEOUT_SECONDS', 5))
+    
+    # Threads per worker for the concurrent reads of GET /api/workspace/bootstrap
+    WORKSPACE_BOOTSTRAP_WORKERS = int(os.getenv('WORKSPACE_BOOTSTRAP_WORKERS', 8))
+    
+    # Tree/listing response cache: redis (shared), memory (per worker, single-worker setups only) or none
+    CACHE_URL = os.getenv('CACHE_URL')
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if CACHE_URL else 'none')
+    CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', 300))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    
+    # Incremental sync: tombstone retention (older clients get a full resync) and page size per kind
+    SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 90))
+    SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 1000))
+    
+    # Collaborative editing: merged canvas write interval, wait for the lease holder's state on join,
+    # relay log size, batch limit, socket keepalive
+    COLLAB_FLUSH_SECONDS = float(os.getenv('COLLAB_FLUSH_SECONDS', 2))
+    COLLAB_SYNC_SECONDS = float(os.getenv('COLLAB_SYNC_SECONDS', 1))
+    COLLAB_OPS_CAPPED_BYTES = int(os.getenv('COLLAB_OPS_CAPPED_BYTES', 64 * 1024 * 1024))
+    COLLAB_MAX_OPS_PER_MESSAGE = int(os.getenv('COLLAB_MAX_OPS_PER_MESSAGE', 500))
+    SOCK_SERVER_OPTIONS = {'ping_interval': 25}
+    
+    # Bulk import: upload size, notes per archive, size per file and notes per insert_many batch
+    IMPORT_MAX_UPLOAD_BYTES = int(os.getenv('IMPORT_MAX_UPLOAD_BYTES', 512 * 1024 * 1024))
+    MAX_CONTENT_LENGTH = IMPORT_MAX_UPLOAD_BYTES  # Largest request body of any kind, enforced while reading (chunked too)
+    IMPORT_MAX_ENTRIES = int(os.getenv('IMPORT_MAX_ENTRIES', 100000))
+    IMPORT_MAX_FILE_BYTES = int(os.getenv('IMPORT_MAX_FILE_BYTES', 5 * 1024 * 1024))
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
 
 
 class DevelopmentConfig(Config):
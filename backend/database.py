@@ -1,5 +1,6 @@
 """MongoDB database connection and utilities."""
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 from pymongo.database import Database
 from flask import current_app, g
 
@@ -28,14 +29,89 @@ def init_db(app):
         
         # User indexes
         db.users.create_index('email', unique=True)
+        db.users.create_index('updated_at')  # User cache invalidation sweeps
         
         # Book indexes
         db.books.create_index('user_id')
         db.books.create_index('parent_id')
         db.books.create_index([('user_id', 1), ('parent_id', 1)])
+        db.books.create_index([('user_id', 1), ('ancestors', 1)])  # Subtree queries on the materialized path
+        db.books.create_index([('user_id', 1), ('parent_id', 1), ('order_key', 1)])
         
         # Note indexes
         db.notes.create_index('user_id')
         db.notes.create_index('book_id')
         db.notes.create_index('parent_id')
         db.notes.create_index([('user_id', 1), ('book_id', 1)])
+        db.notes.create_index([('user_id', 1), ('book_id', 1), ('parent_id', 1), ('order_key', 1)])
+        
+        # Summary digest indexes (content-addressed, expire after 30 days)
+        db.summary_digests.create_index([('user_id', 1), ('key', 1)], unique=True)
+        db.summary_digests.create_index('created_at', expireAfterSeconds=30 * 24 * 3600)
+        
+        # In-flight AI request leases (expired entries are reaped by Mongo)
+        db.ai_inflight.create_index('expires_at', expireAfterSeconds=0)
+        
+        # AI usage rollup indexes
+        db.ai_usage.create_index('day')
+        db.ai_usage.create_index([('user_id', 1), ('day', 1)])
+        
+        # Note embedding indexes (incremental refresh scans by updated_at)
+        db.note_embeddings.create_index([('user_id', 1), ('updated_at', 1)])
+        
+        # MinHash signature indexes (multikey over LSH band keys)
+        db.note_signatures.create_index([('user_id', 1), ('bands', 1)])
+        
+        # Reminder indexes: pending trigger windows (per user and global) and change scans
+        pending = {'notified': False, 'completed': False}
+        db.reminders.create_index([('user_id', 1), ('trigger_at', 1)], partialFilterExpression=pending)
+        db.reminders.create_index('trigger_at', partialFilterExpression=pending)
+        db.reminders.create_index('updated_at')
+        
+        # Backfill trigger_at for reminders saved before it was stored
+        db.reminders.update_many(
+            {'trigger_at': {'$exists': False}},
+            [{'$set': {'trigger_at': {'$subtract': [
+                '$due_date',
+                {'$multiply': [{'$ifNull': ['$early_reminder_minutes', 0]}, 60 * 1000]}
+            ]}}}]
+        )
+        
+        # Push event and collaboration logs: capped so they act as bounded, tailable brokers across workers
+        capped = {'events': app.config['EVENTS_CAPPED_BYTES'], 'collab_ops': app.config['COLLAB_OPS_CAPPED_BYTES']}
+        existing = db.list_collection_names()
+        for name, size in capped.items():
+            if name not in existing:
+                try:
+                    db.create_collection(name, capped=True, size=size)
+                except OperationFailure:
+                    pass  # Another worker created it first
+        db.events.create_index([('user_id', 1), ('_id', 1)])
+        db.collab_leases.create_index('expires_at', expireAfterSeconds=3600)  # Leftovers of crashed workers
+        
+        # Note outline view: parent links plus a string _id, so $graphLookup can walk subtrees
+        if 'note_outline' not in db.list_collection_names():
+            try:
+                db.command('create', 'note_outline', viewOn='notes', pipeline=[
+                    {'$project': {'user_id': 1, 'book_id': 1, 'parent_id': 1, 'sid': {'$toString': '$_id'}}}
+                ])
+            except OperationFailure:
+                pass  # Created concurrently by another worker
+        
+        # Incremental sync: per-collection change scans and expiring tombstones
+        for collection in ('books', 'notes', 'reminders', 'tombstones'):
+            db[collection].create_index([('user_id', 1), ('sync_seq', 1)])
+        db.tombstones.create_index('deleted_at', expireAfterSeconds=app.config['SYNC_TOMBSTONE_DAYS'] * 24 * 3600)
+        
+        # Documents written before sync sequences existed sort first, at sequence 0
+        for collection in ('books', 'notes', 'reminders'):
+            db[collection].update_many({'sync_seq': {'$exists': False}}, {'$set': {'sync_seq': 0}})
+        
+        # Backfill book ancestor paths
+        from models.book import Book
+        Book.backfill_ancestors()
+        
+        # Backfill fractional order keys from the old integer order
+        from models.ordering import backfill_order_keys
+        backfill_order_keys(db.books, ['user_id', 'parent_id'])
+        backfill_order_keys(db.notes, ['user_id', 'book_id', 'parent_id'])
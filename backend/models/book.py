@@ -2,8 +2,12 @@
 from datetime import datetime
 from typing import Optional, List
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from database import get_db
+from .ordering import key_after, reorder
+from .sync import next_seq, record_tombstones
+from services.cache import response_cache, books_namespace
 
 
 class Book:
@@ -22,7 +26,8 @@ class Book:
         icon: Optional[str] = None,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
-        order: int = 0
+        order_key: Optional[str] = None,
+        ancestors: Optional[List[str]] = None
     ):
         self._id = _id or ObjectId()
         self.user_id = user_id
@@ -33,7 +38,8 @@ class Book:
         self.icon = icon or 'book'
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at or datetime.utcnow()
-        self.order = order
+        self.order_key = order_key  # Fractional sibling order key (see models.ordering)
+        self.ancestors = ancestors or []  # Ancestor book IDs, root first (materialized path)
     
     @property
     def id(self) -> str:
@@ -51,7 +57,8 @@ class Book:
             'icon': self.icon,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
-            'order': self.order
+            'order_key': self.order_key,
+            'ancestors': self.ancestors
         }
     
     def to_json(self) -> dict:
@@ -66,7 +73,8 @@ class Book:
             'icon': self.icon,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'order': self.order
+            'order_key': self.order_key,
+            'ancestors': self.ancestors
         }
     
     @classmethod
@@ -82,7 +90,8 @@ class Book:
             icon=data.get('icon'),
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at'),
-            order=data.get('order', 0)
+            order_key=data.get('order_key'),
+            ancestors=data.get('ancestors')
         )
     
     def save(self) -> 'Book':
@@ -91,27 +100,105 @@ class Book:
         self.updated_at = datetime.utcnow()
         db[self.COLLECTION].update_one(
             {'_id': self._id},
-            {'$set': self.to_dict()},
+            {'$set': {**self.to_dict(), 'sync_seq': next_seq(self.user_id)}},
             upsert=True
         )
+        response_cache.invalidate(books_namespace(self.user_id))
+        
+        from services.events import publish_event
+        publish_event(self.user_id, 'book.updated', {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'updated_at': self.updated_at.isoformat()
+        })
         return self
     
     def delete(self) -> bool:
-        """Delete book and all its children (books and notes)."""
+        """Delete book and all its descendants (books and notes)."""
         db = get_db()
         
-        # Recursively delete child books
-        child_books = Book.find_by_parent(self.user_id, self.id)
-        for child in child_books:
-            child.delete()
+        book_ids = [self.id] + [book.id for book in self.find_descendants()]
+        
+        # Delete all notes in this book and its descendants
+        note_ids = db.notes.distinct('_id', {'user_id': self.user_id, 'book_id': {'$in': book_ids}})
+        db.notes.delete_many({'user_id': self.user_id, 'book_id': {'$in': book_ids}})
+        
+        # Delete this book and its descendants
+        result = db[self.COLLECTION].delete_many({
+            'user_id': self.user_id,
+            '_id': {'$in': [ObjectId(book_id) for book_id in book_ids]}
+        })
+        
+        from .note import Note
+        response_cache.invalidate(books_namespace(self.user_id), *Note.listing_namespaces(self.user_id, book_ids))
         
-        # Delete all notes in this book
-        db.notes.delete_many({'book_id': self.id})
+        from services.note_index import remove_notes
+        remove_notes(self.user_id, [str(note_id) for note_id in note_ids])
         
-        # Delete this book
-        result = db[self.COLLECTION].delete_one({'_id': self._id})
+        seq = next_seq(self.user_id)
+        record_tombstones(self.user_id, 'book', book_ids, seq)
+        record_tombstones(self.user_id, 'note', note_ids, seq)
+        
+        from services.events import publish_event
+        publish_event(self.user_id, 'book.deleted', {'id': self.id, 'parent_id': self.parent_id})
         return result.deleted_count > 0
     
+    def find_descendants(self) -> List['Book']:
+        """Find all books below this one (single indexed query on the ancestor path)."""
+        db = get_db()
+        cursor = db[self.COLLECTION].find({'user_id': self.user_id, 'ancestors': self.id})
+        return [Book.from_dict(data) for data in cursor]
+    
+    def breadcrumbs(self) -> List[dict]:
+        """Path from the root book down to this one."""
+        db = get_db()
+        cursor = db[self.COLLECTION].find(
+            {'user_id': self.user_id, '_id': {'$in': [ObjectId(book_id) for book_id in self.ancestors]}},
+            {'name': 1}
+        )
+        names = {str(data['_id']): data['name'] for data in cursor}
+        crumbs = [{'id': book_id, 'name': names[book_id]} for book_id in self.ancestors if book_id in names]
+        crumbs.append({'id': self.id, 'name': self.name})
+        return crumbs
+    
+    def move_to(self, parent: Optional['Book']) -> 'Book':
+        """Move this book (and its subtree) under a new parent, or to the root.
+        
+        The book is appended after its new siblings. Raises ValueError if the
+        move would create a cycle.
+        """
+        if parent is not None and (parent.id == self.id or self.id in parent.ancestors):
+            raise ValueError('Book cannot be moved under itself or its own descendant')
+        
+        new_ancestors = (parent.ancestors + [parent.id]) if parent else []
+        depth = len(self.ancestors)
+        
+        # Re-path the whole subtree: swap the old ancestor prefix for the new one
+        db = get_db()
+        db[self.COLLECTION].update_many(
+            {'user_id': self.user_id, 'ancestors': self.id},
+            [{'$set': {
+                'ancestors': {'$concatArrays': [
+                    new_ancestors,
+                    {'$slice': ['$ancestors', depth, {'$max': [{'$size': '$ancestors'}, 1]}]}
+                ]},
+                'updated_at': datetime.utcnow(),
+                'sync_seq': next_seq(self.user_id)
+            }}]
+        )
+        
+        self.parent_id = parent.id if parent else None
+        self.ancestors = new_ancestors
+        # The old key only ordered the book among its previous siblings
+        last_sibling = db[self.COLLECTION].find_one(
+            {'user_id': self.user_id, 'parent_id': self.parent_id, '_id': {'$ne': self._id}},
+            {'order_key': 1},
+            sort=[('order_key', -1)]
+        )
+        self.order_key = key_after(last_sibling.get('order_key') if last_sibling else None)
+        return self.save()
+    
     @classmethod
     def find_by_id(cls, book_id: str, user_id: str) -> Optional['Book']:
         """Find book by ID (ensures user ownership)."""
@@ -126,7 +213,7 @@ class Book:
     def find_by_user(cls, user_id: str) -> List['Book']:
         """Find all books for a user."""
         db = get_db()
-        cursor = db[cls.COLLECTION].find({'user_id': user_id}).sort('order', 1)
+        cursor = db[cls.COLLECTION].find({'user_id': user_id}).sort([('order_key', 1), ('_id', 1)])
         return [cls.from_dict(data) for data in cursor]
     
     @classmethod
@@ -136,7 +223,7 @@ class Book:
         cursor = db[cls.COLLECTION].find({
             'user_id': user_id,
             'parent_id': parent_id
-        }).sort('order', 1)
+        }).sort([('order_key', 1), ('_id', 1)])
         return [cls.from_dict(data) for data in cursor]
     
     @classmethod
@@ -155,13 +242,22 @@ class Book:
         icon: Optional[str] = None
     ) -> 'Book':
         """Create a new book."""
-        # Get next order value
         db = get_db()
+        
+        # Materialized path: parent's ancestors plus the parent itself
+        ancestors = []
+        if parent_id:
+            parent = db[cls.COLLECTION].find_one({'_id': ObjectId(parent_id), 'user_id': user_id}, {'ancestors': 1})
+            if parent:
+                ancestors = parent.get('ancestors', []) + [parent_id]
+        
+        # Append after the last sibling
         last_book = db[cls.COLLECTION].find_one(
             {'user_id': user_id, 'parent_id': parent_id},
-            sort=[('order', -1)]
+            {'order_key': 1},
+            sort=[('order_key', -1)]
         )
-        next_order = (last_book['order'] + 1) if last_book else 0
+        order_key = key_after(last_book.get('order_key') if last_book else None)
         
         book = cls(
             user_id=user_id,
@@ -170,14 +266,40 @@ class Book:
             description=description,
             color=color,
             icon=icon,
-            order=next_order
+            order_key=order_key,
+            ancestors=ancestors
         )
         return book.save()
     
     @classmethod
-    def get_tree(cls, user_id: str) -> List[dict]:
-        """Get full book tree structure for a user."""
-        all_books = cls.find_by_user(user_id)
+    def reorder(cls, user_id: str, moves: List[dict]) -> dict:
+        """Apply sibling moves in one bulk write; returns the new order key per id."""
+        new_keys = reorder(get_db()[cls.COLLECTION], user_id, moves, {'sync_seq': next_seq(user_id)})
+        response_cache.invalidate(books_namespace(user_id))
+        return new_keys
+    
+    @classmethod
+    def listing(cls, user_id: str) -> List[dict]:
+        """JSON list of all of a user's books (cached per user)."""
+        return response_cache.get_or_build(
+            books_namespace(user_id), 'list', lambda: [book.to_json() for book in cls.find_by_user(user_id)]
+        )
+    
+    @classmethod
+    def get_tree(cls, user_id: str, root_id: Optional[str] = None) -> List[dict]:
+        """Get book tree structure for a user, optionally only below one book (cached per user)."""
+        return response_cache.get_or_build(
+            books_namespace(user_id), f'tree:{root_id or ""}', lambda: cls._build_tree(user_id, root_id)
+        )
+    
+    @classmethod
+    def _build_tree(cls, user_id: str, root_id: Optional[str] = None) -> List[dict]:
+        if root_id:
+            db = get_db()
+            cursor = db[cls.COLLECTION].find({'user_id': user_id, 'ancestors': root_id}).sort([('order_key', 1), ('_id', 1)])
+            all_books = [cls.from_dict(data) for data in cursor]
+        else:
+            all_books = cls.find_by_user(user_id)
         
         # Build tree
         book_map = {book.id: {**book.to_json(), 'children': []} for book in all_books}
@@ -191,3 +313,44 @@ class Book:
                 root_books.append(book_data)
         
         return root_books
+    
+    @classmethod
+    def backfill_ancestors(cls) -> int:
+        """Compute ancestor paths for books saved before paths were stored.
+        
+        Parent cycles left by older versions are broken by making the book a root.
+        """
+        db = get_db()
+        user_ids = db[cls.COLLECTION].distinct('user_id', {'ancestors': {'$exists': False}})
+        
+        updated = 0
+        for user_id in user_ids:
+            parents = {
+                str(data['_id']): data.get('parent_id')
+                for data in db[cls.COLLECTION].find({'user_id': user_id}, {'parent_id': 1})
+            }
+            # Books on a parent cycle become roots
+            for book_id in list(parents):
+                seen = {book_id}
+                parent_id = parents[book_id]
+                while parent_id and parent_id in parents and parent_id not in seen:
+                    seen.add(parent_id)
+                    parent_id = parents[parent_id]
+                if parent_id == book_id:
+                    parents[book_id] = None
+            
+            operations = []
+            for book_id, parent_id in parents.items():
+                path = []
+                while parent_id and parent_id in parents:
+                    path.append(parent_id)
+                    parent_id = parents[parent_id]
+                operations.append(UpdateOne(
+                    {'_id': ObjectId(book_id)},
+                    {'$set': {'ancestors': list(reversed(path)), 'parent_id': parents[book_id]}}
+                ))
+            if operations:
+                db[cls.COLLECTION].bulk_write(operations, ordered=False)
+                response_cache.invalidate(books_namespace(user_id))
+                updated += len(operations)
+        return updated
@@ -1,9 +1,15 @@
 """Note model - spatial notes with canvas data and relationships."""
+import hashlib
+import re
 from datetime import datetime
 from typing import Optional, List
 from bson import ObjectId
+from pymongo import UpdateOne, UpdateMany
 
 from database import get_db
+from .ordering import key_after, reorder
+from .sync import next_seq, record_tombstones
+from services.cache import response_cache, notes_namespace, note_list_namespace
 
 
 class Note:
@@ -11,6 +17,9 @@ class Note:
     
     COLLECTION = 'notes'
     
+    # Read-only view exposing parent links with a string copy of _id ('sid') for $graphLookup
+    OUTLINE_VIEW = 'note_outline'
+    
     def __init__(
         self,
         user_id: str,
@@ -25,7 +34,8 @@ class Note:
         tags: Optional[List[str]] = None,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
-        order: int = 0
+        order_key: Optional[str] = None,
+        text_hash: Optional[str] = None
     ):
         self._id = _id or ObjectId()
         self.user_id = user_id
@@ -39,7 +49,9 @@ class Note:
         self.tags = tags or []
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at or datetime.utcnow()
-        self.order = order
+        self.order_key = order_key  # Fractional sibling order key (see models.ordering)
+        self.text_hash = text_hash  # Hash of plain_text() when the note was last indexed
+        self._saved_tree_state = None  # tree_state() as last stored (None if never stored)
     
     @property
     def id(self) -> str:
@@ -60,7 +72,8 @@ class Note:
             'tags': self.tags,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
-            'order': self.order
+            'order_key': self.order_key,
+            'text_hash': self.text_hash
         }
     
     def to_json(self, include_canvas: bool = True) -> dict:
@@ -77,7 +90,7 @@ class Note:
             'tags': self.tags,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'order': self.order
+            'order_key': self.order_key
         }
         if include_canvas:
             data['canvas_data'] = self.canvas_data
@@ -90,15 +103,19 @@ class Note:
             'title': self.title,
             'parent_id': self.parent_id,
             'book_id': self.book_id,
-            'order': self.order,
+            'order_key': self.order_key,
             'has_children': self.has_children(),
             'linked_count': len(self.linked_note_ids)
         }
     
+    def tree_state(self) -> tuple:
+        """The fields shown in note trees; trees are only invalidated when these change."""
+        return (self.book_id, self.parent_id, self.title, self.order_key, len(self.linked_note_ids))
+    
     @classmethod
     def from_dict(cls, data: dict) -> 'Note':
         """Create Note instance from dictionary."""
-        return cls(
+        note = cls(
             _id=data.get('_id'),
             user_id=data['user_id'],
             book_id=data['book_id'],
@@ -111,18 +128,56 @@ class Note:
             tags=data.get('tags'),
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at'),
-            order=data.get('order', 0)
+            order_key=data.get('order_key'),
+            text_hash=data.get('text_hash')
         )
+        note._saved_tree_state = note.tree_state()
+        return note
+    
+    def plain_text(self) -> str:
+        """Title, content and canvas block text as plain text (for search indexing)."""
+        parts = [self.title, self.content]
+        for block in self.canvas_data.get('blocks', []):
+            if block.get('type') == 'shape':
+                parts.append(block.get('text') or '')
+            else:
+                parts.append(re.sub(r'<[^>]+>', ' ', block.get('content') or ''))
+        return re.sub(r'\s+', ' ', ' '.join(parts)).strip()
+    
+    def compute_text_hash(self) -> str:
+        """Hash of the note's plain text; changes whenever searchable text changes."""
+        return hashlib.sha1(self.plain_text().encode('utf-8')).hexdigest()
     
     def save(self) -> 'Note':
-        """Save note to database."""
+        """Save note to database and re-index it if its text changed."""
         db = get_db()
         self.updated_at = datetime.utcnow()
+        text_hash = self.compute_text_hash()
+        text_changed = text_hash != self.text_hash
+        self.text_hash = text_hash
         db[self.COLLECTION].update_one(
             {'_id': self._id},
-            {'$set': self.to_dict()},
+            {'$set': {**self.to_dict(), 'sync_seq': next_seq(self.user_id)}},
             upsert=True
         )
+        if text_changed:
+            from services.note_index import index_note
+            index_note(self)
+        
+        # Write-through invalidation of the cached listings showing this note
+        namespaces = [note_list_namespace(self.user_id, self.book_id)]
+        if self.tree_state() != self._saved_tree_state:
+            namespaces.append(notes_namespace(self.user_id, self.book_id))
+            self._saved_tree_state = self.tree_state()
+        response_cache.invalidate(*namespaces)
+        
+        from services.events import publish_event
+        publish_event(self.user_id, 'note.updated', {
+            'id': self.id,
+            'book_id': self.book_id,
+            'title': self.title,
+            'updated_at': self.updated_at.isoformat()
+        })
         return self
     
     def delete(self) -> bool:
@@ -130,9 +185,11 @@ class Note:
         db = get_db()
         
         # Remove this note from linked_note_ids of other notes
+        linking_book_ids = db[self.COLLECTION].distinct('book_id', {'user_id': self.user_id, 'linked_note_ids': self.id})
+        seq = next_seq(self.user_id)
         db[self.COLLECTION].update_many(
             {'linked_note_ids': self.id},
-            {'$pull': {'linked_note_ids': self.id}}
+            {'$pull': {'linked_note_ids': self.id}, '$set': {'sync_seq': seq}}
         )
         
         # Recursively delete child notes
@@ -142,8 +199,89 @@ class Note:
         
         # Delete this note
         result = db[self.COLLECTION].delete_one({'_id': self._id})
+        # A fresh sequence: the children above took newer ones than ``seq``
+        record_tombstones(self.user_id, 'note', [self.id])
+        response_cache.invalidate(*self.listing_namespaces(self.user_id, [self.book_id] + linking_book_ids))
+        
+        from services.note_index import remove_note
+        remove_note(self)
+        
+        from services.events import publish_event
+        publish_event(self.user_id, 'note.deleted', {'id': self.id, 'book_id': self.book_id})
         return result.deleted_count > 0
     
+    def find_descendant_ids(self) -> List[str]:
+        """IDs of all notes below this one, found in one $graphLookup over parent_id."""
+        db = get_db()
+        result = list(db[self.COLLECTION].aggregate([
+            {'$match': {'_id': self._id}},
+            {'$graphLookup': {
+                'from': self.OUTLINE_VIEW,
+                'startWith': self.id,
+                'connectFromField': 'sid',
+                'connectToField': 'parent_id',
+                'as': 'descendants',
+                'restrictSearchWithMatch': {'user_id': self.user_id}
+            }},
+            {'$project': {'descendants.sid': 1}}
+        ]))
+        return [doc['sid'] for doc in result[0]['descendants']] if result else []
+    
+    def move_to(self, book_id: str, parent_id: Optional[str] = None) -> List[str]:
+        """Move this note and its whole subtree to another book and/or parent.
+        
+        The note is appended after its new siblings. Descendants keep their
+        parents and are re-homed with a single update_many. Reminders follow
+        automatically since they reference notes by ID. Returns the moved
+        descendant IDs. Raises ValueError if the move would create a cycle.
+        """
+        db = get_db()
+        descendant_ids = self.find_descendant_ids()
+        if parent_id is not None and (parent_id == self.id or parent_id in descendant_ids):
+            raise ValueError('Note cannot be moved under itself or its own descendant')
+        
+        last_sibling = db[self.COLLECTION].find_one(
+            {'user_id': self.user_id, 'book_id': book_id, 'parent_id': parent_id, '_id': {'$ne': self._id}},
+            {'order_key': 1},
+            sort=[('order_key', -1)]
+        )
+        
+        now = datetime.utcnow()
+        seq = next_seq(self.user_id)
+        old_book_id = self.book_id
+        self.book_id = book_id
+        self.parent_id = parent_id
+        self.order_key = key_after(last_sibling.get('order_key') if last_sibling else None)
+        self.updated_at = now
+        
+        operations = [UpdateOne(
+            {'_id': self._id, 'user_id': self.user_id},
+            {'$set': {
+                'book_id': book_id,
+                'parent_id': parent_id,
+                'order_key': self.order_key,
+                'updated_at': now,
+                'sync_seq': seq
+            }}
+        )]
+        if descendant_ids:
+            operations.append(UpdateMany(
+                {'_id': {'$in': [ObjectId(i) for i in descendant_ids]}, 'user_id': self.user_id},
+                {'$set': {'book_id': book_id, 'updated_at': now, 'sync_seq': seq}}
+            ))
+        db[self.COLLECTION].bulk_write(operations)
+        response_cache.invalidate(*self.listing_namespaces(self.user_id, [old_book_id, book_id]))
+        self._saved_tree_state = self.tree_state()
+        
+        from services.events import publish_event
+        publish_event(self.user_id, 'note.moved', {
+            'id': self.id,
+            'book_id': book_id,
+            'parent_id': parent_id,
+            'descendant_ids': descendant_ids
+        })
+        return descendant_ids
+    
     def has_children(self) -> bool:
         """Check if note has child notes."""
         db = get_db()
@@ -188,6 +326,19 @@ class Note:
         })
         return cls.from_dict(data) if data else None
     
+    @classmethod
+    def find_by_ids(cls, user_id: str, note_ids: List[str], book_id: Optional[str] = None) -> List['Note']:
+        """Find several notes by ID in one query, without canvas data."""
+        db = get_db()
+        query = {
+            '_id': {'$in': [ObjectId(note_id) for note_id in note_ids]},
+            'user_id': user_id
+        }
+        if book_id:
+            query['book_id'] = book_id
+        cursor = db[cls.COLLECTION].find(query, {'canvas_data': 0})
+        return [cls.from_dict(data) for data in cursor]
+    
     @classmethod
     def find_by_book(cls, user_id: str, book_id: str) -> List['Note']:
         """Find all notes in a book."""
@@ -195,7 +346,7 @@ class Note:
         cursor = db[cls.COLLECTION].find({
             'user_id': user_id,
             'book_id': book_id
-        }).sort('order', 1)
+        }).sort([('order_key', 1), ('_id', 1)])
         return [cls.from_dict(data) for data in cursor]
     
     @classmethod
@@ -205,7 +356,7 @@ class Note:
         cursor = db[cls.COLLECTION].find({
             'user_id': user_id,
             'parent_id': parent_id
-        }).sort('order', 1)
+        }).sort([('order_key', 1), ('_id', 1)])
         return [cls.from_dict(data) for data in cursor]
     
     @classmethod
@@ -216,7 +367,7 @@ class Note:
             'user_id': user_id,
             'book_id': book_id,
             'parent_id': None
-        }).sort('order', 1)
+        }).sort([('order_key', 1), ('_id', 1)])
         return [cls.from_dict(data) for data in cursor]
     
     @classmethod
@@ -232,15 +383,15 @@ class Note:
         """Create a new note."""
         db = get_db()
         
-        # Get next order value
+        # Append after the last sibling
         query = {'user_id': user_id, 'book_id': book_id}
         if parent_id:
             query['parent_id'] = parent_id
         else:
             query['parent_id'] = None
             
-        last_note = db[cls.COLLECTION].find_one(query, sort=[('order', -1)])
-        next_order = (last_note['order'] + 1) if last_note else 0
+        last_note = db[cls.COLLECTION].find_one(query, {'order_key': 1}, sort=[('order_key', -1)])
+        order_key = key_after(last_note.get('order_key') if last_note else None)
         
         note = cls(
             user_id=user_id,
@@ -249,13 +400,48 @@ class Note:
             parent_id=parent_id,
             content=content,
             canvas_data=canvas_data,
-            order=next_order
+            order_key=order_key
         )
         return note.save()
     
+    @classmethod
+    def reorder(cls, user_id: str, moves: List[dict]) -> dict:
+        """Apply sibling moves in one bulk write; returns the new order key per id."""
+        db = get_db()
+        new_keys = reorder(db[cls.COLLECTION], user_id, moves, {'sync_seq': next_seq(user_id)})
+        book_ids = db[cls.COLLECTION].distinct(
+            'book_id', {'_id': {'$in': [ObjectId(note_id) for note_id in new_keys]}, 'user_id': user_id}
+        )
+        response_cache.invalidate(*cls.listing_namespaces(user_id, book_ids))
+        return new_keys
+    
+    @staticmethod
+    def listing_namespaces(user_id: str, book_ids: List[str]) -> List[str]:
+        """Cache namespaces of the note trees and lists of the given books."""
+        return [
+            namespace
+            for book_id in book_ids
+            for namespace in (notes_namespace(user_id, book_id), note_list_namespace(user_id, book_id))
+        ]
+    
+    @classmethod
+    def listing(cls, user_id: str, book_id: str) -> List[dict]:
+        """JSON list of a book's notes without canvas data (cached per book)."""
+        return response_cache.get_or_build(
+            note_list_namespace(user_id, book_id),
+            'list',
+            lambda: [note.to_json(include_canvas=False) for note in cls.find_by_book(user_id, book_id)]
+        )
+    
     @classmethod
     def get_tree(cls, user_id: str, book_id: str) -> List[dict]:
-        """Get full note tree structure for a book."""
+        """Get full note tree structure for a book (cached per book)."""
+        return response_cache.get_or_build(
+            notes_namespace(user_id, book_id), 'tree', lambda: cls._build_tree(user_id, book_id)
+        )
+    
+    @classmethod
+    def _build_tree(cls, user_id: str, book_id: str) -> List[dict]:
         all_notes = cls.find_by_book(user_id, book_id)
         
         # Build tree
@@ -0,0 +1,257 @@
+"""Fractional order keys for sibling ordering.
+
+Keys are base-62 strings that sort lexicographically (MongoDB's default
+binary string order), and a key can always be generated between any two
+others, so moving or inserting an item rewrites only that item's key.
+This follows the widely used fractional-indexing scheme: a variable-length
+integer part whose length is encoded by its head character ('a'-'z' for
+non-negative, 'A'-'Z' for negative) followed by a fractional part that never
+ends in '0'.
+"""
+import random
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+_SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """A fractional part strictly between a and b (b=None means no upper bound)."""
+    if b is not None and a >= b:
+        raise ValueError(f'{a!r} >= {b!r}')
+    if a[-1:] == DIGITS[0] or (b and b[-1:] == DIGITS[0]):
+        raise ValueError('Fractional part has a trailing zero')
+
+    if b:
+        # Skip the common prefix
+        n = 0
+        while (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    # Adjacent digits
+    if b and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head: str) -> int:
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'Invalid order key head: {head!r}')
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f'Invalid order key: {key!r}')
+    return key[:length]
+
+
+def _validate(key: str) -> None:
+    if not key or key == _SMALLEST_INTEGER:
+        raise ValueError(f'Invalid order key: {key!r}')
+    integer = _integer_part(key)
+    if key[len(integer):][-1:] == DIGITS[0]:
+        raise ValueError(f'Invalid order key: {key!r}')
+
+
+def _increment_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    carry = True
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d == len(DIGITS):
+            digits[i] = DIGITS[0]
+        else:
+            digits[i] = DIGITS[d]
+            carry = False
+            break
+    if not carry:
+        return head + ''.join(digits)
+    if head == 'Z':
+        return 'a' + DIGITS[0]
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    borrow = True
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d == -1:
+            digits[i] = DIGITS[-1]
+        else:
+            digits[i] = DIGITS[d]
+            borrow = False
+            break
+    if not borrow:
+        return head + ''.join(digits)
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """A key sorting strictly between a and b; None means unbounded on that side."""
+    if a is not None:
+        _validate(a)
+    if b is not None:
+        _validate(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'{a!r} >= {b!r}')
+
+    if a is None:
+        if b is None:
+            return 'a' + DIGITS[0]
+        integer_b = _integer_part(b)
+        fraction_b = b[len(integer_b):]
+        if integer_b == _SMALLEST_INTEGER:
+            return integer_b + _midpoint('', fraction_b)
+        if integer_b < b:
+            return integer_b
+        decremented = _decrement_integer(integer_b)
+        if decremented is None:
+            raise ValueError('Cannot decrement any further')
+        return decremented
+
+    integer_a = _integer_part(a)
+    fraction_a = a[len(integer_a):]
+
+    if b is None:
+        incremented = _increment_integer(integer_a)
+        return integer_a + _midpoint(fraction_a, None) if incremented is None else incremented
+
+    integer_b = _integer_part(b)
+    fraction_b = b[len(integer_b):]
+    if integer_a == integer_b:
+        return integer_a + _midpoint(fraction_a, fraction_b)
+    incremented = _increment_integer(integer_a)
+    if incremented is None:
+        raise ValueError('Cannot increment any further')
+    if incremented < b:
+        return incremented
+    return integer_a + _midpoint(fraction_a, None)
+
+
+def keys_between(a: Optional[str], b: Optional[str], n: int) -> List[str]:
+    """n ascending keys strictly between a and b."""
+    if n <= 0:
+        return []
+    if n == 1:
+        return [key_between(a, b)]
+    if b is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(keys[-1], b))
+        return keys
+    if a is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(a, keys[-1]))
+        return list(reversed(keys))
+    mid = n // 2
+    c = key_between(a, b)
+    return keys_between(a, c, mid) + [c] + keys_between(c, b, n - mid - 1)
+
+
+def key_after(last: Optional[str]) -> str:
+    """A key after ``last`` for appending, with a random suffix.
+
+    Two concurrent appends after the same key get distinct keys; the suffix
+    never ends in '0', so the result is still a valid key.
+    """
+    key = key_between(last, None)
+    suffix = ''.join(random.choice(DIGITS) for _ in range(2)) + random.choice(DIGITS[1:])
+    return key + suffix
+
+
+def reorder(collection, user_id: str, moves: List[dict], extra_fields: Optional[dict] = None) -> dict:
+    """Apply drag-and-drop moves to a user's documents in one bulk write.
+
+    Each move is ``{'id', 'after_id', 'before_id'}`` naming the item and its
+    new neighbours (None at either end). Moves are applied in sequence, so a
+    later move may name an earlier moved item as a neighbour. Returns the new
+    key per id; ``extra_fields`` are set on every moved document. Raises
+    LookupError for unknown ids and ValueError for invalid moves (e.g.
+    neighbours out of order).
+    """
+    ids = set()
+    for move in moves:
+        if not move.get('id'):
+            raise ValueError('Each move needs an id')
+        ids.update(i for i in (move['id'], move.get('after_id'), move.get('before_id')) if i)
+    try:
+        object_ids = [ObjectId(i) for i in ids]
+    except (InvalidId, TypeError):
+        raise ValueError('Invalid id in moves')
+
+    keys = {
+        str(doc['_id']): doc.get('order_key')
+        for doc in collection.find({'_id': {'$in': object_ids}, 'user_id': user_id}, {'order_key': 1})
+    }
+    unknown = ids - keys.keys()
+    if unknown:
+        raise LookupError(f'Not found: {", ".join(sorted(unknown))}')
+
+    new_keys = {}
+    for move in moves:
+        after = keys[move['after_id']] if move.get('after_id') else None
+        before = keys[move['before_id']] if move.get('before_id') else None
+        keys[move['id']] = new_keys[move['id']] = key_between(after, before)
+
+    now = datetime.utcnow()
+    collection.bulk_write([
+        UpdateOne({'_id': ObjectId(i), 'user_id': user_id}, {'$set': {'order_key': key, 'updated_at': now, **(extra_fields or {})}})
+        for i, key in new_keys.items()
+    ], ordered=False)
+    return new_keys
+
+
+def backfill_order_keys(collection, group_fields: List[str]) -> None:
+    """Assign keys to documents saved before order keys existed, keeping their integer order."""
+    projection = {field: 1 for field in group_fields + ['order', 'created_at']}
+    groups = {}
+    for doc in collection.find({'order_key': {'$exists': False}}, projection):
+        groups.setdefault(tuple(doc.get(field) for field in group_fields), []).append(doc)
+
+    for group, docs in groups.items():
+        # Legacy siblings go before any that already have keys
+        first = collection.find_one(
+            {**dict(zip(group_fields, group)), 'order_key': {'$exists': True}},
+            {'order_key': 1},
+            sort=[('order_key', 1)]
+        )
+        docs.sort(key=lambda doc: (doc.get('order', 0), doc.get('created_at') or datetime.min))
+        new_keys = keys_between(None, first['order_key'] if first else None, len(docs))
+        collection.bulk_write([
+            UpdateOne({'_id': doc['_id']}, {'$set': {'order_key': key}})
+            for doc, key in zip(docs, new_keys)
+        ], ordered=False)
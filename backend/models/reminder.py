@@ -1,8 +1,11 @@
 """Reminder model for storing user reminders."""
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, DeleteOne
 from database import get_db
+from .sync import next_seq, record_tombstones
 
 
 class Reminder:
@@ -22,6 +25,7 @@ class Reminder:
         completed: bool = False,
         notified: bool = False,
         created_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
         _id: Optional[ObjectId] = None
     ):
         self._id = _id
@@ -35,11 +39,20 @@ class Reminder:
         self.completed = completed
         self.notified = notified
         self.created_at = created_at or datetime.utcnow()
+        self.updated_at = updated_at or self.created_at
+        self.trigger_at = self.compute_trigger_at()
     
     @property
     def id(self) -> str:
         return str(self._id) if self._id else None
     
+    def compute_trigger_at(self) -> datetime:
+        """When the notification should fire (due date minus the early offset), in naive UTC."""
+        due_date = self.due_date
+        if due_date.tzinfo is not None:
+            due_date = due_date.astimezone(timezone.utc).replace(tzinfo=None)
+        return due_date - timedelta(minutes=self.early_reminder_minutes or 0)
+    
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization."""
         return {
@@ -57,8 +70,10 @@ class Reminder:
         }
     
     def save(self) -> 'Reminder':
-        """Save reminder to database."""
+        """Save reminder to database and update this worker's scheduler."""
         db = get_db()
+        self.updated_at = datetime.utcnow()
+        self.trigger_at = self.compute_trigger_at()
         data = {
             'user_id': self.user_id,
             'note_id': self.note_id,
@@ -67,9 +82,12 @@ class Reminder:
             'due_date': self.due_date,
             'raw_text': self.raw_text,
             'early_reminder_minutes': self.early_reminder_minutes,
+            'trigger_at': self.trigger_at,
             'completed': self.completed,
             'notified': self.notified,
             'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'sync_seq': next_seq(self.user_id),
         }
         
         if self._id:
@@ -81,6 +99,8 @@ class Reminder:
             result = db[self.collection_name].insert_one(data)
             self._id = result.inserted_id
         
+        from services.reminder_scheduler import reminder_scheduler
+        reminder_scheduler.track(self)
         return self
     
     def mark_completed(self) -> 'Reminder':
@@ -99,6 +119,10 @@ class Reminder:
             return False
         db = get_db()
         result = db[self.collection_name].delete_one({'_id': self._id})
+        record_tombstones(self.user_id, 'reminder', [self.id])
+        
+        from services.reminder_scheduler import reminder_scheduler
+        reminder_scheduler.untrack(self.id)
         return result.deleted_count > 0
     
     @classmethod
@@ -126,20 +150,121 @@ class Reminder:
     
     @classmethod
     def find_due(cls, before: Optional[datetime] = None) -> list['Reminder']:
-        """Find all due reminders that haven't been notified."""
+        """Find all reminders whose trigger time has passed and that haven't been notified."""
         db = get_db()
         if before is None:
             before = datetime.utcnow()
         
         query = {
-            'due_date': {'$lte': before},
+            'trigger_at': {'$lte': before},
             'completed': False,
             'notified': False,
         }
         
-        reminders = db[cls.collection_name].find(query).sort('due_date', 1)
+        reminders = db[cls.collection_name].find(query).sort('trigger_at', 1)
+        return [cls._from_db(r) for r in reminders]
+    
+    @classmethod
+    def find_triggering(
+        cls,
+        start: datetime,
+        end: datetime,
+        user_id: Optional[str] = None
+    ) -> list['Reminder']:
+        """Find unnotified, incomplete reminders triggering between start and end.
+        
+        Served by the partial trigger_at indexes as a single bounded range scan.
+        """
+        db = get_db()
+        query = {
+            'trigger_at': {'$gte': start, '$lte': end},
+            'completed': False,
+            'notified': False,
+        }
+        if user_id is not None:
+            query['user_id'] = user_id
+        
+        reminders = db[cls.collection_name].find(query).sort('trigger_at', 1)
         return [cls._from_db(r) for r in reminders]
     
+    BULK_OPERATIONS = ('complete', 'notified', 'snooze', 'delete')
+    
+    @classmethod
+    def bulk_apply(
+        cls,
+        user_id: str,
+        reminder_ids: list,
+        operation: str,
+        snooze_minutes: int = 10
+    ) -> dict:
+        """Apply one operation to many of a user's reminders in a single bulk write.
+        
+        Returns a status per id: 'ok', 'not_found' or 'invalid_id'.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        results = {}
+        object_ids = []
+        for reminder_id in reminder_ids:
+            try:
+                object_ids.append(ObjectId(reminder_id))
+            except (InvalidId, TypeError):
+                results[str(reminder_id)] = 'invalid_id'
+        
+        # One ownership check for the whole batch; other users' ids read as not found
+        owned = {
+            str(data['_id']): cls._from_db(data)
+            for data in db[cls.collection_name].find({'_id': {'$in': object_ids}, 'user_id': user_id})
+        }
+        
+        seq = next_seq(user_id)
+        operations = []
+        for object_id in object_ids:
+            reminder = owned.get(str(object_id))
+            if reminder is None:
+                results[str(object_id)] = 'not_found'
+                continue
+            
+            scope = {'_id': object_id, 'user_id': user_id}
+            if operation == 'delete':
+                operations.append(DeleteOne(scope))
+            else:
+                if operation == 'complete':
+                    reminder.completed = True
+                elif operation == 'notified':
+                    reminder.notified = True
+                elif operation == 'snooze':
+                    # Fire again after the snooze, with no early offset
+                    reminder.due_date = now + timedelta(minutes=snooze_minutes)
+                    reminder.early_reminder_minutes = 0
+                    reminder.notified = False
+                reminder.updated_at = now
+                reminder.trigger_at = reminder.compute_trigger_at()
+                operations.append(UpdateOne(scope, {'$set': {
+                    'completed': reminder.completed,
+                    'notified': reminder.notified,
+                    'due_date': reminder.due_date,
+                    'early_reminder_minutes': reminder.early_reminder_minutes,
+                    'trigger_at': reminder.trigger_at,
+                    'updated_at': now,
+                    'sync_seq': seq,
+                }}))
+            results[str(object_id)] = 'ok'
+        
+        if operations:
+            db[cls.collection_name].bulk_write(operations, ordered=False)
+            if operation == 'delete':
+                record_tombstones(user_id, 'reminder', owned, seq)
+        
+        from services.reminder_scheduler import reminder_scheduler
+        for reminder_id, reminder in owned.items():
+            if operation == 'delete':
+                reminder_scheduler.untrack(reminder_id)
+            else:
+                reminder_scheduler.track(reminder)
+        
+        return results
+    
     @classmethod
     def find_by_note(cls, note_id: str) -> list['Reminder']:
         """Find all reminders for a note."""
@@ -162,4 +287,5 @@ class Reminder:
             completed=data.get('completed', False),
             notified=data.get('notified', False),
             created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
         )
@@ -0,0 +1,80 @@
+"""Per-user server sequence for incremental sync.
+
+Every write to a user's books, notes and reminders is stamped with
+``sync_seq`` from a per-user counter, and deletes leave a tombstone carrying
+the sequence of the delete. A client holding the sequence it last synced to
+only needs documents and tombstones stamped after it (see routes.sync).
+Batch writes (moves, reorders, bulk reminder updates) share one sequence.
+
+A write takes its sequence before it commits, so a reader can see sequence
+5 while 4 is still in flight. The counter remembers when recent sequences
+were handed out, and :func:`stable_seq` only vouches for sequences older than
+``COMMIT_WINDOW``, or below every younger one. A write that commits more than
+``COMMIT_WINDOW`` after taking its sequence can be missed by clients that
+synced in between.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from pymongo import ReturnDocument
+
+from database import get_db
+
+COUNTERS = 'sync_counters'
+TOMBSTONES = 'tombstones'
+
+# Longest a write may take between allocating its sequence and committing
+COMMIT_WINDOW = timedelta(seconds=30)
+_WINDOW_MS = int(COMMIT_WINDOW.total_seconds() * 1000)
+
+
+def _open(entries):
+    """Aggregation expression: the allocations in ``entries`` still inside the commit window (server clock)."""
+    return {'$filter': {
+        'input': {'$ifNull': [entries, []]},
+        'cond': {'$gt': ['$$this.at', {'$subtract': ['$$NOW', _WINDOW_MS]}]}
+    }}
+
+
+def next_seq(user_id: str) -> int:
+    """Allocate the user's next sequence number, remembering when it was handed out."""
+    doc = get_db()[COUNTERS].find_one_and_update(
+        {'_id': user_id},
+        [
+            {'$set': {'seq': {'$add': [{'$ifNull': ['$seq', 0]}, 1]}}},
+            {'$set': {'recent': {'$concatArrays': [_open('$recent'), [{'seq': '$seq', 'at': '$$NOW'}]]}}},
+        ],
+        projection={'seq': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['seq']
+
+
+def stable_seq(user_id: str) -> int:
+    """Highest sequence up to which every write has committed (0 if nothing was written yet).
+
+    That is the last allocated sequence, or just below the oldest one handed
+    out within ``COMMIT_WINDOW``.
+    """
+    docs = list(get_db()[COUNTERS].aggregate([
+        {'$match': {'_id': user_id}},
+        {'$project': {'seq': 1, 'open': {'$min': {'$map': {'input': _open('$recent'), 'in': '$$this.seq'}}}}},
+    ]))
+    if not docs:
+        return 0
+    doc = docs[0]
+    return doc['open'] - 1 if doc.get('open') is not None else doc['seq']
+
+
+def record_tombstones(user_id: str, kind: str, ids: Iterable[str], seq: Optional[int] = None) -> None:
+    """Remember deleted ids of one kind ('book', 'note' or 'reminder') for syncing clients."""
+    ids = [str(object_id) for object_id in ids]
+    if not ids:
+        return
+    seq = seq or next_seq(user_id)
+    now = datetime.utcnow()
+    get_db()[TOMBSTONES].insert_many([
+        {'user_id': user_id, 'kind': kind, 'object_id': object_id, 'sync_seq': seq, 'deleted_at': now}
+        for object_id in ids
+    ], ordered=False)
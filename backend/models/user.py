@@ -1,10 +1,88 @@
 """User model."""
-from datetime import datetime
+import copy
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from typing import Optional
 from bson import ObjectId
-import bcrypt
+from flask import current_app, has_app_context
 
 from database import get_db
+from services import passwords
+
+
+class UserCache:
+    """Per-worker LRU/TTL cache of user documents.
+    
+    Saves on this worker write through. Saves on other workers are picked up
+    by a periodic sweep for users whose ``updated_at`` (the version stamp)
+    moved since the last sweep, so entries are at most one sweep interval stale.
+    """
+    
+    # Re-read this much history on each sweep to tolerate small clock skew between workers
+    SWEEP_OVERLAP = timedelta(seconds=2)
+    
+    def __init__(self):
+        self._entries = OrderedDict()  # user_id -> (data, cached_at)
+        self._lock = threading.Lock()
+        self._last_sweep = datetime.utcnow()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0, 'sweeps': 0}
+    
+    @staticmethod
+    def _config(key: str, default):
+        return current_app.config.get(key, default) if has_app_context() else default
+    
+    def _sweep(self, now: datetime) -> None:
+        """Drop users changed by any worker since the last sweep."""
+        if now - self._last_sweep < timedelta(seconds=self._config('USER_CACHE_SWEEP_SECONDS', 2)):
+            return
+        since = self._last_sweep - self.SWEEP_OVERLAP
+        self._last_sweep = now
+        changed = get_db()[User.COLLECTION].find({'updated_at': {'$gt': since}}, {'_id': 1})
+        with self._lock:
+            for data in changed:
+                if self._entries.pop(str(data['_id']), None) is not None:
+                    self.stats['invalidations'] += 1
+            self.stats['sweeps'] += 1
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        """A copy of the cached document, or None on a miss."""
+        now = datetime.utcnow()
+        self._sweep(now)
+        ttl = timedelta(seconds=self._config('USER_CACHE_TTL_SECONDS', 60))
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            data, cached_at = entry
+            if now - cached_at > ttl:
+                del self._entries[user_id]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats['hits'] += 1
+            return copy.deepcopy(data)
+    
+    def put(self, user_id: str, data: dict) -> None:
+        max_entries = self._config('USER_CACHE_MAX_ENTRIES', 10000)
+        with self._lock:
+            self._entries[user_id] = (copy.deepcopy(data), datetime.utcnow())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+    
+    def snapshot(self) -> dict:
+        """Hit-rate statistics for this worker."""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'size': len(self._entries),
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None,
+            }
 
 
 class User:
@@ -82,22 +160,28 @@ class User:
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password using bcrypt."""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash a password using bcrypt (in the password process pool)."""
+        return passwords.hash_password(password)
     
     def check_password(self, password: str) -> bool:
-        """Verify password against stored hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Verify password against stored hash, upgrading it if the bcrypt cost changed."""
+        if not passwords.check_password(password, self.password_hash):
+            return False
+        if passwords.needs_rehash(self.password_hash):
+            self.change_password(password)
+        return True
     
     def save(self) -> 'User':
-        """Save user to database."""
+        """Save user to database and write through to this worker's cache."""
         db = get_db()
         self.updated_at = datetime.utcnow()
+        data = self.to_dict(include_password=True)
         db[self.COLLECTION].update_one(
             {'_id': self._id},
-            {'$set': self.to_dict(include_password=True)},
+            {'$set': data},
             upsert=True
         )
+        user_cache.put(self.id, data)
         return self
     
     def update_settings(self, settings: dict) -> 'User':
@@ -134,9 +218,14 @@ class User:
     
     @classmethod
     def find_by_id(cls, user_id: str) -> Optional['User']:
-        """Find user by ID."""
+        """Find user by ID, served from the per-worker cache when possible."""
+        data = user_cache.get(user_id)
+        if data is not None:
+            return cls.from_dict(data)
         db = get_db()
         data = db[cls.COLLECTION].find_one({'_id': ObjectId(user_id)})
+        if data:
+            user_cache.put(user_id, data)
         return cls.from_dict(data) if data else None
     
     @classmethod
@@ -161,3 +250,6 @@ class User:
         """Check if email already exists."""
         db = get_db()
         return db[cls.COLLECTION].count_documents({'email': email.lower().strip()}) > 0
+
+
+user_cache = UserCache()
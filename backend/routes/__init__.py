@@ -5,5 +5,10 @@ from .notes import notes_bp
 from .ai import ai_bp
 from .addons import addons_bp
 from .reminders import reminders_bp
+from .admin import admin_bp
+from .events import events_bp
+from .workspace import workspace_bp
+from .sync import sync_bp
+from .collab import collab_bp
 
-__all__ = ['auth_bp', 'books_bp', 'notes_bp', 'ai_bp', 'addons_bp', 'reminders_bp']
+__all__ = ['auth_bp', 'books_bp', 'notes_bp', 'ai_bp', 'addons_bp', 'reminders_bp', 'admin_bp', 'events_bp', 'workspace_bp', 'sync_bp', 'collab_bp']
@@ -1,8 +1,9 @@
 """Add-ons routes."""
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from models.user import User
+from services.addon_registry import AddonRegistry
 
 addons_bp = Blueprint('addons', __name__, url_prefix='/api/addons')
 
@@ -174,6 +175,23 @@ AVAILABLE_ADDONS = [
     }
 ]
 
+# Compiled once per worker; responses are memoized per set of active addons
+addon_registry = AddonRegistry(AVAILABLE_ADDONS)
+
+
+def _etag_response(body: bytes, etag: str) -> Response:
+    """Serve a precomputed JSON body, or 304 if the client already has it."""
+    # Werkzeug parses If-None-Match into unquoted tags; weak comparison per RFC 9110
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Depends on the user's active addons, so revalidate on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @addons_bp.route('', methods=['GET'])
 @jwt_required()
 def get_addons():
@@ -183,16 +201,8 @@ def get_addons():
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
-        
-    # Enrich addons with user status
-    addons_with_status = []
-    for addon in AVAILABLE_ADDONS:
-        addon_data = addon.copy()
-        # Always-active addons are always enabled
-        addon_data['enabled'] = addon.get('is_always_active') or addon['id'] in user.active_addons
-        addons_with_status.append(addon_data)
-        
-    return jsonify(addons_with_status), 200
+    
+    return _etag_response(*addon_registry.catalog(user.active_addons))
 
 @addons_bp.route('/<addon_id>/enable', methods=['POST'])
 @jwt_required()
@@ -205,7 +215,7 @@ def enable_addon(addon_id):
         return jsonify({'error': 'User not found'}), 404
     
     # Verify addon exists
-    if not any(a['id'] == addon_id for a in AVAILABLE_ADDONS):
+    if not addon_registry.exists(addon_id):
         return jsonify({'error': 'Add-on not found'}), 404
         
     user.enable_addon(addon_id)
@@ -235,37 +245,4 @@ def get_addon_commands():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    templates = []
-    actions = []
-    ui_components = []
-    
-    for addon in AVAILABLE_ADDONS:
-        # Include if always active OR if user has enabled it
-        if addon.get('is_always_active') or addon['id'] in user.active_addons:
-            # Add templates with addon context
-            for template in addon.get('templates', []):
-                templates.append({
-                    **template,
-                    'addon_id': addon['id'],
-                    'addon_name': addon['name']
-                })
-            # Add actions with addon context
-            for action in addon.get('actions', []):
-                actions.append({
-                    **action,
-                    'addon_id': addon['id'],
-                    'addon_name': addon['name']
-                })
-            # Add UI components with addon context
-            for component in addon.get('ui_components', []):
-                ui_components.append({
-                    **component,
-                    'addon_id': addon['id'],
-                    'addon_name': addon['name']
-                })
-    
-    return jsonify({
-        'templates': templates,
-        'actions': actions,
-        'ui_components': ui_components
-    }), 200
+    return _etag_response(*addon_registry.commands(user.active_addons))
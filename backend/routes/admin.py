@@ -0,0 +1,63 @@
+"""Admin routes - operational metrics."""
+import os
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from models import User
+from models.user import user_cache
+from services.ai_metrics import usage_recorder
+from services.cache import response_cache
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+
+def admin_required(view):
+    """Restrict a JWT-protected view to users listed in ADMIN_EMAILS."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = User.find_by_id(get_jwt_identity())
+        if not user or user.email not in current_app.config.get('ADMIN_EMAILS', []):
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route('/ai-usage', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_ai_usage():
+    """Get AI usage aggregated by action, user, model, provider or day."""
+    group_by = request.args.get('group_by', 'action')
+    
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    
+    if not 1 <= days <= 90:
+        return jsonify({'error': 'days must be between 1 and 90'}), 400
+    
+    try:
+        usage = usage_recorder.summary(days=days, group_by=group_by)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'days': days,
+        'group_by': group_by,
+        'usage': usage
+    }), 200
+
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cache_stats():
+    """Get hit-rate statistics for the user and response caches of the worker serving this request."""
+    return jsonify({
+        'pid': os.getpid(),
+        'user_cache': user_cache.snapshot(),
+        'response_cache': response_cache.snapshot()
+    }), 200
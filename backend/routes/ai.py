@@ -2,7 +2,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from services import AIService
+from services import AIService, NoteSummarizer
+from services.admission import ai_admission
 from models import User
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
@@ -10,6 +11,7 @@ ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
 @ai_bp.route('/transform', methods=['POST'])
 @jwt_required()
+@ai_admission
 def transform_text():
     """Transform text using AI."""
     user_id = get_jwt_identity()
@@ -54,6 +56,7 @@ def get_actions():
 
 @ai_bp.route('/summarize-note', methods=['POST'])
 @jwt_required()
+@ai_admission
 def summarize_note():
     """Summarize an entire note including all canvas elements."""
     user_id = get_jwt_identity()
@@ -68,75 +71,17 @@ def summarize_note():
     if not blocks:
         return jsonify({'error': 'No content to summarize'}), 400
     
-    # Build structured content from canvas elements
-    content_parts = []
-    content_parts.append(f"Note Title: {note_title}\n")
-    
-    # Separate text blocks and shapes
-    text_blocks = []
-    shapes = []
-    
-    for block in blocks:
-        if block.get('type') == 'shape':
-            shapes.append(block)
-        else:
-            text_blocks.append(block)
-    
-    # Sort by position (top to bottom, left to right) for logical reading order
-    def sort_key(b):
-        x = b.get('x', 0) or b.get('position', {}).get('x', 0)
-        y = b.get('y', 0) or b.get('position', {}).get('y', 0)
-        return (y // 100, x // 100)  # Group by approximate rows
-    
-    text_blocks.sort(key=sort_key)
-    shapes.sort(key=sort_key)
-    
-    # Add text blocks content
-    if text_blocks:
-        content_parts.append("=== Text Content ===")
-        for i, block in enumerate(text_blocks, 1):
-            content = block.get('content', '').strip()
-            if content:
-                # Strip HTML tags for cleaner summary input
-                import re
-                clean_content = re.sub(r'<[^>]+>', ' ', content)
-                clean_content = re.sub(r'\s+', ' ', clean_content).strip()
-                if clean_content:
-                    content_parts.append(f"Text Block {i}: {clean_content}")
-    
-    # Add shapes with labels
-    labeled_shapes = [s for s in shapes if s.get('text')]
-    if labeled_shapes:
-        content_parts.append("\n=== Diagram Elements ===")
-        for shape in labeled_shapes:
-            shape_type = shape.get('shapeType', 'shape')
-            label = shape.get('text', '')
-            content_parts.append(f"- {shape_type.capitalize()} labeled: \"{label}\"")
-    
-    # Add shape connections context (arrows)
-    arrows = [s for s in shapes if s.get('shapeType') in ('line', 'arrow')]
-    if arrows:
-        content_parts.append(f"\n(Note: Contains {len(arrows)} connecting line(s)/arrow(s) between elements)")
-    
-    structured_content = '\n'.join(content_parts)
-    
     # Get user's preferred AI provider
     user = User.find_by_id(user_id)
     provider = user.settings.get('ai_provider') if user else None
     
     try:
-        result = AIService.transform(structured_content, 'summarize_note', None, provider)
-        
-        # Clean up any markdown code block wrappers the LLM might add
-        import re
-        cleaned_result = result.strip()
-        # Remove ```html ... ``` or ``` ... ``` wrappers
-        cleaned_result = re.sub(r'^```(?:html)?\s*\n?', '', cleaned_result)
-        cleaned_result = re.sub(r'\n?```\s*$', '', cleaned_result)
-        cleaned_result = cleaned_result.strip()
+        # Only blocks that changed since the last summary are re-digested
+        summarizer = NoteSummarizer(user_id, provider)
+        summary = summarizer.summarize(note_title, blocks)
         
         return jsonify({
-            'summary': cleaned_result,
+            'summary': summary,
             'title': note_title
         }), 200
     except ValueError as e:
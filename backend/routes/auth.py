@@ -9,11 +9,13 @@ from flask_jwt_extended import (
 from email_validator import validate_email, EmailNotValidError
 
 from models import User
+from services.passwords import auth_concurrency_limit
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 
 @auth_bp.route('/register', methods=['POST'])
+@auth_concurrency_limit
 def register():
     """Register a new user."""
     data = request.get_json()
@@ -62,6 +64,7 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@auth_concurrency_limit
 def login():
     """Login user and return JWT token."""
     data = request.get_json()
@@ -1,8 +1,12 @@
 """Book routes - CRUD operations for books."""
-from flask import Blueprint, request, jsonify
+from urllib.parse import quote
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from models import Book
+from services.exporter import EXPORT_FORMATS, export_book, export_filename
+from services.importer import import_archive
 
 books_bp = Blueprint('books', __name__, url_prefix='/api/books')
 
@@ -12,16 +16,15 @@ books_bp = Blueprint('books', __name__, url_prefix='/api/books')
 def get_books():
     """Get all books for current user (flat list)."""
     user_id = get_jwt_identity()
-    books = Book.find_by_user(user_id)
-    return jsonify({'books': [book.to_json() for book in books]}), 200
+    return jsonify({'books': Book.listing(user_id)}), 200
 
 
 @books_bp.route('/tree', methods=['GET'])
 @jwt_required()
 def get_books_tree():
-    """Get books as hierarchical tree structure."""
+    """Get books as hierarchical tree structure (optionally only below root_id)."""
     user_id = get_jwt_identity()
-    tree = Book.get_tree(user_id)
+    tree = Book.get_tree(user_id, request.args.get('root_id'))
     return jsonify({'books': tree}), 200
 
 
@@ -102,12 +105,9 @@ def update_book(book_id):
     if 'icon' in data:
         book.icon = data['icon']
     
-    if 'parent_id' in data:
+    if 'parent_id' in data and data['parent_id'] != book.parent_id:
         new_parent_id = data['parent_id']
-        
-        # Prevent circular reference
-        if new_parent_id == book.id:
-            return jsonify({'error': 'Book cannot be its own parent'}), 400
+        parent = None
         
         # Validate new parent exists
         if new_parent_id:
@@ -115,12 +115,13 @@ def update_book(book_id):
             if not parent:
                 return jsonify({'error': 'Parent book not found'}), 404
         
-        book.parent_id = new_parent_id
-    
-    if 'order' in data:
-        book.order = data['order']
-    
-    book.save()
+        # Prevent circular reference (moving under itself or a descendant)
+        try:
+            book.move_to(parent)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        book.save()
     
     return jsonify({
         'message': 'Book updated',
@@ -156,3 +157,104 @@ def get_book_children(book_id):
     
     children = Book.find_by_parent(user_id, book_id)
     return jsonify({'books': [child.to_json() for child in children]}), 200
+
+
+@books_bp.route('/<book_id>/breadcrumbs', methods=['GET'])
+@jwt_required()
+def get_book_breadcrumbs(book_id):
+    """Get the path from the root book down to a specific book."""
+    user_id = get_jwt_identity()
+    book = Book.find_by_id(book_id, user_id)
+    
+    if not book:
+        return jsonify({'error': 'Book not found'}), 404
+    
+    return jsonify({'breadcrumbs': book.breadcrumbs()}), 200
+
+
+@books_bp.route('/<book_id>/export', methods=['GET'])
+@jwt_required()
+def export_book_archive(book_id):
+    """Stream a zip of a book, its sub-books and their notes as Markdown, text or JSON."""
+    user_id = get_jwt_identity()
+    book = Book.find_by_id(book_id, user_id)
+    
+    if not book:
+        return jsonify({'error': 'Book not found'}), 404
+    
+    export_format = request.args.get('format', 'md')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    filename = export_filename(book, export_format)
+    ascii_filename = filename.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    chunks = (chunk for chunk in export_book(book, export_format) if chunk)
+    return Response(stream_with_context(chunks), mimetype='application/zip', headers={
+        'Content-Disposition': f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{quote(filename)}",
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@books_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_books():
+    """Import a zip of Markdown, text or JSON files (multipart ``file``) as books and notes.
+
+    Folders become books and files become notes; an export archive imports
+    back as the same structure. With ``book_id`` everything lands inside that
+    book, otherwise at the root.
+    """
+    user_id = get_jwt_identity()
+    
+    # Declared sizes are refused before reading; MAX_CONTENT_LENGTH cuts off chunked uploads while parsing
+    max_bytes = current_app.config.get('IMPORT_MAX_UPLOAD_BYTES', 512 * 1024 * 1024)
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({'error': f'Archives may be at most {max_bytes // (1024 * 1024)} MB'}), 413
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'A zip file is required'}), 400
+    
+    target = None
+    book_id = request.form.get('book_id')
+    if book_id:
+        target = Book.find_by_id(book_id, user_id)
+        if not target:
+            return jsonify({'error': 'Book not found'}), 404
+    
+    fallback_name = upload.filename.rsplit('/', 1)[-1].rsplit('.', 1)[0].strip() or 'Imported notes'
+    try:
+        result = import_archive(upload.stream, user_id, target, fallback_name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'message': 'Import complete', **result}), 201
+
+
+@books_bp.route('/reorder', methods=['POST'])
+@jwt_required()
+def reorder_books():
+    """Move books between new neighbours, applying all moves in one bulk write.
+    
+    Body: {"moves": [{"id": ..., "after_id": ... or null, "before_id": ... or null}]}
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    moves = data.get('moves')
+    
+    if not isinstance(moves, list) or not moves:
+        return jsonify({'error': 'moves must be a non-empty list'}), 400
+    
+    if len(moves) > 500:
+        return jsonify({'error': 'At most 500 moves per request'}), 400
+    
+    try:
+        order_keys = Book.reorder(user_id, moves)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        # Typically stale neighbours; the client should refetch and retry
+        return jsonify({'error': f'Invalid move: {str(e)}'}), 409
+    
+    return jsonify({'order_keys': order_keys}), 200
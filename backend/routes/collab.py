@@ -0,0 +1,79 @@
+"""Collaboration routes - WebSocket for live canvas editing."""
+import json
+import threading
+
+from bson import ObjectId
+from flask import Blueprint, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+
+from models import Note
+from services.collab import collab_hub
+
+collab_bp = Blueprint('collab', __name__, url_prefix='/api/collab')
+sock = Sock()
+
+
+def _encode(message: dict) -> str:
+    return json.dumps(message, default=str, separators=(',', ':'))
+
+
+def _send_loop(ws, connection) -> None:
+    """Single writer for the socket: drains the editor's queue until it closes."""
+    while not connection.closed:
+        message = connection.get(timeout=1)
+        if message is None:
+            continue
+        try:
+            ws.send(_encode(message))
+        except ConnectionClosed:
+            break
+
+
+@sock.route('/notes/<note_id>', bp=collab_bp)
+def collaborate(ws, note_id):
+    """Edit a note's canvas together with its other open editors.
+
+    Browsers cannot set headers on WebSockets, so a stream ticket (POST
+    /api/events/ticket) is passed as ?token=. The server sends a ``snapshot`` first, then ``ops`` merged from
+    other editors; clients send ``{"type": "ops", "ops": [...]}`` (see
+    services.collab for the operation format) and get an ``ack`` back.
+    """
+    try:
+        verify_jwt_in_request(locations=['query_string'])
+        user_id = get_jwt_identity()
+    except Exception:
+        ws.send(_encode({'type': 'error', 'error': 'Invalid or missing token'}))
+        return
+
+    note = Note.find_by_id(note_id, user_id) if ObjectId.is_valid(note_id) else None
+    if not note:
+        ws.send(_encode({'type': 'error', 'error': 'Note not found'}))
+        return
+
+    max_ops = current_app.config.get('COLLAB_MAX_OPS_PER_MESSAGE', 500)
+    session, connection = collab_hub.join(note, user_id)
+    sender = threading.Thread(target=_send_loop, args=(ws, connection), name='collab-send', daemon=True)
+    sender.start()
+
+    try:
+        while True:
+            raw = ws.receive()
+            try:
+                message = json.loads(raw)
+            except (TypeError, ValueError):
+                connection.put({'type': 'error', 'error': 'Messages must be JSON'})
+                continue
+
+            ops = message.get('ops') if isinstance(message, dict) and message.get('type') == 'ops' else None
+            if not isinstance(ops, list):
+                connection.put({'type': 'error', 'error': 'Expected {"type": "ops", "ops": [...]}'})
+            elif len(ops) > max_ops:
+                connection.put({'type': 'error', 'error': f'At most {max_ops} operations per message'})
+            else:
+                applied = collab_hub.submit(session, connection, ops)
+                connection.put({'type': 'ack', 'received': len(ops), 'applied': applied, 'clock': session.clock})
+    finally:
+        collab_hub.leave(session, connection)
+        sender.join(timeout=2)
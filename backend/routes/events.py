@@ -0,0 +1,83 @@
+"""Push routes - server-sent event stream per user."""
+import json
+from datetime import timedelta
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
+
+from services.events import event_broker
+
+events_bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+# Claim marking stream tickets, and the only views that accept them
+STREAM_SCOPE = 'stream'
+STREAM_ENDPOINTS = {'events.stream_events', 'collab.collaborate'}
+
+
+def token_allowed_here(jwt_payload: dict) -> bool:
+    """Stream tickets only open streams; regular tokens are never taken from the query string.
+
+    Query strings end up in access logs, so only short-lived tickets may be
+    passed there.
+    """
+    if jwt_payload.get('scope') == STREAM_SCOPE:
+        return request.endpoint in STREAM_ENDPOINTS
+    from_query = 'Authorization' not in request.headers and current_app.config['JWT_QUERY_STRING_NAME'] in request.args
+    return not from_query
+
+
+def _format(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+@events_bp.route('/ticket', methods=['POST'])
+@jwt_required()
+def create_stream_ticket():
+    """Short-lived ticket to pass as ?token= to the event stream or collab socket."""
+    user_id = get_jwt_identity()
+    seconds = current_app.config.get('STREAM_TICKET_SECONDS', 60)
+    ticket = create_access_token(
+        identity=user_id,
+        expires_delta=timedelta(seconds=seconds),
+        additional_claims={'scope': STREAM_SCOPE}
+    )
+    return jsonify({'ticket': ticket, 'expires_in': seconds}), 200
+
+
+@events_bp.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    """Stream reminder and note/book change events to the current user.
+
+    EventSource cannot set headers, so a stream ticket may be passed as
+    ?token=. Reconnecting clients send Last-Event-ID and receive the events
+    they missed; tickets expire, so clients reconnecting with a new ticket
+    pass the last id as ?last_event_id= instead.
+    """
+    user_id = get_jwt_identity()
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT_SECONDS', 25)
+
+    subscription = event_broker.subscribe(user_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    missed = event_broker.replay(user_id, last_event_id) if last_event_id else []
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            for event in missed:
+                yield _format(event)
+            replayed = {event['id'] for event in missed}
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    # Comment lines keep proxies from closing idle connections
+                    yield ': ping\n\n'
+                elif event['id'] not in replayed:
+                    yield _format(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -4,6 +4,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 
 from models import Note, Book
+from services.collab import collab_hub
+from services.note_index import semantic_index, signature_index, ensure_backfilled
 
 notes_bp = Blueprint('notes', __name__, url_prefix='/api/notes')
 
@@ -20,13 +22,13 @@ def get_notes():
         book = Book.find_by_id(book_id, user_id)
         if not book:
             return jsonify({'error': 'Book not found'}), 404
-        notes = Note.find_by_book(user_id, book_id)
-    else:
-        # Get all notes (for search, etc.)
-        from database import get_db
-        db = get_db()
-        cursor = db.notes.find({'user_id': user_id}).sort('updated_at', -1).limit(100)
-        notes = [Note.from_dict(data) for data in cursor]
+        return jsonify({'notes': Note.listing(user_id, book_id)}), 200
+    
+    # Get all notes (for search, etc.)
+    from database import get_db
+    db = get_db()
+    cursor = db.notes.find({'user_id': user_id}).sort('updated_at', -1).limit(100)
+    notes = [Note.from_dict(data) for data in cursor]
     
     return jsonify({'notes': [note.to_json(include_canvas=False) for note in notes]}), 200
 
@@ -133,6 +135,9 @@ def update_note(note_id):
         note.content = data['content']
     
     if 'canvas_data' in data:
+        conflict = _live_canvas_conflict(note)
+        if conflict:
+            return conflict
         note.canvas_data = data['canvas_data']
     
     if 'tags' in data:
@@ -141,30 +146,16 @@ def update_note(note_id):
     if 'annotations' in data:
         note.annotations = data['annotations']
     
-    if 'parent_id' in data:
-        new_parent_id = data['parent_id']
-        
-        # Prevent circular reference
-        if new_parent_id == note.id:
-            return jsonify({'error': 'Note cannot be its own parent'}), 400
-        
-        # Validate new parent exists
-        if new_parent_id:
-            parent = Note.find_by_id(new_parent_id, user_id)
-            if not parent:
-                return jsonify({'error': 'Parent note not found'}), 404
+    if 'parent_id' in data or 'book_id' in data:
+        new_book_id = data.get('book_id', note.book_id)
+        # Moving to another book without a parent lands at its root
+        default_parent_id = note.parent_id if new_book_id == note.book_id else None
+        new_parent_id = data.get('parent_id', default_parent_id)
         
-        note.parent_id = new_parent_id
-    
-    if 'book_id' in data:
-        new_book_id = data['book_id']
-        book = Book.find_by_id(new_book_id, user_id)
-        if not book:
-            return jsonify({'error': 'Book not found'}), 404
-        note.book_id = new_book_id
-    
-    if 'order' in data:
-        note.order = data['order']
+        if (new_book_id, new_parent_id) != (note.book_id, note.parent_id):
+            _, error = _move_note(note, user_id, new_book_id, new_parent_id)
+            if error:
+                return error
     
     note.save()
     
@@ -174,6 +165,59 @@ def update_note(note_id):
     }), 200
 
 
+def _live_canvas_conflict(note: Note):
+    """409 if the note is open for live editing, whose merged canvas would overwrite a full-canvas save."""
+    if collab_hub.is_live(note.id):
+        return jsonify({
+            'error': 'Note is being edited live; send changes over the collaboration socket'
+        }), 409
+    return None
+
+
+def _move_note(note: Note, user_id: str, book_id: str, parent_id):
+    """Move a note with its subtree; returns (moved descendant IDs, error response)."""
+    book = Book.find_by_id(book_id, user_id)
+    if not book:
+        return [], (jsonify({'error': 'Book not found'}), 404)
+    
+    if parent_id:
+        parent = Note.find_by_id(parent_id, user_id)
+        if not parent:
+            return [], (jsonify({'error': 'Parent note not found'}), 404)
+        if parent.book_id != book_id:
+            return [], (jsonify({'error': 'Parent note is in a different book'}), 400)
+    
+    try:
+        return note.move_to(book_id, parent_id or None), None
+    except ValueError as e:
+        return [], (jsonify({'error': str(e)}), 400)
+
+
+@notes_bp.route('/<note_id>/move', methods=['POST'])
+@jwt_required()
+def move_note(note_id):
+    """Move a note and all of its descendants to a target book and parent."""
+    user_id = get_jwt_identity()
+    note = Note.find_by_id(note_id, user_id)
+    
+    if not note:
+        return jsonify({'error': 'Note not found'}), 404
+    
+    data = request.get_json() or {}
+    book_id = data.get('book_id', note.book_id)
+    parent_id = data.get('parent_id')
+    
+    moved_ids, error = _move_note(note, user_id, book_id, parent_id)
+    if error:
+        return error
+    
+    return jsonify({
+        'message': 'Note moved',
+        'note': note.to_json(include_canvas=False),
+        'moved_descendants': moved_ids
+    }), 200
+
+
 @notes_bp.route('/<note_id>/canvas', methods=['PUT'])
 @jwt_required()
 def update_canvas(note_id):
@@ -190,6 +234,10 @@ def update_canvas(note_id):
     if canvas_data is None:
         return jsonify({'error': 'Canvas data is required'}), 400
     
+    conflict = _live_canvas_conflict(note)
+    if conflict:
+        return conflict
+    
     note.update_canvas(canvas_data)
     
     return jsonify({
@@ -213,6 +261,44 @@ def delete_note(note_id):
     return jsonify({'message': 'Note deleted'}), 200
 
 
+@notes_bp.route('/<note_id>/similar', methods=['GET'])
+@jwt_required()
+def get_similar_notes(note_id):
+    """Find near-duplicates of a note and suggest notes to link."""
+    user_id = get_jwt_identity()
+    note = Note.find_by_id(note_id, user_id)
+    
+    if not note:
+        return jsonify({'error': 'Note not found'}), 404
+    
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    ensure_backfilled(user_id)
+    scores = dict(signature_index.similar(note, limit))
+    
+    candidates = Note.find_by_ids(user_id, list(scores))
+    candidates.sort(key=lambda candidate: scores[candidate.id], reverse=True)
+    
+    duplicates = []
+    suggestions = []
+    for candidate in candidates:
+        summary = {
+            'id': candidate.id,
+            'title': candidate.title,
+            'book_id': candidate.book_id,
+            'similarity': round(scores[candidate.id], 3)
+        }
+        if scores[candidate.id] >= signature_index.DUPLICATE_THRESHOLD:
+            duplicates.append(summary)
+        elif candidate.id not in note.linked_note_ids:
+            suggestions.append(summary)
+    
+    return jsonify({
+        'duplicates': duplicates,
+        'link_suggestions': suggestions
+    }), 200
+
+
 @notes_bp.route('/<note_id>/link', methods=['POST'])
 @jwt_required()
 def add_link(note_id):
@@ -335,3 +421,59 @@ def search_notes():
     notes = Note.search(user_id, query, book_id)
     
     return jsonify({'notes': [note.to_json(include_canvas=False) for note in notes]}), 200
+
+
+@notes_bp.route('/semantic-search', methods=['GET'])
+@jwt_required()
+def semantic_search_notes():
+    """Search notes by meaning rather than exact words."""
+    user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    book_id = request.args.get('book_id')
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    
+    # Over-fetch when filtering by book, since the vector index spans all books
+    matches = semantic_index.search(user_id, query, k=limit * 4 if book_id else limit)
+    scores = dict(matches)
+    
+    notes = Note.find_by_ids(user_id, list(scores), book_id)
+    notes.sort(key=lambda note: scores[note.id], reverse=True)
+    
+    results = []
+    for note in notes[:limit]:
+        note_json = note.to_json(include_canvas=False)
+        note_json['score'] = round(scores[note.id], 4)
+        results.append(note_json)
+    
+    return jsonify({'notes': results}), 200
+
+
+@notes_bp.route('/reorder', methods=['POST'])
+@jwt_required()
+def reorder_notes():
+    """Move notes between new neighbours, applying all moves in one bulk write.
+    
+    Body: {"moves": [{"id": ..., "after_id": ... or null, "before_id": ... or null}]}
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    moves = data.get('moves')
+    
+    if not isinstance(moves, list) or not moves:
+        return jsonify({'error': 'moves must be a non-empty list'}), 400
+    
+    if len(moves) > 500:
+        return jsonify({'error': 'At most 500 moves per request'}), 400
+    
+    try:
+        order_keys = Note.reorder(user_id, moves)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        # Typically stale neighbours; the client should refetch and retry
+        return jsonify({'error': f'Invalid move: {str(e)}'}), 409
+    
+    return jsonify({'order_keys': order_keys}), 200
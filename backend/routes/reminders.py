@@ -1,10 +1,12 @@
 """Reminders API routes."""
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Reminder
 from services.ai_service import AIService
+from services.reminder_scheduler import reminder_scheduler
+from services.reminder_parser import parse_reminder_locally, MIN_CONFIDENCE as LOCAL_PARSE_MIN_CONFIDENCE
 
 reminders_bp = Blueprint('reminders', __name__, url_prefix='/api/reminders')
 
@@ -66,7 +68,7 @@ def create_reminder():
 @reminders_bp.route('/parse', methods=['POST'])
 @jwt_required()
 def parse_reminder():
-    """Parse reminder text using LLM and create a reminder."""
+    """Parse reminder text (locally, falling back to the LLM) and create a reminder."""
     current_user_id = get_jwt_identity()
     data = request.get_json()
     
@@ -80,9 +82,12 @@ def parse_reminder():
     if not note_id:
         return jsonify({'error': 'Note ID is required'}), 400
     
-    # Use LLM to parse the reminder
     try:
-        parsed = parse_reminder_with_llm(raw_text)
+        # Parse locally first; only ambiguous text costs an LLM call
+        parsed = parse_reminder_locally(raw_text)
+        if parsed['confidence'] < LOCAL_PARSE_MIN_CONFIDENCE:
+            parsed = parse_reminder_with_llm(raw_text)
+            parsed['source'] = 'llm'
         
         if not parsed.get('success'):
             return jsonify({
@@ -115,6 +120,38 @@ def parse_reminder():
         return jsonify({'error': f'Failed to parse reminder: {str(e)}'}), 500
 
 
+@reminders_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_reminders():
+    """Complete, mark notified, snooze or delete many reminders at once."""
+    current_user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    
+    reminder_ids = data.get('ids')
+    operation = data.get('operation')
+    snooze_minutes = data.get('snooze_minutes', 10)
+    
+    if not isinstance(reminder_ids, list) or not reminder_ids:
+        return jsonify({'error': 'ids must be a non-empty list'}), 400
+    
+    if len(reminder_ids) > 500:
+        return jsonify({'error': 'At most 500 ids per request'}), 400
+    
+    if operation not in Reminder.BULK_OPERATIONS:
+        return jsonify({'error': f'operation must be one of: {", ".join(Reminder.BULK_OPERATIONS)}'}), 400
+    
+    if operation == 'snooze' and (not isinstance(snooze_minutes, int) or snooze_minutes <= 0):
+        return jsonify({'error': 'snooze_minutes must be a positive integer'}), 400
+    
+    results = Reminder.bulk_apply(current_user_id, reminder_ids, operation, snooze_minutes)
+    
+    return jsonify({
+        'operation': operation,
+        'results': results,
+        'succeeded': sum(1 for status in results.values() if status == 'ok')
+    }), 200
+
+
 @reminders_bp.route('/<reminder_id>', methods=['GET'])
 @jwt_required()
 def get_reminder(reminder_id):
@@ -188,33 +225,30 @@ def get_due_reminders():
     """Get reminders that will trigger in the next 5 minutes.
     
     Trigger time = due_date - early_reminder_minutes
-    Returns reminders where trigger_time is between now and now + 5 minutes.
+    Returns reminders where trigger_time is between now and now + 5 minutes,
+    served from this worker's scheduler window when the scheduler is running.
     """
-    from datetime import timedelta
-    
     current_user_id = get_jwt_identity()
+    return jsonify(due_reminders(current_user_id)), 200
+
+
+def due_reminders(user_id: str) -> list:
+    """A user's reminders triggering in the next 5 minutes, as JSON dicts."""
     now = datetime.utcnow()
     window_end = now + timedelta(minutes=5)
     
-    # Get all non-notified reminders for this user
-    reminders = Reminder.find_by_user(current_user_id, include_completed=False)
+    if reminder_scheduler.running:
+        reminders = reminder_scheduler.upcoming(user_id, window_end, now)
+    else:
+        reminders = Reminder.find_triggering(now, window_end, user_id=user_id)
     
     upcoming = []
     for r in reminders:
-        if r.notified:
-            continue
-            
-        # Calculate trigger time (due_date minus early reminder offset)
-        trigger_time = r.due_date - timedelta(minutes=r.early_reminder_minutes)
-        
-        # Check if trigger time is within the next 5 minutes
-        if now <= trigger_time <= window_end:
-            reminder_dict = r.to_dict()
-            # Include the calculated trigger time for the frontend (with Z suffix for UTC)
-            reminder_dict['trigger_time'] = trigger_time.isoformat() + 'Z'
-            upcoming.append(reminder_dict)
-    
-    return jsonify(upcoming), 200
+        reminder_dict = r.to_dict()
+        # Include the calculated trigger time for the frontend (with Z suffix for UTC)
+        reminder_dict['trigger_time'] = r.trigger_at.isoformat() + 'Z'
+        upcoming.append(reminder_dict)
+    return upcoming
 
 
 def parse_reminder_with_llm(text: str) -> dict:
@@ -251,28 +285,15 @@ If no time is specified, default to 9:00 AM.
 If no date is specified, assume today (or tomorrow if the time has passed)."""
 
     try:
-        # Use AIService to get provider and make the request
-        provider = AIService.get_provider()
-        
-        # Use the provider's client directly for custom prompts
-        response = provider.client.chat.completions.create(
-            model=provider.model,
-            messages=[
-                {
-                    'role': 'system',
-                    'content': 'You are a helpful assistant that parses reminder text into structured JSON. Respond only with valid JSON, no markdown or explanation.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
+        # Use AIService to run the custom prompt on the configured provider
+        response_text = AIService.complete(
+            'You are a helpful assistant that parses reminder text into structured JSON. Respond only with valid JSON, no markdown or explanation.',
+            prompt,
+            action='parse_reminder',
             temperature=0.3,
             max_tokens=200
         )
         
-        response_text = response.choices[0].message.content.strip()
-        
         # Clean up response - remove markdown code blocks if present
         if response_text.startswith('```'):
             response_text = response_text.split('\n', 1)[1]  # Remove first line
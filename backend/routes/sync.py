@@ -0,0 +1,147 @@
+"""Sync routes - incremental changes since a client's last sync."""
+import time
+from typing import Optional
+
+from bson import ObjectId
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from database import get_db
+from models import Book, Note, Reminder
+from models.sync import TOMBSTONES, stable_seq
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+KINDS = ('books', 'notes', 'reminders', 'tombstones')
+
+
+def _encode_token(seq: int, cursors: Optional[dict] = None, until: int = 0, full: bool = False) -> str:
+    """Token for the client's next call.
+
+    ``cursors`` (kind -> last _id sent at ``seq``) marks a page boundary
+    inside a sync that stops at sequence ``until``; ``full`` keeps the pages
+    of a full resync flagged as such.
+    """
+    token = f'{seq}.{int(time.time())}'
+    if cursors is not None:
+        token += f'.page-{until}' + ('.full' if full else '')
+        token += ''.join(f'.{kind}-{after_id}' for kind, after_id in sorted(cursors.items()))
+    return token
+
+
+def _decode_token(token: str):
+    """(sequence, issued at epoch seconds, page or None); raises ValueError for malformed tokens.
+
+    A page is ``{'cursors', 'until', 'full'}`` for a token handed out at a page boundary.
+    """
+    parts = token.split('.')
+    if len(parts) < 2 or (len(parts) > 2 and not parts[2].startswith('page-')):
+        raise ValueError(token)
+    page = None
+    if len(parts) > 2:
+        page = {'cursors': {}, 'until': int(parts[2][len('page-'):]), 'full': False}
+        for part in parts[3:]:
+            if part == 'full':
+                page['full'] = True
+                continue
+            kind, _, after_id = part.partition('-')
+            if kind not in KINDS or not ObjectId.is_valid(after_id):
+                raise ValueError(token)
+            page['cursors'][kind] = ObjectId(after_id)
+    return int(parts[0]), int(parts[1]), page
+
+
+def _changes(collection, user_id: str, since: int, until: int, after_id: Optional[ObjectId], limit: int, projection=None):
+    """Documents after position (since, after_id) up to sequence ``until`` in (sync_seq, _id) order, and the last position sent if truncated.
+
+    Batch writes share one sequence, so a page may end inside a sequence;
+    ``after_id`` resumes within it.
+    """
+    newer = {'sync_seq': {'$gt': since, '$lte': until}}
+    if after_id is None:
+        query = {'user_id': user_id, **newer}
+    else:
+        query = {'user_id': user_id, '$or': [newer, {'sync_seq': since, '_id': {'$gt': after_id}}]}
+    docs = list(collection.find(query, projection).sort([('sync_seq', 1), ('_id', 1)]).limit(limit + 1))
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, (docs[-1]['sync_seq'], docs[-1]['_id'])
+
+
+@sync_bp.route('', methods=['GET'])
+@jwt_required()
+def sync():
+    """Books, notes, reminders and deletions changed since the ``since`` token.
+
+    Without a token (or with one older than the tombstone retention) the whole
+    workspace is returned with ``full: true`` on every page and the client
+    should replace its local copy. ``notes=full`` includes canvas data; the
+    default is metadata. While ``has_more`` is true, call again with the
+    returned token.
+
+    A sync only goes up to :func:`models.sync.stable_seq`, so writes still in
+    flight are sent next time rather than skipped.
+    """
+    user_id = get_jwt_identity()
+    token = request.args.get('since')
+    full_notes = request.args.get('notes', 'meta') == 'full'
+    limit = current_app.config.get('SYNC_PAGE_SIZE', 1000)
+    retention = current_app.config.get('SYNC_TOMBSTONE_DAYS', 90) * 24 * 3600
+
+    full = True
+    since = -1
+    cursors = {}
+    page = None
+    if token:
+        try:
+            since, issued_at, page = _decode_token(token)
+        except ValueError:
+            return jsonify({'error': 'Invalid sync token'}), 400
+        full = time.time() - issued_at > retention
+        if full:
+            since, page = -1, None
+        elif page is not None:
+            full = page['full']
+            cursors = page['cursors']
+
+    # Later pages stop where the first one did, so a resync's pages describe one state
+    latest = page['until'] if page is not None else stable_seq(user_id)
+    db = get_db()
+
+    sources = {
+        'books': (db[Book.COLLECTION], None),
+        'notes': (db[Note.COLLECTION], None if full_notes else {'canvas_data': 0}),
+        'reminders': (db[Reminder.collection_name], None),
+    }
+    if not full:
+        sources['tombstones'] = (db[TOMBSTONES], None)
+
+    changes = {}
+    boundaries = {}
+    for kind, (collection, projection) in sources.items():
+        changes[kind], boundary = _changes(collection, user_id, since, latest, cursors.get(kind), limit, projection)
+        if boundary is not None:
+            boundaries[kind] = boundary
+
+    deleted = {'books': [], 'notes': [], 'reminders': []}
+    for tombstone in changes.get('tombstones', []):
+        deleted[tombstone['kind'] + 's'].append(tombstone['object_id'])
+
+    # Resume at the earliest cut; kinds cut later re-send a little, kinds cut there resume after their last _id
+    if boundaries:
+        next_seq = min(seq for seq, _ in boundaries.values())
+        cut = {kind: after_id for kind, (seq, after_id) in boundaries.items() if seq == next_seq}
+        next_token = _encode_token(next_seq, cut, latest, full)
+    else:
+        next_token = _encode_token(latest)
+
+    return jsonify({
+        'token': next_token,
+        'full': full,
+        'has_more': bool(boundaries),
+        'books': [Book.from_dict(data).to_json() for data in changes['books']],
+        'notes': [Note.from_dict(data).to_json(include_canvas=full_notes) for data in changes['notes']],
+        'reminders': [Reminder._from_db(data).to_dict() for data in changes['reminders']],
+        'deleted': deleted
+    }), 200
@@ -0,0 +1,113 @@
+"""Workspace routes - everything the frontend needs for first paint in one request."""
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+from flask import Blueprint, Response, current_app, g, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from database import get_db
+from models import Book, Note, Reminder, User
+from .addons import addon_registry
+from .reminders import due_reminders
+
+workspace_bp = Blueprint('workspace', __name__, url_prefix='/api/workspace')
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('WORKSPACE_BOOTSTRAP_WORKERS', 8),
+                thread_name_prefix='workspace-bootstrap'
+            )
+        return _executor
+
+
+def _run_in_context(app, db, fn, *args):
+    """Run fn in an app context that reuses the request's Mongo client."""
+    with app.app_context():
+        g.db = db
+        try:
+            return fn(*args)
+        finally:
+            # The client belongs to the request; its own teardown closes it
+            g.pop('db', None)
+
+
+def _open_note(user_id: str, note_id: str, book_id: str):
+    """The last-opened note (if still there) and the note tree of its book."""
+    note = Note.find_by_id(note_id, user_id) if note_id and ObjectId.is_valid(note_id) else None
+    if note:
+        book_id = note.book_id
+    tree = Note.get_tree(user_id, book_id) if book_id else []
+    return note, book_id, tree
+
+
+def _gzip_response(payload: dict) -> Response:
+    """JSON response, gzip-compressed when the client accepts it."""
+    body = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+    response = Response(mimetype='application/json')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=6)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_data(body)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@workspace_bp.route('/bootstrap', methods=['GET'])
+@jwt_required()
+def bootstrap():
+    """User, book tree, note tree, addon commands and reminders in one payload.
+
+    Replaces the six calls made after login. Pass ?note_id= to resolve the
+    last-opened note (its book's note tree is included), or ?book_id= for the
+    note tree of a book. The reads run concurrently.
+    """
+    user_id = get_jwt_identity()
+    user = User.find_by_id(user_id)
+
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    note_id = request.args.get('note_id')
+    book_id = request.args.get('book_id')
+
+    app = current_app._get_current_object()
+    db = get_db()
+    executor = _get_executor()
+
+    def submit(fn, *args):
+        return executor.submit(_run_in_context, app, db, fn, *args)
+
+    books = submit(Book.get_tree, user_id)
+    reminders = submit(Reminder.find_by_user, user_id)
+    due = submit(due_reminders, user_id)
+    opened = submit(_open_note, user_id, note_id, book_id)
+
+    # Memoized per active-addon set, so no need for a thread
+    commands_body, _ = addon_registry.commands(user.active_addons)
+
+    note, book_id, notes_tree = opened.result()
+    payload = {
+        'user': user.to_json(),
+        'books': books.result(),
+        'book_id': book_id,
+        'notes': notes_tree,
+        'note': note.to_json() if note else None,
+        'commands': json.loads(commands_body),
+        'reminders': [r.to_dict() for r in reminders.result()],
+        'due_reminders': due.result()
+    }
+    return _gzip_response(payload)
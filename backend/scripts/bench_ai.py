@@ -0,0 +1,169 @@
+"""Load test for the AI endpoints.
+
+Drives /api/ai/transform, /api/ai/summarize-note and /api/reminders/parse
+with many concurrent virtual users and reports throughput, latency
+percentiles and estimated worker saturation.
+
+Run the API against the mock provider so no real AI calls are made:
+
+    MOCK_AI_ENABLED=true AI_PROVIDER=mock MOCK_AI_LATENCY=lognormal:800,0.5 \
+        gunicorn -w 4 -b 0.0.0.0:5000 "app:create_app()"
+
+    python scripts/bench_ai.py --users 200 --duration 60 --workers 4
+
+Bench users are registered as bench-<n>@example.com and switched to the mock
+provider. Reminder parsing creates reminders, so point this at a scratch
+database.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+TRANSFORM_TEXTS = [
+    'The quarterly review meeting is moved to next week because the finance team needs more time.',
+    'We should migrate the reporting jobs off the legacy cron box before the datacenter closes.',
+    'Customer onboarding takes too long; most of the delay is waiting on manual account approval.',
+]
+REMINDER_TEXTS = [
+    'tomorrow 3pm call the vendor',               # parsed locally
+    '🔔 Reminder: 12/10/2030 10:00 AM - "Submit report"',  # parsed locally
+    'the second tuesday after the offsite, prep slides',  # falls back to the LLM
+]
+
+
+def request(base_url, method, path, token=None, body=None):
+    """Send a JSON request and return (status, headers, parsed body, seconds)."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(f'{base_url}{path}', data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            status, headers, raw = resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        status, headers, raw = e.code, e.headers, e.read()
+    elapsed = time.monotonic() - started
+
+    try:
+        payload = json.loads(raw) if raw else None
+    except ValueError:
+        payload = None
+    return status, headers, payload, elapsed
+
+
+def login_bench_user(base_url, index):
+    """Register (or log in) a bench user and switch it to the mock provider."""
+    credentials = {'email': f'bench-{index}@example.com', 'password': 'bench-password', 'name': f'Bench {index}'}
+    status, _, payload, _ = request(base_url, 'POST', '/api/auth/register', body=credentials)
+    if status == 409:
+        status, _, payload, _ = request(base_url, 'POST', '/api/auth/login', body=credentials)
+    if status not in (200, 201):
+        raise RuntimeError(f'Could not authenticate bench user {index}: {status} {payload}')
+
+    token = payload['access_token']
+    request(base_url, 'PUT', '/api/auth/settings', token=token, body={'ai_provider': 'mock'})
+    return token
+
+
+def build_request(kind, unique):
+    """Return (method, path, body) for one request of the given kind."""
+    suffix = f' [{random.getrandbits(32):08x}]' if unique else ''
+    if kind == 'transform':
+        return 'POST', '/api/ai/transform', {
+            'text': random.choice(TRANSFORM_TEXTS) + suffix,
+            'action': random.choice(['polish', 'summarize', 'bullets']),
+        }
+    if kind == 'summarize':
+        blocks = [
+            {'type': 'text', 'x': 0, 'y': i * 200, 'content': f'<p>{random.choice(TRANSFORM_TEXTS)}{suffix}</p>'}
+            for i in range(5)
+        ]
+        return 'POST', '/api/ai/summarize-note', {'title': 'Bench note', 'blocks': blocks}
+    return 'POST', '/api/reminders/parse', {
+        'text': random.choice(REMINDER_TEXTS) + suffix,
+        'note_id': 'bench-note',
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=200, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run')
+    parser.add_argument('--workers', type=int, default=4, help='server worker processes (for saturation)')
+    parser.add_argument('--think-time', type=float, default=0.5, help='mean pause between a user\'s requests')
+    parser.add_argument('--mix', default='transform=6,summarize=2,parse=2', help='request mix weights')
+    parser.add_argument('--no-unique', dest='unique', action='store_false',
+                        help='send identical texts (exercises request coalescing)')
+    args = parser.parse_args()
+
+    mix = [part.split('=') for part in args.mix.split(',')]
+    kinds = [kind for kind, _ in mix]
+    weights = [float(weight) for _, weight in mix]
+
+    print(f'Authenticating {args.users} bench users...')
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        tokens = list(pool.map(lambda i: login_bench_user(args.base_url, i), range(args.users)))
+
+    results = []
+    results_lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def virtual_user(token):
+        while time.monotonic() < stop_at:
+            kind = random.choices(kinds, weights)[0]
+            method, path, body = build_request(kind, args.unique)
+            status, headers, _, elapsed = request(args.base_url, method, path, token, body)
+            queue_ms = int(headers.get('X-Queue-Wait-Ms', 0) or 0)
+            retry_after = int(headers.get('Retry-After', 0) or 0)
+            with results_lock:
+                results.append((kind, status, elapsed, queue_ms, retry_after))
+            time.sleep(random.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+    print(f'Running for {args.duration:.0f}s...')
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for token in tokens:
+            pool.submit(virtual_user, token)
+    wall = time.monotonic() - started
+
+    print(f'\n{len(results)} requests in {wall:.1f}s ({len(results) / wall:.1f} req/s)\n')
+    print(f'{"endpoint":<12}{"count":>8}{"ok":>8}{"429":>8}{"err":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queue ms":>10}{"retry s":>10}')
+    for kind in kinds + ['all']:
+        rows = [r for r in results if kind == 'all' or r[0] == kind]
+        latencies = [r[2] * 1000 for r in rows if r[1] < 400]
+        retry_afters = [r[4] for r in rows if r[1] == 429]
+        print(
+            f'{kind:<12}{len(rows):>8}'
+            f'{sum(1 for r in rows if r[1] < 400):>8}'
+            f'{sum(1 for r in rows if r[1] == 429):>8}'
+            f'{sum(1 for r in rows if r[1] >= 400 and r[1] != 429):>8}'
+            f'{percentile(latencies, 50):>10.0f}{percentile(latencies, 95):>10.0f}{percentile(latencies, 99):>10.0f}'
+            f'{(statistics.mean(r[3] for r in rows) if rows else 0):>10.0f}'
+            f'{(statistics.mean(retry_afters) if retry_afters else 0):>10.1f}'
+        )
+
+    # Little's law: mean requests in the server = throughput x mean latency
+    busy = sum(r[2] for r in results) / wall
+    print(f'\nMean requests in flight: {busy:.1f}; worker saturation ~{100 * busy / args.workers:.0f}% '
+          f'of {args.workers} sync workers (>100% means requests queue in the listen backlog)')
+
+
+if __name__ == '__main__':
+    main()
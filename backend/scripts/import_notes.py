@@ -0,0 +1,69 @@
+"""Bulk import a zip archive of notes straight into the database.
+
+Same pipeline as POST /api/books/import, without the upload size limit or an
+HTTP request held open, for migrations of tens of thousands of notes. Run
+from the backend directory with the API's environment (MONGODB_URI etc.):
+
+    python scripts/import_notes.py notes.zip --email me@example.com
+    python scripts/import_notes.py export.zip --email me@example.com --book-id <id>
+
+Folders become books and .md/.markdown/.txt/.json files become notes (see
+services.importer for the layout).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# A one-off process must not deliver reminders
+os.environ.setdefault('REMINDER_SCHEDULER_ENABLED', 'false')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('archive', help='zip archive to import')
+    parser.add_argument('--email', required=True, help='owner of the imported books')
+    parser.add_argument('--book-id', help='import into this book instead of at the root')
+    parser.add_argument('--name', help='book for loose top-level files (default: archive name)')
+    parser.add_argument('--batch-size', type=int, help='notes per insert_many (default: IMPORT_BATCH_SIZE)')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import Book, User
+    from services.importer import import_archive
+
+    app = create_app()
+    if args.batch_size:
+        app.config['IMPORT_BATCH_SIZE'] = args.batch_size
+
+    with app.app_context():
+        user = User.find_by_email(args.email)
+        if not user:
+            sys.exit(f'No user with email {args.email}')
+        target = None
+        if args.book_id:
+            target = Book.find_by_id(args.book_id, user.id)
+            if not target:
+                sys.exit(f'Book {args.book_id} not found for {args.email}')
+
+        name = args.name or os.path.splitext(os.path.basename(args.archive))[0] or 'Imported notes'
+        started = time.monotonic()
+        with open(args.archive, 'rb') as f:
+            try:
+                result = import_archive(f, user.id, target, name)
+            except ValueError as e:
+                sys.exit(str(e))
+        elapsed = time.monotonic() - started
+
+    print(f"Imported {result['notes']} notes into {result['books']} new books in {elapsed:.1f}s "
+          f"({result['notes'] / max(elapsed, 0.001):.0f} notes/s)")
+    if result['skipped_count']:
+        print(f"Skipped {result['skipped_count']} files:")
+        for skipped in result['skipped']:
+            print(f"  {skipped['path']}: {skipped['reason']}")
+
+
+if __name__ == '__main__':
+    main()
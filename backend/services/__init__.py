@@ -1,4 +1,5 @@
 """Services."""
 from .ai_service import AIService
+from .summary_service import NoteSummarizer
 
-__all__ = ['AIService']
+__all__ = ['AIService', 'NoteSummarizer']
@@ -0,0 +1,64 @@
+"""Precompiled addon catalog and command payloads.
+
+Addon responses depend only on which addons a user has active, so each
+distinct active set is serialized once per worker and served with a strong
+ETag derived from the body.
+"""
+import hashlib
+import json
+import threading
+from typing import Iterable, List, Tuple
+
+
+class AddonRegistry:
+    """Compiled addon definitions with memoized serialized responses."""
+
+    def __init__(self, addons: List[dict]):
+        self._addons = [dict(addon) for addon in addons]
+        self._ids = frozenset(addon['id'] for addon in self._addons)
+        self._always_active = frozenset(addon['id'] for addon in self._addons if addon.get('is_always_active'))
+        self._lock = threading.Lock()
+        self._catalogs = {}
+        self._commands = {}
+
+    def exists(self, addon_id: str) -> bool:
+        return addon_id in self._ids
+
+    def active_set(self, active_addons: Iterable[str]) -> frozenset:
+        """Addons in effect for a user: known enabled ones plus always-active ones."""
+        return (frozenset(active_addons) & self._ids) | self._always_active
+
+    @staticmethod
+    def _serialize(payload) -> Tuple[bytes, str]:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return body, hashlib.sha256(body).hexdigest()[:32]
+
+    def _memoized(self, cache: dict, active: frozenset, build) -> Tuple[bytes, str]:
+        with self._lock:
+            cached = cache.get(active)
+        if cached is None:
+            cached = self._serialize(build(active))
+            with self._lock:
+                cache[active] = cached
+        return cached
+
+    def _build_catalog(self, active: frozenset) -> list:
+        return [{**addon, 'enabled': addon['id'] in active} for addon in self._addons]
+
+    def _build_commands(self, active: frozenset) -> dict:
+        commands = {'templates': [], 'actions': [], 'ui_components': []}
+        for addon in self._addons:
+            if addon['id'] not in active:
+                continue
+            context = {'addon_id': addon['id'], 'addon_name': addon['name']}
+            for kind, items in commands.items():
+                items.extend({**item, **context} for item in addon.get(kind, []))
+        return commands
+
+    def catalog(self, active_addons: Iterable[str]) -> Tuple[bytes, str]:
+        """Serialized addon list with per-user enabled flags, and its (unquoted) ETag."""
+        return self._memoized(self._catalogs, self.active_set(active_addons), self._build_catalog)
+
+    def commands(self, active_addons: Iterable[str]) -> Tuple[bytes, str]:
+        """Serialized templates, actions and UI components of active addons, and its (unquoted) ETag."""
+        return self._memoized(self._commands, self.active_set(active_addons), self._build_commands)
@@ -0,0 +1,199 @@
+"""Admission control for AI requests.
+
+Every AI request reserves capacity from four token buckets: per-user and
+global, each measured in requests and in estimated LLM tokens. Requests that
+exceed the current capacity wait in line (the reservation is taken up front,
+so waiters are served in arrival order) unless the wait would exceed
+``AI_QUEUE_MAX_WAIT_SECONDS``, in which case they are rejected with 429 and
+``Retry-After``. The wait is a plain sleep, which yields to other requests
+under the gevent workers the API is served with.
+
+Buckets live in the worker process, so global limits apply per worker.
+"""
+import math
+import re
+import threading
+import time
+from functools import wraps
+from typing import Optional
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+
+class TokenBucket:
+    """Token bucket that allows reservations to run into debt."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take ``amount`` tokens and return the seconds until they are covered."""
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.refill_per_second
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def remaining(self, now: float) -> int:
+        self._refill(now)
+        return max(0, int(self.tokens))
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Admission:
+    """Outcome of an admission decision."""
+
+    def __init__(self, admitted: bool, wait: float, limits: dict, remaining: dict):
+        self.admitted = admitted
+        self.wait = wait
+        self.limits = limits
+        self.remaining = remaining
+
+    def headers(self) -> dict:
+        headers = {
+            'X-RateLimit-Limit': str(self.limits['requests']),
+            'X-RateLimit-Remaining': str(self.remaining['requests']),
+            'X-RateLimit-Tokens-Limit': str(self.limits['tokens']),
+            'X-RateLimit-Tokens-Remaining': str(self.remaining['tokens']),
+        }
+        if self.admitted:
+            headers['X-Queue-Wait-Ms'] = str(int(self.wait * 1000))
+        else:
+            headers['Retry-After'] = str(max(1, math.ceil(self.wait)))
+        return headers
+
+
+class AdmissionController:
+    """Per-user and global token buckets in front of AIService."""
+
+    # Idle users with full buckets are dropped once this many are tracked
+    MAX_TRACKED_USERS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+        self._global = None
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0}
+
+    def _config(self) -> dict:
+        config = current_app.config
+        return {
+            'user_requests_per_min': config.get('AI_RATE_USER_REQUESTS_PER_MIN', 20),
+            'user_burst': config.get('AI_RATE_USER_BURST', 5),
+            'user_tokens_per_min': config.get('AI_RATE_USER_TOKENS_PER_MIN', 40000),
+            'global_requests_per_min': config.get('AI_RATE_GLOBAL_REQUESTS_PER_MIN', 300),
+            'global_tokens_per_min': config.get('AI_RATE_GLOBAL_TOKENS_PER_MIN', 400000),
+            'max_wait': config.get('AI_QUEUE_MAX_WAIT_SECONDS', 5),
+        }
+
+    def _buckets(self, user_id: str, cfg: dict, now: float) -> tuple:
+        if self._global is None:
+            self._global = (
+                TokenBucket(cfg['global_requests_per_min'], cfg['global_requests_per_min'] / 60),
+                TokenBucket(cfg['global_tokens_per_min'], cfg['global_tokens_per_min'] / 60),
+            )
+
+        user = self._users.get(user_id)
+        if user is None:
+            if len(self._users) >= self.MAX_TRACKED_USERS:
+                self._users = {
+                    uid: buckets for uid, buckets in self._users.items()
+                    if not all(bucket.is_full(now) for bucket in buckets)
+                }
+            user = (
+                TokenBucket(cfg['user_burst'], cfg['user_requests_per_min'] / 60),
+                TokenBucket(cfg['user_tokens_per_min'], cfg['user_tokens_per_min'] / 60),
+            )
+            self._users[user_id] = user
+        return user + self._global
+
+    def admit(self, user_id: str, estimated_tokens: int) -> Admission:
+        """Reserve capacity for a request, queueing it if the wait fits the deadline."""
+        cfg = self._config()
+        with self._lock:
+            now = time.monotonic()
+            user_requests, user_tokens, global_requests, global_tokens = buckets = \
+                self._buckets(user_id, cfg, now)
+            amounts = (1, estimated_tokens, 1, estimated_tokens)
+
+            wait = max(bucket.reserve(amount, now) for bucket, amount in zip(buckets, amounts))
+            admitted = wait <= cfg['max_wait']
+            if not admitted:
+                for bucket, amount in zip(buckets, amounts):
+                    bucket.refund(amount)
+
+            # Bucket capacities, so Remaining counts down from Limit
+            limits = {'requests': user_requests.capacity, 'tokens': user_tokens.capacity}
+            remaining = {
+                'requests': min(user_requests.remaining(now), global_requests.remaining(now)),
+                'tokens': min(user_tokens.remaining(now), global_tokens.remaining(now)),
+            }
+
+            if not admitted:
+                self.stats['rejected'] += 1
+            elif wait > 0:
+                self.stats['queued'] += 1
+            else:
+                self.stats['admitted'] += 1
+
+        return Admission(admitted, wait, limits, remaining)
+
+
+admission_controller = AdmissionController()
+
+
+_TAGS = re.compile(r'<[^>]+>')
+
+
+def _prompt_chars(payload: dict) -> int:
+    """Characters of text an AI request sends: transform text and context, or a note's title and blocks."""
+    chars = sum(len(str(payload.get(field) or '')) for field in ('text', 'context', 'title'))
+    blocks = payload.get('blocks')
+    for block in blocks if isinstance(blocks, list) else []:
+        if isinstance(block, dict):
+            text = block.get('text') if block.get('type') == 'shape' else block.get('content')
+            chars += len(_TAGS.sub(' ', str(text or '')))
+    return chars
+
+
+def estimate_tokens(payload: Optional[dict]) -> int:
+    """Rough prompt + completion token estimate for an AI request body."""
+    chars = _prompt_chars(payload) if isinstance(payload, dict) else 0
+    prompt_tokens = chars // 4 + 200  # ~4 chars per token plus prompt template
+    return prompt_tokens + min(prompt_tokens, 2000)  # completion capped at max_tokens
+
+
+def ai_admission(view):
+    """Decorator applying AI admission control to a JWT-protected view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()
+        admission = admission_controller.admit(user_id, estimate_tokens(request.get_json(silent=True)))
+
+        if not admission.admitted:
+            response = make_response(jsonify({
+                'error': 'AI rate limit exceeded, please retry later',
+                'retry_after': math.ceil(admission.wait)
+            }), 429)
+        else:
+            if admission.wait > 0:
+                time.sleep(admission.wait)
+            response = make_response(view(*args, **kwargs))
+
+        response.headers.update(admission.headers())
+        return response
+    return wrapper
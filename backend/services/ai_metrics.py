@@ -0,0 +1,220 @@
+"""AI usage metrics.
+
+Every provider call emits a structured log line and is rolled up into the
+``ai_usage`` collection, one document per day, user, action, provider and
+model. Rollups carry call/error/cache-hit counts, token totals, estimated
+cost and a fixed-bucket latency histogram, so they can be summed with a
+plain ``$group``.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app, has_app_context, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from pymongo.errors import PyMongoError
+
+from database import get_db
+
+logger = logging.getLogger('spryte.ai')
+
+# Latency histogram upper bounds in milliseconds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
+
+# USD per million tokens: (prompt, completion). Override with AI_PRICING.
+DEFAULT_PRICING = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'claude-3-haiku-20240307': (0.25, 1.25),
+    'mock': (0.0, 0.0),
+}
+
+
+def _bucket_name(latency_ms: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return f'le_{bound}'
+    return 'inf'
+
+
+BUCKET_NAMES = [f'le_{bound}' for bound in LATENCY_BUCKETS_MS] + ['inf']
+BUCKET_BOUNDS = dict(zip(BUCKET_NAMES, LATENCY_BUCKETS_MS + [None]))
+
+
+class AIUsageRecorder:
+    """Records AI call metrics and serves aggregated usage."""
+
+    COLLECTION = 'ai_usage'
+
+    GROUP_FIELDS = {
+        'action': '$action',
+        'user': '$user_id',
+        'model': '$model',
+        'provider': '$provider',
+        'day': '$day',
+    }
+
+    @staticmethod
+    def _current_user_id() -> Optional[str]:
+        if not has_request_context():
+            return None
+        try:
+            return get_jwt_identity()
+        except RuntimeError:
+            return None  # Request was not JWT-authenticated
+
+    @staticmethod
+    def cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimated cost in USD for a call."""
+        pricing = DEFAULT_PRICING
+        if has_app_context():
+            pricing = {**DEFAULT_PRICING, **current_app.config.get('AI_PRICING', {})}
+        prompt_price, completion_price = pricing.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def record(
+        self,
+        action: str,
+        provider: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency_ms: float = 0.0,
+        cache_hit: bool = False,
+        error_class: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> None:
+        """Log one call and add it to the daily rollup."""
+        if user_id is None:
+            user_id = self._current_user_id()
+        now = datetime.utcnow()
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+
+        logger.info(json.dumps({
+            'event': 'ai_call',
+            'action': action,
+            'provider': provider,
+            'model': model,
+            'user_id': user_id,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency_ms': round(latency_ms, 1),
+            'cache_hit': cache_hit,
+            'error_class': error_class,
+            'cost_usd': round(cost, 6),
+        }))
+
+        if not has_app_context():
+            return
+
+        day = now.strftime('%Y-%m-%d')
+        increments = {
+            'calls': 1,
+            'cache_hits': int(cache_hit),
+            'errors': int(error_class is not None),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency_ms_total': latency_ms,
+            'cost_usd': cost,
+            f'latency_buckets.{_bucket_name(latency_ms)}': 1,
+        }
+        if error_class:
+            increments[f'error_classes.{error_class}'] = 1
+
+        try:
+            get_db()[self.COLLECTION].update_one(
+                {'_id': f'{day}|{user_id}|{action}|{provider}|{model}'},
+                {
+                    '$setOnInsert': {
+                        'day': day,
+                        'user_id': user_id,
+                        'action': action,
+                        'provider': provider,
+                        'model': model,
+                    },
+                    '$inc': increments,
+                    '$max': {'latency_ms_max': latency_ms},
+                    '$set': {'updated_at': now},
+                },
+                upsert=True
+            )
+        except PyMongoError:
+            # Metrics must never fail the request they describe
+            logger.exception('Failed to record AI usage')
+
+    @staticmethod
+    def _percentile(buckets: dict, total: int, pct: float) -> Optional[int]:
+        """Upper bound of the histogram bucket holding the given percentile."""
+        if not total:
+            return None
+        target = total * pct / 100
+        seen = 0
+        for name in BUCKET_NAMES:
+            seen += buckets.get(name, 0)
+            if seen >= target:
+                return BUCKET_BOUNDS[name]
+        return None
+
+    def summary(self, days: int = 7, group_by: str = 'action') -> list:
+        """Aggregate usage over the last ``days`` days grouped by one dimension."""
+        if group_by not in self.GROUP_FIELDS:
+            raise ValueError(f'Invalid group_by: {group_by}')
+
+        db = get_db()
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        group_key = self.GROUP_FIELDS[group_by]
+
+        group = {
+            '_id': group_key,
+            'calls': {'$sum': '$calls'},
+            'cache_hits': {'$sum': '$cache_hits'},
+            'errors': {'$sum': '$errors'},
+            'prompt_tokens': {'$sum': '$prompt_tokens'},
+            'completion_tokens': {'$sum': '$completion_tokens'},
+            'latency_ms_total': {'$sum': '$latency_ms_total'},
+            'latency_ms_max': {'$max': '$latency_ms_max'},
+            'cost_usd': {'$sum': '$cost_usd'},
+        }
+        for name in BUCKET_NAMES:
+            group[name] = {'$sum': f'$latency_buckets.{name}'}
+
+        rows = db[self.COLLECTION].aggregate([
+            {'$match': {'day': {'$gte': since}}},
+            {'$group': group},
+            {'$sort': {'cost_usd': -1}},
+        ])
+
+        # Error classes are dynamic keys, so they are summed in a second pass
+        error_rows = db[self.COLLECTION].aggregate([
+            {'$match': {'day': {'$gte': since}, 'errors': {'$gt': 0}}},
+            {'$project': {'key': group_key, 'classes': {'$objectToArray': '$error_classes'}}},
+            {'$unwind': '$classes'},
+            {'$group': {'_id': {'key': '$key', 'class': '$classes.k'}, 'count': {'$sum': '$classes.v'}}},
+        ])
+        error_classes = {}
+        for row in error_rows:
+            error_classes.setdefault(row['_id']['key'], {})[row['_id']['class']] = row['count']
+
+        results = []
+        for row in rows:
+            buckets = {name: row[name] for name in BUCKET_NAMES}
+            timed_calls = row['calls']
+            results.append({
+                group_by: row['_id'],
+                'calls': row['calls'],
+                'cache_hits': row['cache_hits'],
+                'errors': row['errors'],
+                'error_classes': error_classes.get(row['_id'], {}),
+                'prompt_tokens': row['prompt_tokens'],
+                'completion_tokens': row['completion_tokens'],
+                'cost_usd': round(row['cost_usd'], 4),
+                'avg_latency_ms': round(row['latency_ms_total'] / timed_calls, 1) if timed_calls else None,
+                'p50_latency_ms': self._percentile(buckets, timed_calls, 50),
+                'p95_latency_ms': self._percentile(buckets, timed_calls, 95),
+                'max_latency_ms': round(row['latency_ms_max'] or 0, 1),
+            })
+        return results
+
+
+usage_recorder = AIUsageRecorder()
@@ -0,0 +1,119 @@
+"""Latency-aware routing between AI providers.
+
+``HedgedRouter`` records per-provider latencies. In hedged mode it starts the
+primary call, and if no answer has arrived by the primary's recent latency
+percentile it sends the same request to a secondary provider, returning
+whichever good answer lands first. A primary that fails outright fails over
+to the secondary immediately.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional, Tuple
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    # Percentiles are unreliable below this many samples
+    MIN_SAMPLES = 20
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgedRouter:
+    """Runs provider calls, hedging slow primaries against a secondary."""
+
+    def __init__(self, max_workers: int = 32):
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-hedge')
+        self.stats = {'hedged': 0, 'hedge_wins': 0, 'failovers': 0}
+
+    def tracker(self, name: str) -> LatencyTracker:
+        with self._lock:
+            if name not in self._trackers:
+                self._trackers[name] = LatencyTracker()
+            return self._trackers[name]
+
+    def call(self, name: str, fn: Callable[[], Any], on_call: Optional[Callable[[str, Any, float], None]] = None) -> Any:
+        """Run a single provider call, recording its latency.
+        
+        When ``on_call`` is given it is called with (name, result or
+        exception, seconds) as soon as the call finishes, for usage metrics.
+        Hedged calls finish on pool threads, losers possibly after the
+        request has returned.
+        """
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            if on_call is not None:
+                on_call(name, e, time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        self.tracker(name).record(elapsed)
+        if on_call is not None:
+            on_call(name, result, elapsed)
+        return result
+
+    def hedged_call(
+        self,
+        primary: Tuple[str, Callable[[], Any]],
+        secondary: Tuple[str, Callable[[], Any]],
+        percentile: float = 95,
+        default_delay: float = 2.0,
+        on_call: Optional[Callable[[str, Any, float], None]] = None
+    ) -> Any:
+        """Return the first good answer from primary, or from a hedge to secondary."""
+        primary_name, primary_fn = primary
+        secondary_name, secondary_fn = secondary
+
+        delay = self.tracker(primary_name).percentile(percentile)
+        if delay is None:
+            delay = default_delay
+
+        futures = {self._executor.submit(self.call, primary_name, primary_fn, on_call): primary_name}
+        done, _ = wait(futures, timeout=delay)
+
+        if not done:
+            self.stats['hedged'] += 1
+        elif next(iter(done)).exception() is not None:
+            self.stats['failovers'] += 1
+        else:
+            return next(iter(done)).result()
+
+        futures[self._executor.submit(self.call, secondary_name, secondary_fn, on_call)] = secondary_name
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Losing calls can't be interrupted mid-request; cancel what we can
+                    # and let the SDK timeout bound the rest. Their results are discarded,
+                    # but on_call still reports them when they finish.
+                    for other in pending:
+                        other.cancel()
+                    if futures[future] == secondary_name:
+                        self.stats['hedge_wins'] += 1
+                    return future.result()
+                errors.append(future.exception())
+
+        raise errors[0]
@@ -1,16 +1,47 @@
 """AI Service - Modular AI provider integration."""
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
 from typing import Optional
 from flask import current_app
 
+from .ai_metrics import usage_recorder
+from .ai_routing import HedgedRouter
+from .singleflight import SingleFlight
+
+
+class Completion:
+    """Text returned by a provider along with its token usage."""
+    
+    def __init__(self, text: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
 
 class AIProvider(ABC):
     """Abstract base class for AI providers."""
     
+    SYSTEM_PROMPT = 'You are a helpful writing assistant. Respond only with the transformed text, no explanations or preamble.'
+    
     @abstractmethod
+    def complete(self, system: str, prompt: str, temperature: float = 0.7, max_tokens: int = 2000) -> Completion:
+        """Run a single system + user prompt completion."""
+        pass
+    
+    def transform_completion(self, text: str, action: str, context: Optional[str] = None) -> Completion:
+        """Transform text based on action, keeping token usage."""
+        prompt = self.get_prompt(text, action, context)
+        return self.complete(self.SYSTEM_PROMPT, prompt)
+    
     def transform_text(self, text: str, action: str, context: Optional[str] = None) -> str:
         """Transform text based on action."""
-        pass
+        return self.transform_completion(text, action, context).text
     
     def get_prompt(self, text: str, action: str, context: Optional[str] = None) -> str:
         """Get prompt for the given action."""
@@ -40,6 +71,14 @@ class AIProvider(ABC):
             'insights': f'Generate key insights and follow-up questions based on the following text:\n\n{text}',
             'tasks': f'Extract actionable tasks from the following text and format them as a task list:\n\n{text}',
             'polish': f'Polish the following HTML content for clarity and brevity. Rules:\n1. PRESERVE all HTML tags exactly as they are (<p>, <ul>, <ol>, <li>, <strong>, <em>, etc.).\n2. Only modify the text content inside the tags - do not change, remove, or add any HTML tags.\n3. Polish each paragraph or list item individually - do not merge or restructure.\n4. Remove unnecessary words and improve clarity within each element.\n5. Keep the core meaning intact.\n6. Return ONLY the polished HTML with no explanations or markdown.\n\nHTML to polish:\n\n{text}',
+            'digest_block': (
+                "Condense the following text block from a note into a dense digest for a later summary. "
+                "Rules:\n"
+                "1. Keep every key fact, decision, name, number, and technical term.\n"
+                "2. Drop filler and repetition.\n"
+                "3. Output only plain text with no preamble and no markdown.\n\n"
+                f"Text:\n\n{text}"
+            ),
             'summarize_note': f'Summarize the following note content. The note contains text blocks and diagram elements from a visual canvas.\n\nRules:\n1. Create a concise summary that captures the main ideas and key points.\n2. If there are diagram elements (shapes with labels), incorporate their meaning into the summary.\n3. Preserve the logical flow and relationships between ideas.\n4. Use clear, professional language.\n5. Format the summary as HTML: use <p> for paragraphs, <ul>/<li> for bullet points, <strong> for emphasis.\n6. Keep the summary concise but comprehensive.\n7. Return ONLY raw HTML. Do NOT wrap in code blocks, do NOT use ``` or ```html, do NOT include any markdown.\n\nNote content:\n\n{text}',
         }
         
@@ -54,46 +93,173 @@ class AIProvider(ABC):
 class OpenAIProvider(AIProvider):
     """OpenAI API provider."""
     
-    def __init__(self, api_key: str, model: str = 'gpt-4o'):
+    def __init__(self, api_key: str, model: str = 'gpt-4o', timeout: Optional[float] = None):
         from openai import OpenAI
-        self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, timeout=timeout)
         self.model = model
     
-    def transform_text(self, text: str, action: str, context: Optional[str] = None) -> str:
-        """Transform text using OpenAI."""
-        prompt = self.get_prompt(text, action, context)
-        
+    def complete(self, system: str, prompt: str, temperature: float = 0.7, max_tokens: int = 2000) -> Completion:
+        """Run a completion using OpenAI."""
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[
                 {
                     'role': 'system',
-                    'content': 'You are a helpful writing assistant. Respond only with the transformed text, no explanations or preamble.'
+                    'content': system
                 },
                 {
                     'role': 'user',
                     'content': prompt
                 }
             ],
-            temperature=0.7,
-            max_tokens=2000
+            temperature=temperature,
+            max_tokens=max_tokens
         )
         
-        return response.choices[0].message.content.strip()
+        usage = response.usage
+        return Completion(
+            text=response.choices[0].message.content.strip(),
+            model=response.model or self.model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0
+        )
 
 
 class AnthropicProvider(AIProvider):
-    """Anthropic API provider (for future use)."""
+    """Anthropic API provider."""
     
-    def __init__(self, api_key: str, model: str = 'claude-3-haiku-20240307'):
-        # Import will be added when Anthropic support is needed
-        self.api_key = api_key
+    def __init__(self, api_key: str, model: str = 'claude-3-haiku-20240307', timeout: Optional[float] = None):
+        from anthropic import Anthropic
+        self.client = Anthropic(api_key=api_key, timeout=timeout)
         self.model = model
     
-    def transform_text(self, text: str, action: str, context: Optional[str] = None) -> str:
-        """Transform text using Anthropic."""
-        # Placeholder for Anthropic implementation
-        raise NotImplementedError('Anthropic provider not yet implemented')
+    def complete(self, system: str, prompt: str, temperature: float = 0.7, max_tokens: int = 2000) -> Completion:
+        """Run a completion using Anthropic."""
+        response = self.client.messages.create(
+            model=self.model,
+            system=system,
+            messages=[
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        
+        return Completion(
+            text=''.join(block.text for block in response.content if block.type == 'text').strip(),
+            model=response.model or self.model,
+            prompt_tokens=response.usage.input_tokens,
+            completion_tokens=response.usage.output_tokens
+        )
+
+
+class MockProvider(AIProvider):
+    """Local provider for load testing; no network calls.
+    
+    Latency is drawn from a configurable distribution (time to first token)
+    plus output length divided by a simulated streaming rate. A fraction of
+    calls can be made to fail.
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        latency: str = 'lognormal:800,0.5',
+        tokens_per_second: float = 50,
+        error_rate: float = 0.0
+    ):
+        self.model = 'mock'
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout = timeout
+    
+    def sample_latency(self) -> float:
+        """Sample time to first token in seconds.
+        
+        Supported specs: fixed:MS, uniform:MIN_MS,MAX_MS, normal:MEAN_MS,STD_MS,
+        lognormal:MEDIAN_MS,SIGMA.
+        """
+        kind, _, params = self.latency.partition(':')
+        values = [float(v) for v in params.split(',') if v]
+        if kind == 'fixed':
+            ms = values[0]
+        elif kind == 'uniform':
+            ms = random.uniform(values[0], values[1])
+        elif kind == 'normal':
+            ms = max(0.0, random.gauss(values[0], values[1]))
+        elif kind == 'lognormal':
+            ms = random.lognormvariate(0, values[1]) * values[0]
+        else:
+            raise ValueError(f'Unknown mock latency distribution: {self.latency}')
+        return ms / 1000
+    
+    def complete(self, system: str, prompt: str, temperature: float = 0.7, max_tokens: int = 2000) -> Completion:
+        """Return a canned completion after a simulated delay."""
+        if 'Respond with ONLY a JSON object' in prompt:
+            # Reminder parsing prompt: answer with tomorrow at 9 AM
+            due = datetime.now() + timedelta(days=1)
+            text = json.dumps({
+                'success': True,
+                'date': due.strftime('%m/%d/%Y'),
+                'time': '09:00 AM',
+                'message': 'Mock reminder'
+            })
+        else:
+            body = prompt.rsplit('\n\n', 1)[-1]
+            text = f'Mock response: {body[:400]}'
+        
+        # ~4 characters per token, streamed at tokens_per_second
+        output_tokens = min(max_tokens, max(1, len(text) // 4))
+        delay = self.sample_latency() + output_tokens / self.tokens_per_second
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError('Mock provider request timed out')
+        time.sleep(delay)
+        
+        if random.random() < self.error_rate:
+            raise RuntimeError('Mock provider injected error')
+        return Completion(
+            text=text,
+            model=self.model,
+            prompt_tokens=(len(system) + len(prompt)) // 4,
+            completion_tokens=output_tokens
+        )
+
+
+class _CallLog:
+    """Upstream calls made for one request, collected for its usage metrics.
+    
+    A hedged call that loses the race finishes after the request has
+    recorded its calls; it is then recorded on its own, in a fresh app
+    context since the request's may be gone.
+    """
+    
+    def __init__(self, action: str):
+        self.action = action
+        self._calls = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._app = current_app._get_current_object()
+        self.user_id = usage_recorder._current_user_id()
+    
+    def __call__(self, name: str, outcome, seconds: float) -> None:
+        with self._lock:
+            if not self._closed:
+                self._calls.append((name, outcome, seconds))
+                return
+        with self._app.app_context():
+            AIService._record_call(self.action, name, outcome, seconds, self.user_id)
+    
+    def close(self) -> list:
+        """Calls finished so far; later ones are recorded as they finish."""
+        with self._lock:
+            self._closed = True
+            return list(self._calls)
 
 
 class AIService:
@@ -102,17 +268,29 @@ class AIService:
     _providers = {
         'openai': OpenAIProvider,
         'anthropic': AnthropicProvider,
+        'mock': MockProvider,
     }
     
-    _instance: Optional[AIProvider] = None
+    # Provider instances (and their HTTP clients) are reused across requests
+    _instances: dict = {}
+    
+    # Coalesces identical in-flight transforms within and across workers
+    _inflight = SingleFlight()
+    
+    # Tracks provider latency and sends hedged requests
+    _router = HedgedRouter()
     
     @classmethod
-    def get_provider(cls, provider_name: Optional[str] = None) -> AIProvider:
-        """Get AI provider instance."""
+    def resolve_provider_name(cls, provider_name: Optional[str] = None) -> str:
+        """Resolve the provider name, defaulting to the configured one."""
         if provider_name is None:
             provider_name = current_app.config.get('AI_PROVIDER', 'openai')
-        
-        provider_name = provider_name.lower()
+        return provider_name.lower()
+    
+    @classmethod
+    def get_provider(cls, provider_name: Optional[str] = None) -> AIProvider:
+        """Get AI provider instance."""
+        provider_name = cls.resolve_provider_name(provider_name)
         
         if provider_name not in cls._providers:
             raise ValueError(f'Unknown AI provider: {provider_name}')
@@ -122,21 +300,159 @@ class AIService:
             api_key = current_app.config.get('OPENAI_API_KEY')
             if not api_key:
                 raise ValueError('OPENAI_API_KEY not configured')
-            return OpenAIProvider(api_key)
         
         elif provider_name == 'anthropic':
             api_key = current_app.config.get('ANTHROPIC_API_KEY')
             if not api_key:
                 raise ValueError('ANTHROPIC_API_KEY not configured')
-            return AnthropicProvider(api_key)
         
-        raise ValueError(f'Provider {provider_name} not configured')
+        elif provider_name == 'mock':
+            if not current_app.config.get('MOCK_AI_ENABLED'):
+                raise ValueError('Mock AI provider is disabled')
+            api_key = None
+        
+        else:
+            raise ValueError(f'Provider {provider_name} not configured')
+        
+        instance_key = (provider_name, api_key)
+        if instance_key not in cls._instances:
+            timeout = current_app.config.get('AI_REQUEST_TIMEOUT_SECONDS')
+            if provider_name == 'mock':
+                cls._instances[instance_key] = MockProvider(
+                    timeout=timeout,
+                    latency=current_app.config.get('MOCK_AI_LATENCY', 'lognormal:800,0.5'),
+                    tokens_per_second=current_app.config.get('MOCK_AI_TOKENS_PER_SECOND', 50),
+                    error_rate=current_app.config.get('MOCK_AI_ERROR_RATE', 0.0)
+                )
+            else:
+                cls._instances[instance_key] = cls._providers[provider_name](api_key, timeout=timeout)
+        return cls._instances[instance_key]
+    
+    @classmethod
+    def get_hedge_provider(cls, primary_name: str) -> Optional[tuple]:
+        """Return (name, provider) to hedge against, or None when hedging is off."""
+        if current_app.config.get('AI_ROUTING', 'single') != 'hedged':
+            return None
+        
+        hedge_name = cls.resolve_provider_name(current_app.config.get('AI_HEDGE_PROVIDER', 'anthropic'))
+        if hedge_name == primary_name:
+            return None
+        
+        try:
+            return hedge_name, cls.get_provider(hedge_name)
+        except ValueError:
+            # Secondary not configured: route to the primary only
+            return None
+    
+    @classmethod
+    def cache_key(
+        cls,
+        provider_name: str,
+        text: str,
+        action: str,
+        context: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """Key identifying one user's transform request; equal keys produce interchangeable results."""
+        payload = '\x00'.join([user_id or '', provider_name, action, context or '', text]).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
     
     @classmethod
     def transform(cls, text: str, action: str, context: Optional[str] = None, provider: Optional[str] = None) -> str:
-        """Transform text using configured AI provider."""
-        ai_provider = cls.get_provider(provider)
-        return ai_provider.transform_text(text, action, context)
+        """Transform text using configured AI provider.
+        
+        Concurrent identical requests share a single upstream call. Every
+        provider call is recorded in the AI usage metrics.
+        """
+        provider_name = cls.resolve_provider_name(provider)
+        ai_provider = cls.get_provider(provider_name)
+        calls = _CallLog(action)
+        # Results are only shared within a user: transforms aren't deterministic
+        key = cls.cache_key(provider_name, text, action, context, calls.user_id)
+        
+        hedge = cls.get_hedge_provider(provider_name)
+        if hedge is None:
+            call = lambda: cls._router.call(
+                provider_name, lambda: ai_provider.transform_completion(text, action, context), calls
+            ).text
+        else:
+            hedge_name, hedge_provider = hedge
+            call = lambda: cls._router.hedged_call(
+                (provider_name, lambda: ai_provider.transform_completion(text, action, context)),
+                (hedge_name, lambda: hedge_provider.transform_completion(text, action, context)),
+                percentile=current_app.config.get('AI_HEDGE_PERCENTILE', 95),
+                default_delay=current_app.config.get('AI_HEDGE_DEFAULT_DELAY_SECONDS', 2.0),
+                on_call=calls
+            ).text
+        
+        started = time.monotonic()
+        try:
+            result = cls._inflight.do(key, call)
+        except Exception:
+            cls._record_calls(action, calls.close(), ai_provider, provider_name)
+            raise
+        cls._record_calls(action, calls.close(), ai_provider, provider_name, time.monotonic() - started)
+        return result
+    
+    @classmethod
+    def complete(
+        cls,
+        system: str,
+        prompt: str,
+        action: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        provider: Optional[str] = None
+    ) -> str:
+        """Run a custom prompt on the configured provider, recording usage."""
+        provider_name = cls.resolve_provider_name(provider)
+        ai_provider = cls.get_provider(provider_name)
+        calls = _CallLog(action)
+        try:
+            return cls._router.call(
+                provider_name, lambda: ai_provider.complete(system, prompt, temperature, max_tokens), calls
+            ).text
+        finally:
+            cls._record_calls(action, calls.close(), ai_provider, provider_name)
+    
+    @classmethod
+    def _record_calls(
+        cls,
+        action: str,
+        calls: list,
+        ai_provider: AIProvider,
+        provider_name: str,
+        shared_elapsed: Optional[float] = None
+    ):
+        """Emit usage metrics for the upstream calls made by one request."""
+        if not calls and shared_elapsed is not None:
+            # Result came from a coalesced in-flight call
+            usage_recorder.record(
+                action=action,
+                provider=provider_name,
+                model=ai_provider.model,
+                latency_ms=shared_elapsed * 1000,
+                cache_hit=True
+            )
+            return
+        
+        for name, outcome, seconds in calls:
+            cls._record_call(action, name, outcome, seconds)
+    
+    @classmethod
+    def _record_call(cls, action: str, name: str, outcome, seconds: float, user_id: Optional[str] = None):
+        """Emit usage metrics for one upstream call (a Completion or the exception it raised)."""
+        is_error = isinstance(outcome, BaseException)
+        usage_recorder.record(
+            action=action,
+            provider=name,
+            model=cls.get_provider(name).model if is_error else outcome.model,
+            prompt_tokens=0 if is_error else outcome.prompt_tokens,
+            completion_tokens=0 if is_error else outcome.completion_tokens,
+            latency_ms=seconds * 1000,
+            error_class=type(outcome).__name__ if is_error else None,
+            user_id=user_id
+        )
     
     @classmethod
     def get_available_actions(cls) -> list:
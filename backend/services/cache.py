@@ -0,0 +1,240 @@
+"""Response cache for tree and listing endpoints.
+
+Cached values are namespaced (e.g. one namespace per user's books, one per
+book's notes), and every namespace has a generation token stored alongside
+the values. Keys embed the current token, so invalidating a namespace is a
+single write of a fresh token: older entries become unreachable and simply
+age out. A reader that built its value from pre-write data stores it under
+the old token, which no one reads again, so a hit is never stale.
+
+Two backends: an in-process LRU (per worker, so only safe with a single
+worker) and Redis (shared by all workers; any server speaking the Redis
+protocol). Caching is off unless one is configured.
+
+Backend errors never fail a request: reads fall back to building the value,
+and the worker bypasses the cache until everything cached before the error
+has expired, since an invalidation may have been lost.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger('spryte.cache')
+
+
+class CacheBackend(ABC):
+    """Byte-string key/value store with TTLs."""
+
+    # Exceptions raised when the store is unavailable
+    errors: tuple = ()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent; returns whether it was set."""
+        ...
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU with TTLs."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _get_entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _put(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get_entry(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'max_entries': self.max_entries}
+
+
+class RedisCache(CacheBackend):
+    """Shared cache on a Redis-protocol server (requires the ``redis`` package)."""
+
+    # Fail fast so an unreachable server costs each request milliseconds, not seconds
+    SOCKET_TIMEOUT_SECONDS = 0.25
+
+    def __init__(self, url: str):
+        import redis
+        self.errors = (redis.exceptions.RedisError,)
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=self.SOCKET_TIMEOUT_SECONDS, socket_connect_timeout=self.SOCKET_TIMEOUT_SECONDS
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return bool(self._client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+
+class ResponseCache:
+    """Generation-keyed JSON cache in front of a backend."""
+
+    # Generation tokens outlive cached values so entries are never orphaned early
+    GENERATION_TTL_FACTOR = 4
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self._bypass_until = 0.0  # Monotonic time until which a failed backend is skipped
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    @staticmethod
+    def _config(key: str, default):
+        return current_app.config.get(key, default) if has_app_context() else default
+
+    @property
+    def backend(self) -> Optional[CacheBackend]:
+        """The configured backend (created once per process), or None if disabled."""
+        kind = self._config('CACHE_BACKEND', 'none')
+        with self._lock:
+            if self._backend is None and kind != 'none':
+                if kind == 'memory':
+                    self._backend = MemoryCache(self._config('CACHE_MAX_ENTRIES', 10000))
+                elif kind == 'redis':
+                    self._backend = RedisCache(self._config('CACHE_URL', 'redis://localhost:6379/0'))
+                else:
+                    raise ValueError(f'Unknown cache backend: {kind}')
+            return self._backend
+
+    def _available(self) -> Optional[CacheBackend]:
+        """The backend, unless it failed recently."""
+        if time.monotonic() < self._bypass_until:
+            return None
+        return self.backend
+
+    def _failed(self, action: str) -> None:
+        # An invalidation may have been lost: skip the cache until values cached before now expire
+        self.stats['errors'] += 1
+        self._bypass_until = time.monotonic() + self._config('CACHE_TTL_SECONDS', 300)
+        logger.warning('Response cache %s failed; bypassing the cache for this worker', action, exc_info=True)
+
+    def _generation(self, backend: CacheBackend, namespace: str) -> str:
+        key = f'gen:{namespace}'
+        token = backend.get(key)
+        if token is None:
+            # First use (or the token expired): start a fresh generation
+            ttl = self._config('CACHE_TTL_SECONDS', 300) * self.GENERATION_TTL_FACTOR
+            backend.add(key, uuid.uuid4().hex[:12].encode(), ttl)
+            token = backend.get(key) or b''
+        return token.decode()
+
+    def get_or_build(self, namespace: str, key: str, build: Callable[[], Any]) -> Any:
+        """The cached JSON value for key in namespace, building and storing it on a miss."""
+        backend = self._available()
+        if backend is None:
+            return build()
+
+        try:
+            full_key = f'{namespace}:{self._generation(backend, namespace)}:{key}'
+            cached = backend.get(full_key)
+        except backend.errors:
+            self._failed('read')
+            return build()
+        if cached is not None:
+            self.stats['hits'] += 1
+            return json.loads(cached)
+
+        self.stats['misses'] += 1
+        value = build()
+        try:
+            backend.set(full_key, json.dumps(value, default=str).encode('utf-8'), self._config('CACHE_TTL_SECONDS', 300))
+        except backend.errors:
+            self._failed('write')
+        return value
+
+    def invalidate(self, *namespaces: str) -> None:
+        """Start a new generation for each namespace, orphaning its cached values."""
+        backend = self.backend
+        if backend is None:
+            return
+        ttl = self._config('CACHE_TTL_SECONDS', 300) * self.GENERATION_TTL_FACTOR
+        for namespace in set(namespaces):
+            try:
+                backend.set(f'gen:{namespace}', uuid.uuid4().hex[:12].encode(), ttl)
+            except backend.errors:
+                self._failed('invalidation')
+                return
+            self.stats['invalidations'] += 1
+
+    def snapshot(self) -> dict:
+        """Hit-rate statistics for this worker."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        backend = self.backend
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None,
+            'backend': self._config('CACHE_BACKEND', 'none'),
+            'bypassed': time.monotonic() < self._bypass_until,
+            **(backend.snapshot() if backend else {})
+        }
+
+
+response_cache = ResponseCache()
+
+
+def books_namespace(user_id: str) -> str:
+    return f'books:{user_id}'
+
+
+def notes_namespace(user_id: str, book_id: str) -> str:
+    """Note tree of a book; changes only with titles, structure, order or link counts."""
+    return f'notes:{user_id}:{book_id}'
+
+
+def note_list_namespace(user_id: str, book_id: str) -> str:
+    """Flat note list of a book; changes with every note save."""
+    return f'note-list:{user_id}:{book_id}'
@@ -0,0 +1,631 @@
+"""Real-time collaborative canvas editing.
+
+Clients editing the same note exchange block-level operations over a
+WebSocket (see routes.collab) instead of racing full-canvas autosaves.
+
+Merging: the canvas is a last-writer-wins map keyed by block id, merged per
+block field. Every operation carries a Lamport timestamp ``[counter,
+client_id]``; a field takes the value of the highest timestamp that touched
+it, and a delete hides the block until a later set. Applying operations is
+commutative and idempotent, so every replica converges whatever order the
+operations arrive in.
+
+Fan-out: connections on the same worker get operations straight from the
+in-memory session. Other workers receive them through the capped
+``collab_ops`` collection, which every worker tails (like the event broker).
+
+A worker opening a session asks the others for their whole replicas and
+merges them, so it starts from the live canvas rather than the last write.
+
+Persistence: one worker per note holds a short lease in ``collab_leases``,
+renewed for as long as its session is open, and writes the merged canvas
+every few seconds while it is dirty, and once more when its last editor
+leaves. The field timestamps are saved next to it in ``collab_states``, so a
+session reopened later still merges late operations correctly, and a worker
+taking the lease over merges the saved canvas before writing its own. A note
+being edited costs one write per flush interval, not one write per editor
+per autosave.
+"""
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from database import get_db
+from models import Note
+from .events import EventBroker
+
+logger = logging.getLogger('spryte.collab')
+
+# Sorts before every client timestamp (stored canvas state uses counter 0)
+MIN_TS = (-1, '')
+
+
+def _worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _timestamp(value) -> tuple:
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError('ts must be [counter, client_id]')
+    counter, client_id = value
+    if not isinstance(counter, int) or counter < 1 or not isinstance(client_id, str):
+        raise ValueError('ts must be [counter, client_id]')
+    return counter, client_id
+
+
+def _stored(ts) -> Optional[tuple]:
+    return tuple(ts) if ts else None
+
+
+class BlockMap:
+    """Last-writer-wins map of canvas blocks, merged per field."""
+
+    def __init__(self, canvas_data: dict, clocks: Optional[dict] = None):
+        """Load a stored canvas, with the timestamps saved by to_clocks() if they match it."""
+        clocks = clocks or {}
+        saved_blocks = clocks.get('blocks', {})
+        saved_meta = clocks.get('meta', {})
+        self.blocks = {}  # block_id -> {'fields', 'clocks', 'created', 'deleted'}
+        self.meta = {}  # other top-level canvas keys -> (value, ts)
+        self.clock = clocks.get('clock', 0)  # Highest Lamport counter seen
+
+        for index, block in enumerate(canvas_data.get('blocks', [])):
+            if not isinstance(block, dict) or 'id' not in block:
+                continue
+            block_id = str(block['id'])
+            ts = (0, f'{index:08d}')  # Keeps the stored block order
+            saved = saved_blocks.get(block_id, {})
+            fields = {name: value for name, value in block.items() if name != 'id'}
+            self.blocks[block_id] = {
+                'fields': fields,
+                'clocks': {name: _stored(saved.get('clocks', {}).get(name)) or ts for name in fields},
+                'created': _stored(saved.get('created')) or ts,
+                'deleted': _stored(saved.get('deleted'))
+            }
+        # Deleted blocks keep their tombstones so older sets stay hidden
+        for block_id, saved in saved_blocks.items():
+            if block_id not in self.blocks and saved.get('deleted'):
+                self.blocks[block_id] = {
+                    'fields': {},
+                    'clocks': {},
+                    'created': _stored(saved['created']),
+                    'deleted': _stored(saved['deleted'])
+                }
+        for key, value in canvas_data.items():
+            if key != 'blocks':
+                self.meta[key] = (value, _stored(saved_meta.get(key)) or (0, ''))
+
+    def _block(self, block_id, ts: tuple) -> dict:
+        if not isinstance(block_id, str) or not block_id:
+            raise ValueError('block_id must be a non-empty string')
+        block = self.blocks.setdefault(block_id, {'fields': {}, 'clocks': {}, 'created': ts, 'deleted': None})
+        # Order blocks by their earliest write, which every replica agrees on eventually
+        block['created'] = min(block['created'], ts)
+        return block
+
+    def apply(self, op: dict) -> bool:
+        """Merge one operation; returns whether the state changed.
+
+        Operations: ``{'type': 'set', 'block_id', 'fields': {...}, 'ts'}``,
+        ``{'type': 'delete', 'block_id', 'ts'}`` and ``{'type': 'put', 'key',
+        'value', 'ts'}`` for top-level canvas keys other than blocks.
+        Raises ValueError for malformed operations.
+        """
+        if not isinstance(op, dict):
+            raise ValueError('operation must be an object')
+        ts = _timestamp(op.get('ts'))
+        kind = op.get('type')
+
+        if kind == 'set':
+            fields = op.get('fields')
+            if not isinstance(fields, dict):
+                raise ValueError('set needs fields')
+            block = self._block(op.get('block_id'), ts)
+            changed = False
+            for name, value in fields.items():
+                if name != 'id' and ts > block['clocks'].get(name, MIN_TS):
+                    block['fields'][name] = value
+                    block['clocks'][name] = ts
+                    changed = True
+        elif kind == 'delete':
+            block = self._block(op.get('block_id'), ts)
+            changed = block['deleted'] is None or ts > block['deleted']
+            if changed:
+                block['deleted'] = ts
+        elif kind == 'put':
+            key = op.get('key')
+            if not isinstance(key, str) or key == 'blocks':
+                raise ValueError('put needs a key other than blocks')
+            changed = ts > self.meta.get(key, (None, MIN_TS))[1]
+            if changed:
+                self.meta[key] = (op.get('value'), ts)
+        else:
+            raise ValueError(f'Unknown operation type: {kind!r}')
+
+        self.clock = max(self.clock, ts[0])
+        return changed
+
+    @staticmethod
+    def _visible(block: dict) -> bool:
+        # A set newer than the delete brings the block back
+        return block['deleted'] is None or max(block['clocks'].values(), default=MIN_TS) > block['deleted']
+
+    def to_canvas(self) -> dict:
+        """The merged canvas in the stored ``canvas_data`` shape."""
+        blocks = sorted(
+            (block['created'], block_id, block)
+            for block_id, block in self.blocks.items()
+            if self._visible(block)
+        )
+        canvas = {key: value for key, (value, _) in self.meta.items()}
+        canvas['blocks'] = [{'id': block_id, **block['fields']} for _, block_id, block in blocks]
+        return canvas
+
+    def to_clocks(self) -> dict:
+        """The merge timestamps, for storing next to the canvas."""
+        return {
+            'clock': self.clock,
+            'blocks': {
+                block_id: {
+                    'clocks': {name: list(ts) for name, ts in block['clocks'].items()},
+                    'created': list(block['created']),
+                    'deleted': list(block['deleted']) if block['deleted'] else None
+                }
+                for block_id, block in self.blocks.items()
+            },
+            'meta': {key: list(ts) for key, (_, ts) in self.meta.items()}
+        }
+
+    def to_state(self) -> dict:
+        """The whole replica, hidden blocks' fields included, for relaying to other workers."""
+        clocks = self.to_clocks()
+        for block_id, block in self.blocks.items():
+            clocks['blocks'][block_id]['fields'] = dict(block['fields'])
+        clocks['meta'] = {key: [value, list(ts)] for key, (value, ts) in self.meta.items()}
+        return clocks
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'BlockMap':
+        """Rebuild a replica sent by to_state()."""
+        replica = cls({})
+        replica.clock = state.get('clock', 0)
+        for block_id, block in state.get('blocks', {}).items():
+            replica.blocks[block_id] = {
+                'fields': dict(block.get('fields') or {}),
+                'clocks': {name: tuple(ts) for name, ts in block.get('clocks', {}).items()},
+                'created': tuple(block['created']),
+                'deleted': _stored(block.get('deleted'))
+            }
+        for key, (value, ts) in state.get('meta', {}).items():
+            replica.meta[key] = (value, tuple(ts))
+        return replica
+
+    def merge(self, other: 'BlockMap') -> bool:
+        """Merge another replica field by field; returns whether the state changed.
+
+        Like apply(), merging is commutative and idempotent, so replicas that
+        exchanged states agree whatever operations each saw first.
+        """
+        changed = False
+        for block_id, theirs in other.blocks.items():
+            block = self.blocks.setdefault(
+                block_id, {'fields': {}, 'clocks': {}, 'created': theirs['created'], 'deleted': None}
+            )
+            for name, ts in theirs['clocks'].items():
+                if ts > block['clocks'].get(name, MIN_TS):
+                    block['fields'][name] = theirs['fields'].get(name)
+                    block['clocks'][name] = ts
+                    changed = True
+            if theirs['created'] < block['created']:
+                block['created'] = theirs['created']
+                changed = True
+            if theirs['deleted'] and (block['deleted'] is None or theirs['deleted'] > block['deleted']):
+                block['deleted'] = theirs['deleted']
+                changed = True
+        for key, (value, ts) in other.meta.items():
+            if ts > self.meta.get(key, (None, MIN_TS))[1]:
+                self.meta[key] = (value, ts)
+                changed = True
+        self.clock = max(self.clock, other.clock)
+        return changed
+
+
+class CollabConnection:
+    """One editor's outgoing message queue."""
+
+    # Beyond this the editor is sent a fresh snapshot instead of the backlog
+    MAX_PENDING = 1024
+
+    def __init__(self, session: 'CollabSession', user_id: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=self.MAX_PENDING)
+        self.stale = False
+        self.closed = False
+
+    def put(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Dropping operations would diverge the editor; resync it instead
+            self.stale = True
+
+    def get(self, timeout: float) -> Optional[dict]:
+        if self.stale:
+            self.stale = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return self.session.snapshot()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class CollabSession:
+    """This worker's merged copy of one note's canvas and its local editors."""
+
+    def __init__(self, note: Note, clocks: Optional[dict] = None):
+        self.note_id = note.id
+        self.user_id = note.user_id
+        self.state = BlockMap(note.canvas_data, clocks)
+        self.saved_at = note.updated_at  # The stored canvas version merged into state
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.dirty = False
+        # Set once the state of the worker holding the note's lease has been merged
+        self.synced = threading.Event()
+        self.sync_from: Optional[str] = None
+
+    @property
+    def clock(self) -> int:
+        return self.state.clock
+
+    def _snapshot(self) -> dict:
+        return {
+            'type': 'snapshot',
+            'canvas': self.state.to_canvas(),
+            'clock': self.state.clock,
+            'editors': len(self.connections)
+        }
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return self._snapshot()
+
+    def apply(self, ops: list):
+        """Merge operations; returns (valid ops, ops that changed the state)."""
+        valid, applied = [], []
+        with self.lock:
+            for op in ops:
+                try:
+                    changed = self.state.apply(op)
+                except ValueError:
+                    continue
+                valid.append(op)
+                if changed:
+                    applied.append(op)
+            if applied:
+                self.dirty = True
+        return valid, applied
+
+    def merge(self, state: BlockMap) -> bool:
+        """Merge another worker's replica; returns whether anything changed."""
+        with self.lock:
+            changed = self.state.merge(state)
+            if changed:
+                self.dirty = True
+        return changed
+
+    def broadcast(self, message: dict, exclude: Optional[CollabConnection] = None) -> None:
+        with self.lock:
+            connections = [c for c in self.connections if c is not exclude]
+        for connection in connections:
+            connection.put(message)
+
+
+class CollabRelay(EventBroker):
+    """Carries operations and session states between workers through a tailed capped collection.
+
+    Messages: ``ops`` (an editor's operations), ``sync`` (a worker opened a
+    session and asks the others for theirs) and ``state`` (a whole replica,
+    sent in reply to ``sync``).
+    """
+
+    COLLECTION = 'collab_ops'
+
+    def __init__(self, hub: 'CollabHub'):
+        super().__init__()
+        self._hub = hub
+
+    def _publish(self, note_id: str, kind: str, **data) -> None:
+        try:
+            get_db()[self.COLLECTION].insert_one({
+                'note_id': note_id,
+                'kind': kind,
+                'origin': _worker_id(),
+                **data,
+                'ts': datetime.utcnow(),
+            })
+            self.stats['published'] += 1
+        except PyMongoError:
+            logger.exception('Failed to relay %s for note %s', kind, note_id)
+
+    def publish_ops(self, note_id: str, ops: list) -> None:
+        self._publish(note_id, 'ops', ops=ops)
+
+    def request_states(self, note_id: str) -> None:
+        self._publish(note_id, 'sync')
+
+    def publish_state(self, note_id: str, state: dict) -> None:
+        self._publish(note_id, 'state', state=state)
+
+    def _dispatch(self, doc: dict) -> None:
+        if not self._remember(doc['_id']) or doc.get('origin') == _worker_id():
+            return
+        kind = doc.get('kind', 'ops')
+        if kind == 'sync':
+            handled = self._hub.send_state(doc['note_id'])
+        elif kind == 'state':
+            handled = self._hub.receive_state(doc['note_id'], doc['origin'], doc.get('state') or {})
+        else:
+            handled = self._hub.receive(doc['note_id'], doc.get('ops') or [])
+        if handled:
+            self.stats['dispatched'] += 1
+
+
+class CollabHub:
+    """This worker's collaboration sessions, relay and persistence."""
+
+    LEASES = 'collab_leases'
+    STATES = 'collab_states'
+
+    def __init__(self):
+        self._sessions = {}  # note_id -> CollabSession
+        self._lock = threading.Lock()
+        self.relay = CollabRelay(self)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._flush_seconds = 2.0
+        self._sync_seconds = 1.0
+        self.stats = {'ops': 0, 'flushes': 0, 'flush_errors': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, note: Note, user_id: str):
+        """Open (or reuse) the note's session and add an editor, queueing its snapshot."""
+        with self._lock:
+            session = self._sessions.get(note.id)
+        if session is None:
+            candidate = CollabSession(note, self._saved_clocks(note))
+            with self._lock:
+                session = self._sessions.setdefault(note.id, candidate)
+            if session is candidate:
+                self._sync(session)
+                # Take the lease now if it is free, so canvas PUTs are refused from here on
+                self._flush(session)
+        # The stored canvas lags the lease holder by up to a flush; wait briefly for its state
+        session.synced.wait(self._sync_seconds)
+        session.synced.set()
+
+        connection = CollabConnection(session, user_id)
+        with session.lock:
+            session.connections.add(connection)
+            # Queued first, so every operation the editor gets applies on top of it
+            connection.put(session._snapshot())
+        return session, connection
+
+    def _saved_clocks(self, note: Note) -> Optional[dict]:
+        # Saved timestamps only apply if nothing else rewrote the canvas since
+        saved = get_db()[self.STATES].find_one({'_id': note.id})
+        return saved['clocks'] if saved and saved.get('saved_at') == note.updated_at else None
+
+    def _sync(self, session: CollabSession) -> None:
+        """Ask the other workers' sessions of a new session's note for their unflushed state."""
+        lease = get_db()[self.LEASES].find_one({'_id': session.note_id, 'expires_at': {'$gt': datetime.utcnow()}})
+        if lease and lease['owner'] != _worker_id():
+            session.sync_from = lease['owner']
+        else:
+            session.synced.set()
+        # Every session replies, not just the lease holder's: operations relayed before
+        # this session existed are only in their origin's state until the holder gets them
+        self.relay.request_states(session.note_id)
+
+    def leave(self, session: CollabSession, connection: CollabConnection) -> None:
+        """Remove an editor; the last one out persists the canvas and closes the session."""
+        connection.close()
+        with session.lock:
+            session.connections.discard(connection)
+            if session.connections:
+                return
+        # Persist before closing, so an editor joining right after loads the merged canvas
+        self._flush(session)
+        with self._lock:
+            with session.lock:
+                if session.connections:
+                    return  # Someone rejoined meanwhile
+            if self._sessions.get(session.note_id) is session:
+                del self._sessions[session.note_id]
+        self._flush(session)
+        self._release(session.note_id)
+
+    def submit(self, session: CollabSession, connection: CollabConnection, ops: list) -> int:
+        """Merge an editor's operations, fan them out and relay them; returns how many applied."""
+        valid, applied = session.apply(ops)
+        self.stats['ops'] += len(valid)
+        if applied:
+            session.broadcast({'type': 'ops', 'ops': applied, 'clock': session.clock}, exclude=connection)
+        if valid:
+            self.relay.publish_ops(session.note_id, valid)
+        return len(applied)
+
+    def receive(self, note_id: str, ops: list) -> bool:
+        """Merge operations relayed from another worker into the local session, if any."""
+        with self._lock:
+            session = self._sessions.get(note_id)
+        if session is None:
+            return False
+        _, applied = session.apply(ops)
+        if applied:
+            session.broadcast({'type': 'ops', 'ops': applied, 'clock': session.clock})
+        return True
+
+    def send_state(self, note_id: str) -> bool:
+        """Relay the local session's whole replica, for a worker that just opened the note."""
+        with self._lock:
+            session = self._sessions.get(note_id)
+        if session is None:
+            return False
+        with session.lock:
+            state = session.state.to_state()
+        self.relay.publish_state(note_id, state)
+        return True
+
+    def receive_state(self, note_id: str, origin: str, state: dict) -> bool:
+        """Merge another worker's replica into the local session, resyncing its editors if it changed."""
+        with self._lock:
+            session = self._sessions.get(note_id)
+        if session is None:
+            return False
+        try:
+            replica = BlockMap.from_state(state)
+        except (KeyError, TypeError, ValueError):
+            logger.warning('Ignoring malformed collaboration state for note %s from %s', note_id, origin)
+            return False
+        if session.merge(replica):
+            session.broadcast(session.snapshot())
+        if origin == session.sync_from:
+            session.synced.set()
+        return True
+
+    def _acquire(self, note_id: str) -> tuple:
+        """Take or renew this worker's lease to persist a note; returns (held, renewed).
+
+        renewed is False when the lease was just taken, from another worker or
+        from nobody, so the canvas may have been written by someone else.
+        """
+        now = datetime.utcnow()
+        try:
+            previous = get_db()[self.LEASES].find_one_and_update(
+                {'_id': note_id, '$or': [{'owner': _worker_id()}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'owner': _worker_id(), 'expires_at': now + timedelta(seconds=self._flush_seconds * 3)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False, False  # Another worker holds a live lease
+        return True, previous is not None and previous.get('owner') == _worker_id()
+
+    def _release(self, note_id: str) -> None:
+        try:
+            get_db()[self.LEASES].delete_one({'_id': note_id, 'owner': _worker_id()})
+        except PyMongoError:
+            logger.exception('Failed to release collaboration lease for note %s', note_id)
+
+    def is_live(self, note_id: str) -> bool:
+        """Whether any worker holds a session lease for the note (so it must be edited over the socket)."""
+        lease = get_db()[self.LEASES].find_one({'_id': note_id, 'expires_at': {'$gt': datetime.utcnow()}}, {'_id': 1})
+        return lease is not None
+
+    def _merge_stored(self, session: CollabSession, note: Note) -> None:
+        """Merge a stored canvas written outside this session (another lease holder, or a save before the lease)."""
+        if session.merge(BlockMap(note.canvas_data, self._saved_clocks(note))):
+            session.broadcast(session.snapshot())
+        session.saved_at = note.updated_at
+
+    def _flush(self, session: CollabSession) -> None:
+        """Hold the note's lease and write the merged canvas if it changed.
+
+        The lease is renewed even while the session is idle, so it stays with
+        a worker that has live editors. A worker taking the lease over, or
+        finding the stored canvas rewritten since it last merged it, merges
+        that canvas first and never overwrites edits it has not seen.
+        """
+        canvas = None
+        try:
+            held, renewed = self._acquire(session.note_id)
+            if not held:
+                return
+            if not renewed:
+                try:
+                    note = Note.find_by_id(session.note_id, session.user_id)
+                    if note:
+                        self._merge_stored(session, note)
+                except PyMongoError:
+                    self._release(session.note_id)  # Take it over (and catch up) again next flush
+                    raise
+            if not session.dirty:
+                return
+            note = Note.find_by_id(session.note_id, session.user_id)
+            if note is None:
+                return
+            if note.updated_at != session.saved_at:
+                self._merge_stored(session, note)
+            with session.lock:
+                canvas = session.state.to_canvas()
+                clocks = session.state.to_clocks()
+                session.dirty = False
+            note.update_canvas(canvas)
+            # As read back later: BSON dates keep milliseconds
+            session.saved_at = note.updated_at.replace(microsecond=note.updated_at.microsecond // 1000 * 1000)
+            get_db()[self.STATES].update_one(
+                {'_id': session.note_id},
+                {'$set': {'clocks': clocks, 'saved_at': note.updated_at}},
+                upsert=True
+            )
+            self.stats['flushes'] += 1
+        except PyMongoError:
+            if canvas is not None:
+                session.dirty = True
+            self.stats['flush_errors'] += 1
+            logger.exception('Failed to persist collaborative canvas for note %s', session.note_id)
+
+    def _run(self, app) -> None:
+        with app.app_context():
+            while not self._stopped.wait(self._flush_seconds):
+                with self._lock:
+                    sessions = list(self._sessions.values())
+                for session in sessions:
+                    self._flush(session)
+
+    def start(self, app) -> None:
+        """Start this worker's relay tailer and flush thread."""
+        if self.running:
+            return
+        self._flush_seconds = app.config.get('COLLAB_FLUSH_SECONDS', 2.0)
+        self._sync_seconds = app.config.get('COLLAB_SYNC_SECONDS', 1.0)
+        self.relay.start(app)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(app,), name='collab-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.relay.stop()
+
+    def snapshot(self) -> dict:
+        """Session, editor and throughput counts for this worker."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            **self.stats,
+            'sessions': len(sessions),
+            'editors': sum(len(session.connections) for session in sessions),
+            'relayed_in': self.relay.stats['dispatched'],
+            'relayed_out': self.relay.stats['published']
+        }
+
+
+collab_hub = CollabHub()
@@ -0,0 +1,106 @@
+"""Text embedders for semantic note search.
+
+``HashingEmbedder`` is fully local with no model download: sublinear term
+frequencies of words and word bigrams are hashed into a fixed number of
+signed buckets. ``SentenceTransformerEmbedder`` runs a small CPU model
+(requires the optional ``sentence-transformers`` package) and captures
+synonyms that hashing cannot.
+
+All embedders return L2-normalized float32 rows, so cosine similarity is a
+dot product.
+"""
+import math
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import List
+
+import numpy as np
+from flask import current_app
+
+TOKEN_RE = re.compile(r'[a-z0-9]+(?:[-\'][a-z0-9]+)*')
+
+STOPWORDS = frozenset('''
+a an and are as at be but by for from has have i if in into is it its of on or so that the their them
+then there these they this to was we were what when which who will with you your our not no do does
+did can could should would may might must just than too very also about over after before up out
+'''.split())
+
+
+class Embedder(ABC):
+    """Turns texts into normalized float32 vectors."""
+
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return an array of shape (len(texts), dim)."""
+        pass
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+
+class HashingEmbedder(Embedder):
+    """Hashed bag of words and bigrams with sublinear term frequency."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _features(self, text: str) -> Counter:
+        words = [w for w in TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+        features = Counter(words)
+        features.update(f'{a} {b}' for a, b in zip(words, words[1:]))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                # Bigrams are weaker evidence than single words
+                weight = (1.0 + math.log(count)) * (0.5 if ' ' in feature else 1.0)
+                vectors[row, h % self.dim] += sign * weight
+        return self.normalize(vectors)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Small sentence-transformers model run on CPU."""
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f'st-{model_name}'
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
+        return self.normalize(vectors)
+
+
+_embedders = {}
+_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """Return the configured embedder (created once per process)."""
+    kind = current_app.config.get('EMBEDDER', 'hashing')
+    with _lock:
+        if kind not in _embedders:
+            if kind == 'hashing':
+                _embedders[kind] = HashingEmbedder(current_app.config.get('EMBEDDER_HASHING_DIM', 256))
+            elif kind == 'sentence-transformers':
+                _embedders[kind] = SentenceTransformerEmbedder(
+                    current_app.config.get('EMBEDDER_MODEL', 'all-MiniLM-L6-v2')
+                )
+            else:
+                raise ValueError(f'Unknown embedder: {kind}')
+        return _embedders[kind]
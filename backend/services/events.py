@@ -0,0 +1,182 @@
+"""Per-user event fan-out for push connections.
+
+Events are appended to the capped ``events`` collection, which doubles as a
+cross-worker broker: every worker tails it with one tailable cursor and
+hands matching events to the local subscribers (open SSE streams) of that
+user. The collection also keeps a short history, so a reconnecting client
+can replay what it missed via ``Last-Event-ID``.
+
+A capped collection works on a standalone MongoDB; change streams would
+need a replica set.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import CursorType
+from pymongo.errors import PyMongoError
+
+from database import get_db
+
+logger = logging.getLogger('spryte.events')
+
+
+class Subscription:
+    """A single open stream's queue of pending events."""
+
+    # Slow consumers drop events beyond this rather than growing without bound
+    MAX_PENDING = 256
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=self.MAX_PENDING)
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            logger.warning('Dropping event for slow subscriber of user %s', self.user_id)
+
+    def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """Publishes user events and fans them out to this worker's subscribers."""
+
+    COLLECTION = 'events'
+
+    # When the tail cursor is reopened, re-read this much history (duplicates are skipped)
+    RESUME_OVERLAP = timedelta(seconds=2)
+
+    # Recently dispatched event ids remembered for de-duplication
+    SEEN_SIZE = 2048
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._seen = deque(maxlen=self.SEEN_SIZE)
+        self._seen_set = set()
+        self.stats = {'published': 0, 'dispatched': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, user_id: str, event_type: str, data: dict) -> None:
+        """Append an event for a user; every worker's tailer delivers it."""
+        try:
+            get_db()[self.COLLECTION].insert_one({
+                'user_id': user_id,
+                'type': event_type,
+                'data': data,
+                'ts': datetime.utcnow(),
+            })
+            self.stats['published'] += 1
+        except PyMongoError:
+            # Push is best-effort; clients still converge by polling
+            logger.exception('Failed to publish %s event', event_type)
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(subscription.user_id)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._subscribers[subscription.user_id]
+
+    def replay(self, user_id: str, last_event_id: str) -> list:
+        """Events for a user published after the given event id, oldest first."""
+        try:
+            after = ObjectId(last_event_id)
+        except (InvalidId, TypeError):
+            return []
+        cursor = get_db()[self.COLLECTION].find({'user_id': user_id, '_id': {'$gt': after}})
+        return [self._to_event(doc) for doc in cursor]
+
+    @staticmethod
+    def _to_event(doc: dict) -> dict:
+        return {'id': str(doc['_id']), 'type': doc['type'], 'data': doc['data']}
+
+    def _remember(self, doc_id) -> bool:
+        """Record a tailed document id; False if it was already dispatched."""
+        if doc_id in self._seen_set:
+            return False
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(doc_id)
+        self._seen_set.add(doc_id)
+        return True
+
+    def _dispatch(self, doc: dict) -> None:
+        if not self._remember(doc['_id']):
+            return
+
+        with self._lock:
+            subs = list(self._subscribers.get(doc.get('user_id'), ()))
+        if not subs:
+            return
+        event = self._to_event(doc)
+        for subscription in subs:
+            subscription.put(event)
+        self.stats['dispatched'] += 1
+
+    def _tail(self, app) -> None:
+        with app.app_context():
+            collection = get_db()[self.COLLECTION]
+            resume_from = datetime.utcnow()
+            while not self._stopped.is_set():
+                try:
+                    cursor = collection.find(
+                        {'ts': {'$gte': resume_from - self.RESUME_OVERLAP}},
+                        cursor_type=CursorType.TAILABLE_AWAIT
+                    )
+                    while cursor.alive and not self._stopped.is_set():
+                        for doc in cursor:
+                            resume_from = max(resume_from, doc['ts'])
+                            self._dispatch(doc)
+                except PyMongoError:
+                    logger.exception('Event tail cursor failed')
+                # The cursor dies on an empty collection or after errors; reopen shortly
+                time.sleep(1)
+
+    def start(self, app) -> None:
+        """Start this worker's tailer thread."""
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._tail, args=(app,), name=f'{self.COLLECTION}-tail', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+event_broker = EventBroker()
+
+
+def publish_event(user_id: str, event_type: str, data: dict) -> None:
+    """Publish an event to a user's push connections."""
+    event_broker.publish(user_id, event_type, data)
@@ -0,0 +1,331 @@
+"""Book export to zip archives of Markdown, plain text or JSON files.
+
+The archive is produced as a stream: books and notes are read with cursors,
+each note is converted and compressed on its own, and the bytes written so
+far are yielded right away. Memory stays bounded by the largest single note,
+not by the size of the book.
+"""
+import json
+import re
+import zipfile
+from datetime import datetime
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional
+
+from database import get_db
+from models import Book, Note
+
+EXPORT_FORMATS = ('md', 'txt', 'json')
+
+# Notes fetched per cursor batch
+CURSOR_BATCH_SIZE = 50
+
+_UNSAFE_FILENAME = re.compile(r'[\x00-\x1f<>:"/\\|?*]+')
+
+_BLOCK_TAGS = {'p', 'div', 'section', 'article', 'header', 'footer', 'table', 'tr', 'figure'}
+_HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+
+class _HTMLConverter(HTMLParser):
+    """Converts block HTML (as produced by the rich text editor) to Markdown or plain text."""
+
+    def __init__(self, markdown: bool):
+        super().__init__(convert_charrefs=True)
+        self.markdown = markdown
+        self.lines: List[str] = []
+        self.current = ''
+        self.lists: List[list] = []  # Stack of [ordered, next number]
+        self.links: List[Optional[str]] = []
+        self.quote_depth = 0
+        self.in_pre = False
+
+    def _break(self, blank: bool = False) -> None:
+        if self.current.strip():
+            self.lines.append('> ' * self.quote_depth + self.current.rstrip())
+        self.current = ''
+        if blank and self.lines and self.lines[-1] != '':
+            self.lines.append('')
+
+    def _mark(self, text: str) -> None:
+        if self.markdown:
+            self.current += text
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in _HEADINGS:
+            self._break(blank=True)
+            self._mark('#' * _HEADINGS[tag] + ' ')
+        elif tag in _BLOCK_TAGS:
+            self._break(blank=not self.lists)
+        elif tag == 'br':
+            self._break()
+        elif tag in ('ul', 'ol'):
+            self._break(blank=not self.lists)
+            self.lists.append([tag == 'ol', 1])
+        elif tag == 'li':
+            self._break()
+            indent = '  ' * (len(self.lists) - 1)
+            if self.lists and self.lists[-1][0]:
+                self.current += f'{indent}{self.lists[-1][1]}. '
+                self.lists[-1][1] += 1
+            else:
+                self.current += f'{indent}- '
+        elif tag in ('strong', 'b'):
+            self._mark('**')
+        elif tag in ('em', 'i'):
+            self._mark('*')
+        elif tag in ('s', 'del', 'strike'):
+            self._mark('~~')
+        elif tag == 'code' and not self.in_pre:
+            self._mark('`')
+        elif tag == 'pre':
+            self._break(blank=True)
+            self.in_pre = True
+            if self.markdown:
+                self.lines.append('```')
+        elif tag == 'blockquote':
+            self._break(blank=True)
+            if self.markdown:
+                self.quote_depth += 1
+        elif tag == 'a':
+            self.links.append(attrs.get('href'))
+            self._mark('[')
+        elif tag == 'img' and self.markdown:
+            self.current += f"![{attrs.get('alt') or ''}]({attrs.get('src') or ''})"
+        elif tag == 'input' and attrs.get('type') == 'checkbox':
+            self.current += '[x] ' if 'checked' in attrs else '[ ] '
+
+    def handle_endtag(self, tag):
+        if tag in _HEADINGS or tag in _BLOCK_TAGS:
+            self._break(blank=not self.lists)
+        elif tag in ('ul', 'ol'):
+            self._break()
+            if self.lists:
+                self.lists.pop()
+            if not self.lists:
+                self._break(blank=True)
+        elif tag == 'li':
+            self._break()
+        elif tag in ('strong', 'b'):
+            self._mark('**')
+        elif tag in ('em', 'i'):
+            self._mark('*')
+        elif tag in ('s', 'del', 'strike'):
+            self._mark('~~')
+        elif tag == 'code' and not self.in_pre:
+            self._mark('`')
+        elif tag == 'pre':
+            self._break()
+            self.in_pre = False
+            if self.markdown:
+                self.lines.append('```')
+            self._break(blank=True)
+        elif tag == 'blockquote':
+            self._break(blank=True)
+            self.quote_depth = max(self.quote_depth - 1, 0)
+        elif tag == 'a':
+            href = self.links.pop() if self.links else None
+            self._mark(f']({href})' if href else ']')
+
+    def handle_data(self, data):
+        if self.in_pre:
+            for i, line in enumerate(data.split('\n')):
+                if i:
+                    self.lines.append(self.current)
+                    self.current = ''
+                self.current += line
+        else:
+            self.current += re.sub(r'\s+', ' ', data) if self.current else re.sub(r'\s+', ' ', data).lstrip()
+
+    def result(self) -> str:
+        self._break()
+        return '\n'.join(self.lines).strip()
+
+
+def html_to_markdown(html: str) -> str:
+    """Convert editor HTML to Markdown."""
+    converter = _HTMLConverter(markdown=True)
+    converter.feed(html or '')
+    converter.close()
+    return converter.result()
+
+
+def html_to_text(html: str) -> str:
+    """Convert editor HTML to plain text, keeping paragraph and list structure."""
+    converter = _HTMLConverter(markdown=False)
+    converter.feed(html or '')
+    converter.close()
+    return converter.result()
+
+
+def _reading_order(blocks: list) -> list:
+    """Canvas blocks top to bottom, then left to right."""
+    def position(block):
+        pos = block.get('position') or {}
+        return (pos.get('y', block.get('y', 0)) or 0, pos.get('x', block.get('x', 0)) or 0)
+    return sorted((b for b in blocks if isinstance(b, dict)), key=position)
+
+
+def note_to_markdown(note: Note) -> str:
+    parts = [f'# {note.title}']
+    for block in _reading_order(note.canvas_data.get('blocks', [])):
+        if block.get('type') == 'shape':
+            text = unescape(block.get('text') or '').strip()
+        else:
+            text = html_to_markdown(block.get('content') or '')
+        if text:
+            parts.append(text)
+    if len(parts) == 1 and note.content:
+        parts.append(note.content)
+    if note.tags:
+        parts.append(' '.join(f'#{tag}' for tag in note.tags))
+    return '\n\n'.join(parts) + '\n'
+
+
+def note_to_text(note: Note) -> str:
+    parts = [note.title + '\n' + '=' * max(len(note.title), 3)]
+    for block in _reading_order(note.canvas_data.get('blocks', [])):
+        if block.get('type') == 'shape':
+            text = unescape(block.get('text') or '').strip()
+        else:
+            text = html_to_text(block.get('content') or '')
+        if text:
+            parts.append(text)
+    if len(parts) == 1 and note.content:
+        parts.append(note.content)
+    return '\n\n'.join(parts) + '\n'
+
+
+def safe_filename(name: str, fallback: str = 'Untitled') -> str:
+    """A name usable as a zip path segment on every OS."""
+    name = _UNSAFE_FILENAME.sub('_', name or '').strip(' .')
+    return name[:100] or fallback
+
+
+class _ZipStream:
+    """Write-only, non-seekable file whose written bytes are drained as chunks.
+
+    zipfile detects the missing seek() and writes sizes in data descriptors
+    after each member, so nothing has to be rewritten later.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _UniqueNames:
+    """Deduplicates sibling file names within each folder of the archive."""
+
+    def __init__(self):
+        self._taken: Dict[str, int] = {}
+
+    def __call__(self, folder: str, name: str, extension: str = '') -> str:
+        key = f'{folder}/{name}{extension}'.lower()
+        count = self._taken.get(key, 0) + 1
+        self._taken[key] = count
+        suffix = f' ({count})' if count > 1 else ''
+        return f'{folder}/{name}{suffix}{extension}'
+
+
+def _book_folders(root: Book) -> Iterator[tuple]:
+    """(book, archive folder) for the root and every descendant book, parents first."""
+    db = get_db()
+    names = _UniqueNames()
+    folders = {root.id: safe_filename(root.name)}
+    yield root, folders[root.id]
+
+    # Book metadata only; notes are what make books large
+    cursor = db[Book.COLLECTION].find({'user_id': root.user_id, 'ancestors': root.id}).sort([('order_key', 1), ('_id', 1)])
+    pending = {}
+    for data in cursor:
+        book = Book.from_dict(data)
+        pending.setdefault(book.parent_id, []).append(book)
+
+    queue = [root.id]
+    while queue:
+        parent_id = queue.pop(0)
+        for book in pending.pop(parent_id, []):
+            folders[book.id] = names(folders[parent_id], safe_filename(book.name))
+            yield book, folders[book.id]
+            queue.append(book.id)
+
+
+def _note_folders(book: Book, book_folder: str, names: _UniqueNames) -> Dict[str, str]:
+    """Archive path (without extension) for each note of a book, nesting child notes under parents."""
+    db = get_db()
+    outline = {
+        str(data['_id']): (data.get('title') or '', data.get('parent_id'))
+        for data in db[Note.COLLECTION].find(
+            {'user_id': book.user_id, 'book_id': book.id}, {'title': 1, 'parent_id': 1}
+        ).sort([('order_key', 1), ('_id', 1)])
+    }
+    paths: Dict[str, str] = {}
+
+    def path_of(note_id: str, depth: int = 0) -> str:
+        if note_id in paths:
+            return paths[note_id]
+        title, parent_id = outline[note_id]
+        parent_folder = book_folder
+        if parent_id in outline and depth < 64:
+            parent_folder = path_of(parent_id, depth + 1)
+        paths[note_id] = names(parent_folder, safe_filename(title))
+        return paths[note_id]
+
+    for note_id in outline:
+        path_of(note_id)
+    return paths
+
+
+def export_book(book: Book, export_format: str) -> Iterator[bytes]:
+    """Yield a zip archive of a book, its sub-books and all their notes."""
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED)
+    db = get_db()
+    names = _UniqueNames()
+    extension = {'md': '.md', 'txt': '.txt', 'json': '.json'}[export_format]
+
+    for current, folder in _book_folders(book):
+        if export_format == 'json':
+            archive.writestr(f'{folder}/_book.json', json.dumps(current.to_json(), ensure_ascii=False, indent=2))
+
+        paths = _note_folders(current, folder, names)
+        cursor = db[Note.COLLECTION].find(
+            {'user_id': current.user_id, 'book_id': current.id}
+        ).sort([('order_key', 1), ('_id', 1)]).batch_size(CURSOR_BATCH_SIZE)
+        for data in cursor:
+            note = Note.from_dict(data)
+            if export_format == 'md':
+                body = note_to_markdown(note)
+            elif export_format == 'txt':
+                body = note_to_text(note)
+            else:
+                body = json.dumps(note.to_json(), ensure_ascii=False, indent=2, default=str)
+            info = zipfile.ZipInfo(paths.get(note.id, f'{folder}/{note.id}') + extension, note.updated_at.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, body)
+            yield stream.drain()
+
+    archive.close()
+    yield stream.drain()
+
+
+def export_filename(book: Book, export_format: str) -> str:
+    return f'{safe_filename(book.name)}-{export_format}-{datetime.utcnow():%Y%m%d}.zip'
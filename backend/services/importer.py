@@ -0,0 +1,539 @@
+"""Bulk import of zip archives of Markdown, plain text and JSON files.
+
+The layout mirrors services.exporter: folders become books, ``.md``,
+``.markdown``, ``.txt`` and ``.json`` files become notes, and a folder named
+like a note file next to it holds that note's child notes. A ``_book.json``
+in a folder sets the book's name, description, color and icon, so exported
+archives round-trip.
+
+Only the zip's central directory is read up front to plan the structure:
+ids, parents, ancestors and order keys are all assigned in memory. Files
+are then read one entry at a time, converted to laid-out canvas blocks and
+written with batched insert_many calls, so memory stays bounded by one
+batch of notes.
+"""
+import json
+import re
+import uuid
+import zipfile
+from datetime import datetime
+from html import escape
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from flask import current_app
+
+from database import get_db
+from models import Book, Note
+from models.ordering import keys_between
+from models.sync import next_seq
+from services.cache import response_cache, books_namespace
+
+NOTE_FORMATS = {'.md': 'md', '.markdown': 'md', '.txt': 'txt', '.json': 'json'}
+BOOK_METADATA = '_book.json'
+
+# Skipped entries listed in the result (the count is always complete)
+MAX_REPORTED_SKIPS = 100
+
+# Canvas layout: one column of text blocks, heights estimated from line counts
+BLOCK_X = 100
+BLOCK_Y = 100
+BLOCK_WIDTH = 450
+BLOCK_MIN_HEIGHT = 180
+BLOCK_GAP = 40
+BLOCK_PADDING = 48
+LINE_HEIGHT = 24
+CHARS_PER_LINE = 60
+
+# Plain text is split into blocks of about this many characters
+TEXT_BLOCK_CHARS = 2000
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+_LIST_ITEM = re.compile(r'^\s*([-*+]|\d+[.)])\s+(.*)$')
+_CHECKBOX = re.compile(r'^\[([ xX])\]\s+')
+_TAG_LINE = re.compile(r'^#[\w-]+(\s+#[\w-]+)*$')
+_SAFE_URL = re.compile(r'^(https?:|mailto:|/|#|\.)', re.IGNORECASE)
+
+_INLINE = [
+    (re.compile(r'\*\*(.+?)\*\*'), r'<strong>\1</strong>'),
+    (re.compile(r'(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])'), r'<em>\1</em>'),
+    (re.compile(r'~~(.+?)~~'), r'<s>\1</s>'),
+]
+# Link targets may hold one level of balanced parentheses, as in wiki URLs: Foo_(bar)
+_URL = r'((?:[^()\s]|\([^()\s]*\))+)'
+_IMAGE = re.compile(r'!\[([^\]]*)\]\(' + _URL + r'\)')
+_LINK = re.compile(r'\[([^\]]+)\]\(' + _URL + r'\)')
+
+
+def _inline(text: str) -> str:
+    """Inline Markdown (code, links, images, emphasis) to escaped HTML."""
+    parts = text.split('`')
+    if len(parts) % 2 == 0:
+        # Unbalanced backtick: keep the last one literally
+        parts[-2:] = [parts[-2] + '`' + parts[-1]]
+    html = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            html.append(f'<code>{escape(part)}</code>')
+            continue
+        part = escape(part)
+        part = _IMAGE.sub(
+            lambda m: f'<img alt="{m.group(1)}" src="{m.group(2)}">' if _SAFE_URL.match(m.group(2)) else m.group(0), part
+        )
+        part = _LINK.sub(
+            lambda m: f'<a href="{m.group(2)}">{m.group(1)}</a>' if _SAFE_URL.match(m.group(2)) else m.group(1), part
+        )
+        for pattern, replacement in _INLINE:
+            part = pattern.sub(replacement, part)
+        html.append(part)
+    return ''.join(html)
+
+
+def _estimated_lines(lines: List[str]) -> int:
+    return sum(max(1, -(-len(line) // CHARS_PER_LINE)) for line in lines)
+
+
+def markdown_sections(text: str) -> List[Tuple[str, int]]:
+    """Split Markdown at headings into (HTML, estimated line count) sections."""
+    sections: List[Tuple[str, int]] = []
+    html: List[str] = []
+    source: List[str] = []
+    paragraph: List[str] = []
+    quote: List[str] = []
+    code: Optional[List[str]] = None
+    list_tag: Optional[str] = None
+
+    def close_blocks():
+        nonlocal list_tag
+        if paragraph:
+            html.append('<p>' + '<br>'.join(_inline(line) for line in paragraph) + '</p>')
+            paragraph.clear()
+        if quote:
+            html.append('<blockquote><p>' + '<br>'.join(_inline(line) for line in quote) + '</p></blockquote>')
+            quote.clear()
+        if list_tag:
+            html.append(f'</{list_tag}>')
+            list_tag = None
+
+    def close_section():
+        close_blocks()
+        if html:
+            sections.append((''.join(html), _estimated_lines(source)))
+        html.clear()
+        source.clear()
+
+    for line in text.split('\n'):
+        line = line.rstrip()
+        if code is not None:
+            if line.lstrip().startswith('```'):
+                html.append('<pre><code>' + escape('\n'.join(code)) + '</code></pre>')
+                code = None
+            else:
+                code.append(line)
+                source.append(line)
+            continue
+
+        if line.lstrip().startswith('```'):
+            close_blocks()
+            code = []
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            close_section()
+            level = len(heading.group(1))
+            html.append(f'<h{level}>{_inline(heading.group(2))}</h{level}>')
+            source.append(line)
+            continue
+
+        if not line.strip():
+            close_blocks()
+            continue
+
+        source.append(line)
+        item = _LIST_ITEM.match(line)
+        if item and not paragraph:
+            tag = 'ol' if item.group(1)[0].isdigit() else 'ul'
+            if list_tag != tag:
+                close_blocks()
+                html.append(f'<{tag}>')
+                list_tag = tag
+            body = item.group(2)
+            checkbox = _CHECKBOX.match(body)
+            prefix = ''
+            if checkbox:
+                prefix = '<input type="checkbox" checked> ' if checkbox.group(1) != ' ' else '<input type="checkbox"> '
+                body = body[checkbox.end():]
+            html.append(f'<li>{prefix}{_inline(body)}</li>')
+        elif line.startswith('>'):
+            if paragraph or list_tag:
+                close_blocks()
+            quote.append(line.lstrip('>').strip())
+        elif list_tag and line.startswith((' ', '\t')):
+            # Continuation of the previous list item
+            html[-1] = html[-1][:-len('</li>')] + '<br>' + _inline(line.strip()) + '</li>'
+        else:
+            if quote or list_tag:
+                close_blocks()
+            paragraph.append(line.strip())
+
+    if code is not None:
+        html.append('<pre><code>' + escape('\n'.join(code)) + '</code></pre>')
+    close_section()
+    return sections
+
+
+def text_sections(text: str) -> List[Tuple[str, int]]:
+    """Group plain text paragraphs into (HTML, estimated line count) sections."""
+    sections: List[Tuple[str, int]] = []
+    html: List[str] = []
+    source: List[str] = []
+    size = 0
+    for paragraph in re.split(r'\n\s*\n', text):
+        lines = [line.rstrip() for line in paragraph.strip('\n').split('\n') if line.strip()]
+        if not lines:
+            continue
+        if html and size + sum(len(line) for line in lines) > TEXT_BLOCK_CHARS:
+            sections.append((''.join(html), _estimated_lines(source)))
+            html, source, size = [], [], 0
+        html.append('<p>' + '<br>'.join(escape(line) for line in lines) + '</p>')
+        source.extend(lines + [''])
+        size += sum(len(line) for line in lines)
+    if html:
+        sections.append((''.join(html), _estimated_lines(source)))
+    return sections
+
+
+def layout_blocks(sections: List[Tuple[str, int]]) -> dict:
+    """Canvas data with one text block per section, stacked top to bottom."""
+    blocks = []
+    y = BLOCK_Y
+    for html, lines in sections:
+        height = max(BLOCK_MIN_HEIGHT, BLOCK_PADDING + LINE_HEIGHT * lines)
+        blocks.append({
+            'id': str(uuid.uuid4()),
+            'type': 'text',
+            'x': BLOCK_X,
+            'y': y,
+            'width': BLOCK_WIDTH,
+            'height': height,
+            'content': html,
+        })
+        y += height + BLOCK_GAP
+    return {'blocks': blocks, 'camera': {'x': 0, 'y': 0, 'zoom': 1}, 'version': 2}
+
+
+def parse_markdown(text: str, fallback_title: str) -> dict:
+    """Note fields from a Markdown file: a leading ``# Title`` and a trailing tag line are lifted out."""
+    lines = text.strip().split('\n')
+    title = fallback_title
+    if lines and re.match(r'^#\s+\S', lines[0]):
+        title = lines.pop(0)[1:].strip()
+    tags = []
+    if lines and _TAG_LINE.match(lines[-1].strip()):
+        tags = [tag[1:] for tag in lines.pop().split()]
+    return {'title': title, 'tags': tags, 'canvas_data': layout_blocks(markdown_sections('\n'.join(lines)))}
+
+
+def parse_text(text: str, fallback_title: str) -> dict:
+    """Note fields from a plain text file: a title underlined with ``===`` is lifted out."""
+    lines = text.strip().split('\n')
+    title = fallback_title
+    if len(lines) > 1 and re.match(r'^={3,}\s*$', lines[1]) and lines[0].strip():
+        title = lines[0].strip()
+        lines = lines[2:]
+    return {'title': title, 'tags': [], 'canvas_data': layout_blocks(text_sections('\n'.join(lines)))}
+
+
+def parse_json(text: str, fallback_title: str) -> dict:
+    """Note fields from a JSON note (as exported); raises ValueError if it isn't one."""
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError('not a note object')
+    canvas_data = data.get('canvas_data')
+    content = data.get('content') if isinstance(data.get('content'), str) else ''
+    if not isinstance(canvas_data, dict) or not canvas_data.get('blocks'):
+        canvas_data = layout_blocks(text_sections(content)) if content else None
+    tags = data.get('tags')
+    return {
+        'title': str(data.get('title') or fallback_title),
+        'tags': [str(tag) for tag in tags] if isinstance(tags, list) else [],
+        'content': content,
+        'canvas_data': canvas_data,
+    }
+
+
+PARSERS = {'md': parse_markdown, 'txt': parse_text, 'json': parse_json}
+
+
+class ArchiveImporter:
+    """Imports one archive into a user's books.
+
+    With a ``target`` book, top-level folders become its sub-books and loose
+    top-level files its notes. Without one, top-level folders become root
+    books and loose files go into a new book called ``fallback_name``.
+    """
+
+    def __init__(self, user_id: str, target: Optional[Book] = None, fallback_name: str = 'Imported notes'):
+        config = current_app.config
+        self.user_id = user_id
+        self.target = target
+        self.fallback_name = fallback_name
+        self.batch_size = config.get('IMPORT_BATCH_SIZE', 500)
+        self.max_entries = config.get('IMPORT_MAX_ENTRIES', 100000)
+        self.max_file_bytes = config.get('IMPORT_MAX_FILE_BYTES', 5 * 1024 * 1024)
+        self.books: Dict[tuple, dict] = {}  # Folder path -> planned book fields
+        self.notes: List[dict] = []  # Planned notes in archive order
+        self.skipped: List[dict] = []
+        self.skipped_count = 0
+
+    def _skip(self, path: str, reason: str) -> None:
+        self.skipped_count += 1
+        if len(self.skipped) < MAX_REPORTED_SKIPS:
+            self.skipped.append({'path': path, 'reason': reason})
+
+    def _read(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> Optional[str]:
+        """An entry's text, or None (recorded as skipped) if it is too large or unreadable."""
+        try:
+            with archive.open(info) as entry:
+                data = entry.read(self.max_file_bytes + 1)
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+            self._skip(info.filename, f'unreadable: {e}')
+            return None
+        if len(data) > self.max_file_bytes:
+            self._skip(info.filename, 'file too large')
+            return None
+        return data.decode('utf-8-sig', errors='replace')
+
+    def _plan(self, archive: zipfile.ZipFile) -> None:
+        """Assign ids, parents and order keys from entry names alone."""
+        metadata: Dict[tuple, zipfile.ZipInfo] = {}
+        files = []
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            parts = PurePosixPath(info.filename.replace('\\', '/')).parts
+            if not parts or any(part.startswith('.') or part == '__MACOSX' for part in parts):
+                continue
+            folder, name = tuple(parts[:-1]), parts[-1]
+            if name == BOOK_METADATA:
+                metadata[folder] = info
+                continue
+            path = PurePosixPath(name)
+            kind = NOTE_FORMATS.get(path.suffix.lower())
+            if not kind:
+                self._skip(info.filename, 'unsupported file type')
+                continue
+            if info.file_size > self.max_file_bytes:
+                self._skip(info.filename, 'file too large')
+                continue
+            files.append((folder, path.stem, kind, info))
+            if len(files) > self.max_entries:
+                raise ValueError(f'Archives may contain at most {self.max_entries} notes')
+
+        # A folder named like a sibling note file holds that note's children;
+        # the first file with a given name claims its folder
+        note_ids: Dict[tuple, ObjectId] = {}
+        for folder, stem, _, _ in files:
+            note_ids.setdefault((folder, stem.lower()), ObjectId())
+
+        claimed = set()
+        for folder, stem, kind, info in files:
+            book_path, parent_key = (), None
+            for i, part in enumerate(folder):
+                key = (folder[:i], part.lower())
+                if key in note_ids:
+                    parent_key = key
+                elif parent_key is None:
+                    book_path = folder[:i + 1]
+            # The root group (target or fallback book) only when files land there
+            for depth in range(1 if book_path else 0, len(book_path) + 1):
+                self._plan_book(book_path[:depth])
+
+            own_key = (folder, stem.lower())
+            _id = ObjectId() if own_key in claimed else note_ids[own_key]
+            claimed.add(own_key)
+            self.notes.append({
+                '_id': _id,
+                'book_path': book_path,
+                'parent_id': str(note_ids[parent_key]) if parent_key else None,
+                'kind': kind,
+                'stem': stem,
+                'info': info,
+            })
+
+        for folder, info in metadata.items():
+            if folder in self.books and not self.books[folder].get('existing'):
+                self._apply_metadata(archive, folder, info)
+
+        self._assign_book_fields()
+        self._assign_note_order()
+
+    def _plan_book(self, path: tuple) -> None:
+        if path in self.books:
+            return
+        if not path and self.target:
+            self.books[path] = {'_id': self.target._id, 'existing': True}
+        else:
+            self.books[path] = {'_id': ObjectId(), 'name': path[-1] if path else self.fallback_name}
+
+    def _apply_metadata(self, archive: zipfile.ZipFile, folder: tuple, info: zipfile.ZipInfo) -> None:
+        text = self._read(archive, info)
+        if text is None:
+            return
+        try:
+            data = json.loads(text)
+        except ValueError:
+            self._skip(info.filename, 'invalid JSON')
+            return
+        if not isinstance(data, dict):
+            return
+        for field in ('name', 'description', 'color', 'icon'):
+            if isinstance(data.get(field), str) and data[field].strip():
+                self.books[folder][field] = data[field]
+
+    def _last_key(self, collection: str, query: dict) -> Optional[str]:
+        last = get_db()[collection].find_one({'user_id': self.user_id, **query}, {'order_key': 1}, sort=[('order_key', -1)])
+        return last.get('order_key') if last else None
+
+    def _assign_book_fields(self) -> None:
+        """Parents, ancestors and order keys of the new books; top-level ones go after existing siblings."""
+        top_parent = self.target.id if self.target else None
+        top_ancestors = self.target.ancestors + [self.target.id] if self.target else []
+        groups: Dict[Optional[tuple], List[tuple]] = {}
+        for path, book in self.books.items():
+            if book.get('existing'):
+                continue
+            if len(path) <= 1:
+                book['parent_id'], book['ancestors'] = top_parent, top_ancestors
+                groups.setdefault(None, []).append(path)
+            else:
+                parent = self.books[path[:-1]]
+                book['parent_id'] = str(parent['_id'])
+                book['ancestors'] = parent['ancestors'] + [book['parent_id']]
+                groups.setdefault(path[:-1], []).append(path)
+
+        for group, paths in groups.items():
+            start = self._last_key(Book.COLLECTION, {'parent_id': top_parent}) if group is None else None
+            for path, key in zip(paths, keys_between(start, None, len(paths))):
+                self.books[path]['order_key'] = key
+
+    def _assign_note_order(self) -> None:
+        """Order keys per sibling group in archive order; top-level notes of the target go after its notes."""
+        groups: Dict[tuple, List[dict]] = {}
+        for note in self.notes:
+            note['book_id'] = str(self.books[note['book_path']]['_id'])
+            groups.setdefault((note['book_id'], note['parent_id']), []).append(note)
+
+        for (book_id, parent_id), notes in groups.items():
+            start = None
+            if self.target and book_id == self.target.id and parent_id is None:
+                start = self._last_key(Note.COLLECTION, {'book_id': book_id, 'parent_id': None})
+            for note, key in zip(notes, keys_between(start, None, len(notes))):
+                note['order_key'] = key
+
+    def _insert_books(self) -> List[str]:
+        now = datetime.utcnow()
+        db = get_db()
+        docs = []
+        for book in self.books.values():
+            if book.get('existing'):
+                continue
+            docs.append(Book(
+                user_id=self.user_id,
+                name=book['name'][:200] or 'Untitled',
+                _id=book['_id'],
+                parent_id=book['parent_id'],
+                description=book.get('description'),
+                color=book.get('color'),
+                icon=book.get('icon'),
+                created_at=now,
+                updated_at=now,
+                order_key=book['order_key'],
+                ancestors=book['ancestors']
+            ).to_dict())
+        for start in range(0, len(docs), self.batch_size):
+            seq = next_seq(self.user_id)
+            batch = [{**doc, 'sync_seq': seq} for doc in docs[start:start + self.batch_size]]
+            db[Book.COLLECTION].insert_many(batch, ordered=False)
+        return [str(doc['_id']) for doc in docs]
+
+    def _note(self, planned: dict, fields: dict, now: datetime) -> Note:
+        note = Note(
+            user_id=self.user_id,
+            book_id=planned['book_id'],
+            title=(fields.get('title') or '').strip()[:300] or planned['stem'] or 'Untitled',
+            _id=planned['_id'],
+            parent_id=planned['parent_id'],
+            content=fields.get('content'),
+            canvas_data=fields.get('canvas_data'),
+            tags=fields.get('tags'),
+            created_at=now,
+            updated_at=now,
+            order_key=planned['order_key']
+        )
+        note.text_hash = note.compute_text_hash()
+        return note
+
+    def _insert_notes(self, notes: List[Note]) -> None:
+        from services.note_index import index_notes
+
+        seq = next_seq(self.user_id)
+        get_db()[Note.COLLECTION].insert_many(
+            [{**note.to_dict(), 'sync_seq': seq} for note in notes], ordered=False
+        )
+        index_notes(notes)
+
+    def run(self, fileobj) -> dict:
+        """Import a zip archive from a seekable file object; raises ValueError for invalid archives."""
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise ValueError('Not a zip archive')
+
+        with archive:
+            self._plan(archive)
+            book_ids = self._insert_books()
+
+            imported = 0
+            batch: List[Note] = []
+            now = datetime.utcnow()
+            for planned in self.notes:
+                text = self._read(archive, planned['info'])
+                if text is None:
+                    fields = {}
+                else:
+                    try:
+                        fields = PARSERS[planned['kind']](text, planned['stem'])
+                    except ValueError:
+                        # Not a note object; keep the file's text rather than dropping it
+                        fields = parse_text(text, planned['stem'])
+                # Unreadable files still become (empty) notes so their children keep a parent
+                batch.append(self._note(planned, fields, now))
+                if len(batch) >= self.batch_size:
+                    self._insert_notes(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                self._insert_notes(batch)
+                imported += len(batch)
+
+        touched = [str(book['_id']) for book in self.books.values()]
+        response_cache.invalidate(books_namespace(self.user_id), *Note.listing_namespaces(self.user_id, touched))
+
+        from services.events import publish_event
+        publish_event(self.user_id, 'import.completed', {'book_ids': book_ids, 'books': len(book_ids), 'notes': imported})
+
+        return {
+            'books': len(book_ids),
+            'notes': imported,
+            'book_ids': book_ids,
+            'skipped': self.skipped,
+            'skipped_count': self.skipped_count
+        }
+
+
+def import_archive(fileobj, user_id: str, target: Optional[Book] = None, fallback_name: str = 'Imported notes') -> dict:
+    """Import a zip archive of notes into a user's books (see ArchiveImporter)."""
+    return ArchiveImporter(user_id, target, fallback_name).run(fileobj)
@@ -0,0 +1,76 @@
+"""MinHash signatures and LSH band keys for near-duplicate detection.
+
+A note's text is reduced to a set of word shingles; the fraction of equal
+positions in two MinHash signatures estimates the Jaccard similarity of those
+sets. Signatures are split into bands and each band is hashed to a key, so
+notes sharing any band key are candidates. With the default 32 bands of 4
+rows, pairs above roughly 0.5 similarity are very likely to collide while
+dissimilar pairs rarely do.
+"""
+import hashlib
+import re
+import zlib
+from typing import List, Set
+
+import numpy as np
+
+WORD_RE = re.compile(r'\w+')
+
+# Prime just above 2**32 for the universal hash family
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+
+class MinHasher:
+    """Computes fixed-size MinHash signatures and their LSH band keys."""
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be divisible by bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Fixed seed so signatures are comparable across processes and restarts
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=num_perm).astype(np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        """Overlapping word n-grams of the lower-cased text."""
+        words = WORD_RE.findall(text.lower())
+        if len(words) < self.shingle_size:
+            return {' '.join(words)} if words else set()
+        return {
+            ' '.join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature as a uint32 array of length num_perm."""
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        hashes = np.array([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64)
+        # (num_perm, num_shingles) permuted hashes, min over shingles
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _PRIME
+        return (permuted.min(axis=1) & np.uint64(_MAX_HASH)).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[str]:
+        """One key per band; notes sharing a key are similarity candidates."""
+        if (signature == _MAX_HASH).all():
+            return []  # Empty text matches nothing
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append(f'{band}:{hashlib.blake2b(rows, digest_size=8).hexdigest()}')
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(a == b))
+
+
+minhasher = MinHasher()
@@ -0,0 +1,291 @@
+"""Search indexing for notes.
+
+``Note.save`` calls :func:`index_note` whenever a note's plain text changes,
+and ``Note.delete`` calls :func:`remove_note`.
+
+Embeddings are stored one document per note in ``note_embeddings`` as raw
+float32 bytes. Each worker keeps a per-user :class:`VectorIndex` in memory,
+loaded on first search and refreshed incrementally from documents whose
+``updated_at`` moved since the last sync. Deletions are soft (``deleted``)
+so other workers see them during refresh.
+
+MinHash signatures live in ``note_signatures`` with their LSH band keys in
+a multikey index, so near-duplicate lookups are a single indexed query.
+
+Notes saved before indexing existed have no ``text_hash`` and are indexed
+lazily by :func:`backfill_user`.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+from bson import Binary, ObjectId
+from flask import current_app
+from pymongo import UpdateOne
+
+from database import get_db
+from .embeddings import get_embedder
+from .minhash import minhasher
+from .vector_index import VectorIndex
+
+
+class SemanticIndex:
+    """Per-user vector indexes for semantic note search."""
+
+    COLLECTION = 'note_embeddings'
+
+    # Re-read this much history on refresh so writes committed out of order aren't missed
+    REFRESH_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self):
+        self._indexes = OrderedDict()  # user_id -> (VectorIndex, synced_at)
+        self._lock = threading.Lock()  # Guards the two dicts only, never held across I/O
+        self._user_locks = {}  # user_id -> Lock serializing that user's load and refresh
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def index_notes(self, notes: list) -> None:
+        """Embed notes and store their vectors."""
+        if not notes:
+            return
+        embedder = get_embedder()
+        vectors = embedder.embed([note.plain_text() for note in notes])
+        now = datetime.utcnow()
+
+        get_db()[self.COLLECTION].bulk_write([
+            UpdateOne(
+                {'_id': note.id},
+                {'$set': {
+                    'user_id': note.user_id,
+                    'embedder': embedder.name,
+                    'vector': Binary(vector.tobytes()),
+                    'deleted': False,
+                    'updated_at': now,
+                }},
+                upsert=True
+            )
+            for note, vector in zip(notes, vectors)
+        ], ordered=False)
+
+        for note, vector in zip(notes, vectors):
+            entry = self._indexes.get(note.user_id)
+            if entry is not None and entry[0].dim == embedder.dim:
+                entry[0].upsert(note.id, vector)
+
+    def remove(self, user_id: str, note_ids: List[str]) -> None:
+        """Soft-delete notes' vectors (other workers drop them on refresh)."""
+        if not note_ids:
+            return
+        get_db()[self.COLLECTION].update_many(
+            {'_id': {'$in': note_ids}},
+            {'$set': {'deleted': True, 'updated_at': datetime.utcnow()}, '$unset': {'vector': ''}}
+        )
+        entry = self._indexes.get(user_id)
+        if entry is not None:
+            for note_id in note_ids:
+                entry[0].remove(note_id)
+
+    def _load(self, user_id: str) -> Tuple[VectorIndex, datetime]:
+        """Build a user's index from stored vectors, backfilling missing ones."""
+        embedder = get_embedder()
+        index = VectorIndex(embedder.dim)
+        synced_at = datetime.min
+        stale_ids = []
+
+        cursor = get_db()[self.COLLECTION].find({'user_id': user_id, 'deleted': False})
+        for doc in cursor:
+            synced_at = max(synced_at, doc['updated_at'])
+            if doc['embedder'] != embedder.name:
+                stale_ids.append(doc['_id'])
+                continue
+            index.upsert(doc['_id'], np.frombuffer(doc['vector'], dtype=np.float32))
+
+        with self._lock:
+            self._indexes[user_id] = (index, synced_at)
+        # Stored first so the backfilled vectors land in it through index_notes
+        backfill_user(user_id, stale_ids)
+        return index, synced_at
+
+    def _refresh(self, user_id: str, index: VectorIndex, synced_at: datetime) -> None:
+        """Apply vector changes written since the last sync (possibly by other workers)."""
+        embedder_name = get_embedder().name
+        cursor = get_db()[self.COLLECTION].find({
+            'user_id': user_id,
+            'updated_at': {'$gt': synced_at - self.REFRESH_OVERLAP}
+        })
+        for doc in cursor:
+            synced_at = max(synced_at, doc['updated_at'])
+            if doc.get('deleted') or doc['embedder'] != embedder_name:
+                index.remove(doc['_id'])
+            else:
+                index.upsert(doc['_id'], np.frombuffer(doc['vector'], dtype=np.float32))
+        with self._lock:
+            if user_id in self._indexes:
+                self._indexes[user_id] = (index, synced_at)
+
+    def _evict(self) -> None:
+        """Drop least recently searched users beyond the vector budget (caller holds the lock)."""
+        budget = current_app.config.get('SEMANTIC_INDEX_MAX_VECTORS', 200000)
+        total = sum(len(index) for index, _ in self._indexes.values())
+        while total > budget and len(self._indexes) > 1:
+            user_id, (index, _) = self._indexes.popitem(last=False)
+            self._user_locks.pop(user_id, None)
+            total -= len(index)
+
+    def search(self, user_id: str, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """Return up to k (note_id, score) pairs most similar to the query."""
+        # Loading embeds a user's unindexed notes; only that user's searches wait for it
+        with self._user_lock(user_id):
+            with self._lock:
+                entry = self._indexes.get(user_id)
+            if entry is None:
+                index, _ = self._load(user_id)
+            else:
+                self._refresh(user_id, *entry)
+                index = entry[0]
+        with self._lock:
+            if user_id in self._indexes:
+                self._indexes.move_to_end(user_id)
+            self._evict()
+
+        query_vector = get_embedder().embed([query])[0]
+        return index.search(query_vector, k)
+
+
+class SignatureIndex:
+    """MinHash signatures with LSH band keys for near-duplicate lookups."""
+
+    COLLECTION = 'note_signatures'
+
+    # Estimated Jaccard similarity at or above which a note counts as a near-duplicate
+    DUPLICATE_THRESHOLD = 0.8
+
+    # Candidates below this are band collisions rather than meaningful overlap
+    RELATED_THRESHOLD = 0.3
+
+    def index_notes(self, notes: list) -> None:
+        """Compute and store signatures for notes."""
+        if not notes:
+            return
+        now = datetime.utcnow()
+        operations = []
+        for note in notes:
+            signature = minhasher.signature(note.plain_text())
+            operations.append(UpdateOne(
+                {'_id': note.id},
+                {'$set': {
+                    'user_id': note.user_id,
+                    'signature': Binary(signature.tobytes()),
+                    'bands': minhasher.band_keys(signature),
+                    'updated_at': now,
+                }},
+                upsert=True
+            ))
+        get_db()[self.COLLECTION].bulk_write(operations, ordered=False)
+
+    def remove(self, note_ids: List[str]) -> None:
+        if note_ids:
+            get_db()[self.COLLECTION].delete_many({'_id': {'$in': note_ids}})
+
+    def similar(self, note, limit: int = 20) -> List[Tuple[str, float]]:
+        """Return (note_id, similarity) pairs for notes sharing an LSH band, best first."""
+        db = get_db()
+        doc = db[self.COLLECTION].find_one({'_id': note.id})
+        if doc is None:
+            self.index_notes([note])
+            doc = db[self.COLLECTION].find_one({'_id': note.id})
+        if not doc['bands']:
+            return []
+
+        signature = np.frombuffer(doc['signature'], dtype=np.uint32)
+        cursor = db[self.COLLECTION].find(
+            {'user_id': note.user_id, 'bands': {'$in': doc['bands']}, '_id': {'$ne': note.id}},
+            {'signature': 1}
+        )
+        scored = []
+        for candidate in cursor:
+            score = minhasher.similarity(signature, np.frombuffer(candidate['signature'], dtype=np.uint32))
+            if score >= self.RELATED_THRESHOLD:
+                scored.append((candidate['_id'], score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+
+semantic_index = SemanticIndex()
+signature_index = SignatureIndex()
+
+# Notes indexed per batch when backfilling
+BACKFILL_BATCH_SIZE = 256
+
+# Users this worker has already backfilled; new notes are indexed on save
+_backfilled_users = set()
+_backfilled_lock = threading.Lock()
+
+
+def index_notes(notes: list) -> None:
+    """Update all search indexes for notes whose text changed."""
+    semantic_index.index_notes(notes)
+    signature_index.index_notes(notes)
+
+
+def index_note(note) -> None:
+    """Update search indexes after a note's text changed."""
+    index_notes([note])
+
+
+def remove_notes(user_id: str, note_ids: List[str]) -> None:
+    """Remove deleted notes from search indexes."""
+    semantic_index.remove(user_id, note_ids)
+    signature_index.remove(note_ids)
+
+
+def remove_note(note) -> None:
+    """Remove a deleted note from search indexes."""
+    remove_notes(note.user_id, [note.id])
+
+
+def _index_backfill_batch(notes: list) -> None:
+    if not notes:
+        return
+    from models import Note
+
+    index_notes(notes)
+    get_db()[Note.COLLECTION].bulk_write([
+        UpdateOne({'_id': note._id}, {'$set': {'text_hash': note.compute_text_hash()}})
+        for note in notes
+    ], ordered=False)
+
+
+def backfill_user(user_id: str, stale_ids: List[str] = ()) -> None:
+    """Index a user's notes that were never indexed, plus any listed as stale."""
+    from models import Note
+
+    query = {'user_id': user_id, '$or': [{'text_hash': {'$exists': False}}]}
+    if stale_ids:
+        query['$or'].append({'_id': {'$in': [ObjectId(i) for i in stale_ids]}})
+
+    batch = []
+    for data in get_db()[Note.COLLECTION].find(query):
+        batch.append(Note.from_dict(data))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            _index_backfill_batch(batch)
+            batch = []
+    _index_backfill_batch(batch)
+
+
+def ensure_backfilled(user_id: str) -> None:
+    """Backfill a user's never-indexed notes, once per worker.
+
+    The backfill query scans the user's notes for a missing text_hash, so
+    it must not run on every lookup.
+    """
+    with _backfilled_lock:
+        if user_id in _backfilled_users:
+            return
+    backfill_user(user_id)
+    with _backfilled_lock:
+        _backfilled_users.add(user_id)
@@ -0,0 +1,86 @@
+"""Password hashing off the request path.
+
+bcrypt is CPU-bound by design, so hashes and checks run in a small process
+pool rather than on the worker thread serving the request. Auth endpoints
+are additionally capped to a few concurrent requests per worker, so a login
+burst queues behind itself instead of in front of note saves.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+
+import bcrypt
+from flask import current_app, jsonify, make_response
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+_auth_slots = None
+_auth_slots_lock = threading.Lock()
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """The pool for this process (recreated after a fork, e.g. gunicorn workers)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=current_app.config.get('PASSWORD_HASH_WORKERS', 2))
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def hash_password(password: str) -> str:
+    """Hash a password at the configured bcrypt cost."""
+    rounds = current_app.config.get('BCRYPT_ROUNDS', 12)
+    hashed = _get_executor().submit(_hash, password.encode('utf-8'), rounds).result()
+    return hashed.decode('utf-8')
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Verify a password against a bcrypt hash."""
+    return _get_executor().submit(_check, password.encode('utf-8'), password_hash.encode('utf-8')).result()
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Whether a hash was made at a different cost than the configured one."""
+    try:
+        cost = int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != current_app.config.get('BCRYPT_ROUNDS', 12)
+
+
+def _get_auth_slots() -> threading.BoundedSemaphore:
+    global _auth_slots
+    with _auth_slots_lock:
+        if _auth_slots is None:
+            _auth_slots = threading.BoundedSemaphore(current_app.config.get('AUTH_MAX_CONCURRENT', 4))
+        return _auth_slots
+
+
+def auth_concurrency_limit(view):
+    """Decorator capping concurrent password-hashing requests per worker."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        timeout = current_app.config.get('AUTH_QUEUE_TIMEOUT_SECONDS', 5)
+        slots = _get_auth_slots()
+        if not slots.acquire(timeout=timeout):
+            response = make_response(jsonify({'error': 'Too many sign-in attempts in progress, please retry'}), 503)
+            response.headers['Retry-After'] = str(math.ceil(timeout))
+            return response
+        try:
+            return view(*args, **kwargs)
+        finally:
+            slots.release()
+    return wrapper
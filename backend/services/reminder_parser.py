@@ -0,0 +1,294 @@
+"""Deterministic reminder text parser.
+
+Handles the @Reminder template, absolute dates and common relative phrases
+("tomorrow 3pm", "in 2 hours", "next friday at noon") without an LLM call.
+Each result carries a confidence score; callers fall back to the LLM parser
+when the score is below ``MIN_CONFIDENCE``.
+"""
+import re
+from datetime import datetime, timedelta, date, time
+from typing import Optional, Tuple
+
+# Results below this confidence should be re-parsed by the LLM
+MIN_CONFIDENCE = 0.8
+
+# Matches the Reminder action template, e.g.
+# 🔔 Reminder: 12/10/2025 10:00 AM - "Submit assignment"
+TEMPLATE_RE = re.compile(
+    r'^\s*(?:🔔\s*)?reminder:?\s*\[?(?P<date>\d{1,2}/\d{1,2}/\d{2,4})\]?\s*'
+    r'\[?(?P<time>\d{1,2}(?::\d{2})?\s*[ap]\.?m\.?)\]?\s*[-–—:]?\s*'
+    r'["“](?P<message>[^"”]+)["”]\s*$',
+    re.IGNORECASE
+)
+
+PREFIX_RE = re.compile(r'^\s*(?:🔔\s*)?(?:@?reminder:?|remind me(?: to)?)\s*', re.IGNORECASE)
+QUOTED_RE = re.compile(r'["“]([^"”]+)["”]')
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+WEEKDAYS = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+MONTH_NAME = r'(?P<month>jan|feb|mar|apr|may|jun|jul|aug|sept?|oct|nov|dec)[a-z]*\.?'
+WEEKDAY_NAME = r'(?P<weekday>mon|tue|wed|thu|fri|sat|sun)[a-z]*'
+
+SLASH_DATE_RE = re.compile(r'\b(?P<m>\d{1,2})/(?P<d>\d{1,2})(?:/(?P<y>\d{2}|\d{4}))?\b')
+ISO_DATE_RE = re.compile(r'\b(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})\b')
+MONTH_DAY_RE = re.compile(
+    rf'\b{MONTH_NAME}\s+(?P<d>\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+(?P<y>\d{{4}}))?\b',
+    re.IGNORECASE
+)
+DAY_MONTH_RE = re.compile(
+    rf'\b(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{MONTH_NAME}(?:,?\s+(?P<y>\d{{4}}))?\b',
+    re.IGNORECASE
+)
+RELATIVE_DAY_RE = re.compile(r'\b(?P<word>day after tomorrow|tomorrow|today|tonight)\b', re.IGNORECASE)
+WEEKDAY_RE = re.compile(rf'\b(?:(?P<qualifier>next|this|on)\s+)?{WEEKDAY_NAME}\b', re.IGNORECASE)
+OFFSET_RE = re.compile(
+    r'\bin\s+(?P<amount>\d+|an?|half an)\s+(?P<unit>min(?:ute)?s?|hours?|hrs?|days?|weeks?)\b',
+    re.IGNORECASE
+)
+TIME_12H_RE = re.compile(r'\b(?P<h>\d{1,2})(?::(?P<min>\d{2}))?\s*(?P<ampm>[ap])\.?m\.?(?!\w)', re.IGNORECASE)
+TIME_24H_RE = re.compile(r'\b(?P<h>[01]?\d|2[0-3]):(?P<min>[0-5]\d)\b')
+TIME_WORD_RE = re.compile(
+    r'\b(?:(?:in|this)\s+(?:the\s+)?|at\s+)?(?P<word>noon|midday|midnight|morning|afternoon|evening)\b',
+    re.IGNORECASE
+)
+
+TIME_WORDS = {
+    'noon': time(12, 0), 'midday': time(12, 0), 'midnight': time(0, 0),
+    'morning': time(9, 0), 'afternoon': time(15, 0), 'evening': time(18, 0),
+}
+
+# Anything temporal left over after extraction means we misread the text
+RESIDUE_RE = re.compile(
+    r'\d|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sept?|oct|nov|dec|january|february|march|april|june|july|'
+    r'august|september|october|november|december|mon|tue|wed|thu|fri|sat|sun|monday|tuesday|wednesday|'
+    r'thursday|friday|saturday|sunday|today|tomorrow|tonight|next|week|weeks|month|months|year|years|'
+    r'am|pm|noon|midnight|every|daily|weekly|hourly|hours?|minutes?|o\'?clock)\b',
+    re.IGNORECASE
+)
+FILLER_RE = re.compile(
+    r'^(?:\s|[-–—:,]|\b(?:at|on|by|to|for)\b)+|(?:\s|[-–—:,]|\b(?:at|on|by|in the|this|the)\b)+$',
+    re.IGNORECASE
+)
+# A message ending in one of these lost part of a phrase we don't understand
+DANGLING_RE = re.compile(r'\b(?:a|an|the|this|that|of|with|and|or|from|in the)$', re.IGNORECASE)
+
+DEFAULT_TIME = time(9, 0)
+TONIGHT_TIME = time(20, 0)
+
+
+def _year(value: Optional[str], default: int) -> int:
+    if not value:
+        return default
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _time_12h(hour: int, minute: int, ampm: str) -> time:
+    if not 1 <= hour <= 12:
+        raise ValueError(f'Invalid hour: {hour}')
+    hour = hour % 12 + (12 if ampm.lower() == 'p' else 0)
+    return time(hour, minute)
+
+
+class _Scanner:
+    """Consumes date/time expressions from text, leaving the remainder."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def take(self, pattern: re.Pattern) -> Optional[re.Match]:
+        match = pattern.search(self.text)
+        if match:
+            self.text = f'{self.text[:match.start()]} {self.text[match.end():]}'
+        return match
+
+
+def _parse_date(
+    scanner: _Scanner, now: datetime
+) -> Tuple[Optional[date], Optional[time], Optional[datetime], Optional[timedelta]]:
+    """Extract a date expression.
+
+    Returns (date, implied_time, absolute_datetime, roll); relative offsets
+    like "in 2 hours" resolve to an absolute datetime directly. ``roll`` is
+    how far to move a day-relative date ("today", "monday") whose time has
+    already passed; explicit dates are never moved.
+    """
+    today = now.date()
+
+    match = scanner.take(OFFSET_RE)
+    if match:
+        amount = match.group('amount').lower()
+        count = {'a': 1, 'an': 1, 'half an': 0.5}.get(amount)
+        count = float(amount) if count is None else count
+        unit = match.group('unit').lower()
+        if unit.startswith('min'):
+            delta = timedelta(minutes=count)
+        elif unit.startswith('h'):
+            delta = timedelta(hours=count)
+        elif unit.startswith('d'):
+            delta = timedelta(days=count)
+        else:
+            delta = timedelta(weeks=count)
+        if unit.startswith(('min', 'h')):
+            return None, None, (now + delta).replace(second=0, microsecond=0), None
+        return (now + delta).date(), None, None, None
+
+    match = scanner.take(ISO_DATE_RE)
+    if match:
+        return date(int(match.group('y')), int(match.group('m')), int(match.group('d'))), None, None, None
+
+    match = scanner.take(SLASH_DATE_RE)
+    if match:
+        parsed = date(_year(match.group('y'), today.year), int(match.group('m')), int(match.group('d')))
+        if not match.group('y') and parsed < today:
+            parsed = parsed.replace(year=parsed.year + 1)
+        return parsed, None, None, None
+
+    for pattern in (MONTH_DAY_RE, DAY_MONTH_RE):
+        match = scanner.take(pattern)
+        if match:
+            month = MONTHS[match.group('month').lower()[:3]]
+            parsed = date(_year(match.group('y'), today.year), month, int(match.group('d')))
+            if not match.group('y') and parsed < today:
+                parsed = parsed.replace(year=parsed.year + 1)
+            return parsed, None, None, None
+
+    match = scanner.take(RELATIVE_DAY_RE)
+    if match:
+        word = match.group('word').lower()
+        if word == 'tomorrow':
+            return today + timedelta(days=1), None, None, None
+        if word == 'day after tomorrow':
+            return today + timedelta(days=2), None, None, None
+        if word == 'tonight':
+            return today, TONIGHT_TIME, None, timedelta(days=1)
+        return today, None, None, timedelta(days=1)
+
+    match = scanner.take(WEEKDAY_RE)
+    if match:
+        weekday = WEEKDAYS[match.group('weekday').lower()[:3]]
+        days_ahead = (weekday - today.weekday()) % 7
+        if days_ahead == 0 and (match.group('qualifier') or '').lower() == 'next':
+            days_ahead = 7
+        return today + timedelta(days=days_ahead), None, None, timedelta(weeks=1)
+
+    return None, None, None, None
+
+
+def _parse_time(scanner: _Scanner) -> Tuple[Optional[time], bool]:
+    """Extract a time-of-day expression.
+
+    Returns (time, ambiguous); "3:30" without am/pm could be either, so it is
+    read as written but flagged for the LLM.
+    """
+    match = scanner.take(TIME_12H_RE)
+    if match:
+        return _time_12h(int(match.group('h')), int(match.group('min') or 0), match.group('ampm')), False
+
+    match = scanner.take(TIME_24H_RE)
+    if match:
+        hour = int(match.group('h'))
+        # "09:30" and "15:30" are unambiguous 24-hour times, "9:30" is not
+        return time(hour, int(match.group('min'))), 1 <= hour <= 12 and not match.group('h').startswith('0')
+
+    match = scanner.take(TIME_WORD_RE)
+    if match:
+        return TIME_WORDS[match.group('word').lower()], False
+
+    return None, False
+
+
+def _result(due_date: datetime, message: str, confidence: float) -> dict:
+    return {
+        'success': True,
+        'date': due_date.strftime('%m/%d/%Y'),
+        'time': due_date.strftime('%I:%M %p'),
+        'message': message,
+        'due_date': due_date,
+        'confidence': round(confidence, 2),
+        'source': 'local',
+    }
+
+
+def _failure(error: str) -> dict:
+    return {'success': False, 'error': error, 'confidence': 0.0, 'source': 'local'}
+
+
+def parse_reminder_locally(text: str, now: Optional[datetime] = None) -> dict:
+    """Parse reminder text without an LLM.
+
+    Returns the same shape as the LLM parser plus ``confidence`` (0-1) and
+    ``source``. Times are naive local datetimes, matching the LLM parser.
+    """
+    if now is None:
+        now = datetime.now()
+
+    try:
+        # Fast path: the addon's own template
+        match = TEMPLATE_RE.match(text)
+        if match:
+            month, day, year = match.group('date').split('/')
+            due_day = date(_year(year, now.year), int(month), int(day))
+            time_match = TIME_12H_RE.search(match.group('time'))
+            due_time = _time_12h(int(time_match.group('h')), int(time_match.group('min') or 0), time_match.group('ampm'))
+            return _result(datetime.combine(due_day, due_time), match.group('message').strip(), 1.0)
+
+        body = PREFIX_RE.sub('', text, count=1)
+        quoted = QUOTED_RE.search(body)
+        message = quoted.group(1).strip() if quoted else None
+        if quoted:
+            body = f'{body[:quoted.start()]} {body[quoted.end():]}'
+
+        scanner = _Scanner(body)
+        due_day, implied_time, absolute, roll = _parse_date(scanner, now)
+        due_time, ambiguous = _parse_time(scanner)
+    except ValueError as e:
+        return _failure(f'Invalid date or time: {e}')
+
+    if due_day is None and due_time is None and absolute is None:
+        return _failure('No date or time found')
+
+    confidence = 0.95
+    if ambiguous:
+        confidence = MIN_CONFIDENCE - 0.2
+    if absolute is not None:
+        if due_time is not None:
+            # "in 2 hours at 5pm" is contradictory
+            return _failure('Conflicting relative and absolute times')
+        due_date = absolute
+    else:
+        if due_time is None:
+            due_time = implied_time or DEFAULT_TIME
+            confidence -= 0.05
+        if due_day is None:
+            due_day, roll = now.date(), timedelta(days=1)
+            confidence -= 0.05
+        elif roll and datetime.combine(due_day, due_time) <= now:
+            # The user named a day whose time has passed; less sure what they meant
+            confidence -= 0.1
+        if roll and datetime.combine(due_day, due_time) <= now:
+            # "monday 9am" said on Monday at 10am means next week, never the past
+            due_day += roll
+        due_date = datetime.combine(due_day, due_time)
+
+    leftover = re.sub(r'\s+', ' ', scanner.text).strip()
+    if message is None:
+        message = FILLER_RE.sub('', leftover).strip()
+        if RESIDUE_RE.search(message):
+            confidence = min(confidence, 0.4)
+        elif DANGLING_RE.search(message):
+            confidence = min(confidence, MIN_CONFIDENCE - 0.2)
+    elif RESIDUE_RE.search(leftover):
+        confidence = min(confidence, 0.4)
+    else:
+        confidence = min(confidence + 0.05, 1.0)
+
+    if not message:
+        return {**_failure('No reminder message found'), 'confidence': 0.3}
+
+    return _result(due_date, message, confidence)
@@ -0,0 +1,256 @@
+"""Server-side reminder scheduler.
+
+Each worker runs one scheduler thread holding the reminders that trigger
+within the next few minutes in a heap, ordered by trigger time. The window
+is reloaded from an indexed query periodically and topped up between
+reloads by scanning reminders changed and tombstones of reminders deleted
+since the last scan (see models.sync), so database load
+depends on the number of workers rather than on users, tabs or reminders.
+
+When a reminder's trigger time arrives, the worker flips ``notified`` with
+a conditional update; only the worker that wins the flip hands the reminder
+to the delivery channels, so each reminder fires exactly once across
+workers. ``GET /api/reminders/due`` is answered from the same in-memory
+window.
+"""
+import heapq
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from database import get_db
+from models import Reminder
+from models.sync import TOMBSTONES, next_seq
+from .events import publish_event
+
+logger = logging.getLogger('spryte.reminders')
+
+
+class DeliveryChannel(ABC):
+    """Receives reminders when they fire."""
+
+    @abstractmethod
+    def deliver(self, reminder: Reminder) -> None:
+        pass
+
+
+class LogDeliveryChannel(DeliveryChannel):
+    """Logs fired reminders."""
+
+    def deliver(self, reminder: Reminder) -> None:
+        logger.info('Reminder %s fired for user %s: %s', reminder.id, reminder.user_id, reminder.message)
+
+
+class PushDeliveryChannel(DeliveryChannel):
+    """Pushes fired reminders to the user's open event streams."""
+
+    def deliver(self, reminder: Reminder) -> None:
+        payload = reminder.to_dict()
+        payload['trigger_time'] = reminder.trigger_at.isoformat() + 'Z'
+        publish_event(reminder.user_id, 'reminder', payload)
+
+
+class ReminderScheduler:
+    """Heap of upcoming reminder triggers for one worker process."""
+
+    # Reminders are still fired this long after their trigger time (e.g. after a restart)
+    MISSED_GRACE = timedelta(minutes=5)
+
+    # Changes committed slightly out of order are picked up by re-reading this much history
+    SCAN_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._heap = []  # (trigger_at, reminder_id)
+        self._reminders = {}  # reminder_id -> Reminder
+        self._by_user = {}  # user_id -> set of reminder_ids
+        self._channels: List[DeliveryChannel] = [LogDeliveryChannel(), PushDeliveryChannel()]
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._horizon = timedelta(minutes=10)
+        self._window_end = datetime.min
+        self.stats = {'fired': 0, 'lost_race': 0, 'reloads': 0, 'scans': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_channel(self, channel: DeliveryChannel) -> None:
+        self._channels.append(channel)
+
+    def start(self, app) -> None:
+        """Start the scheduler thread for this worker."""
+        if self.running:
+            return
+        self._horizon = timedelta(minutes=app.config.get('REMINDER_SCHEDULER_HORIZON_MINUTES', 10))
+        scan_interval = app.config.get('REMINDER_SCHEDULER_SCAN_SECONDS', 5)
+        reload_interval = app.config.get('REMINDER_SCHEDULER_RELOAD_SECONDS', 60)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(app, scan_interval, reload_interval),
+            name='reminder-scheduler',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    # Window maintenance
+
+    def track(self, reminder: Reminder) -> None:
+        """Add, move or drop a reminder after it was saved."""
+        if not reminder.id:
+            return
+        trigger_at = reminder.trigger_at
+        with self._lock:
+            self._drop(reminder.id)
+            if reminder.notified or reminder.completed:
+                return
+            if not datetime.utcnow() - self.MISSED_GRACE <= trigger_at <= self._window_end:
+                return
+            self._reminders[reminder.id] = reminder
+            self._by_user.setdefault(reminder.user_id, set()).add(reminder.id)
+            earliest = self._heap[0][0] if self._heap else None
+            heapq.heappush(self._heap, (trigger_at, reminder.id))
+        if earliest is None or trigger_at < earliest:
+            self._wakeup.set()
+
+    def untrack(self, reminder_id: str) -> None:
+        """Drop a reminder (deleted or fired)."""
+        with self._lock:
+            self._drop(reminder_id)
+
+    def _drop(self, reminder_id: str) -> None:
+        # Heap entries are left behind and skipped when popped
+        reminder = self._reminders.pop(reminder_id, None)
+        if reminder is not None:
+            ids = self._by_user.get(reminder.user_id)
+            if ids is not None:
+                ids.discard(reminder_id)
+                if not ids:
+                    del self._by_user[reminder.user_id]
+
+    def _reload(self, now: datetime) -> None:
+        """Replace the window with reminders triggering up to the horizon."""
+        window_start = now - self.MISSED_GRACE
+        window_end = now + self._horizon
+        reminders = Reminder.find_triggering(window_start, window_end)
+
+        with self._lock:
+            self._heap = []
+            self._reminders = {}
+            self._by_user = {}
+            self._window_end = window_end
+        for reminder in reminders:
+            self.track(reminder)
+        self.stats['reloads'] += 1
+
+    def _scan(self, since: datetime) -> None:
+        """Apply reminders created, changed or deleted (possibly by other workers) since the last scan."""
+        db = get_db()
+        cursor = db[Reminder.collection_name].find({'updated_at': {'$gt': since - self.SCAN_OVERLAP}})
+        for doc in cursor:
+            self.track(Reminder._from_db(doc))
+        
+        # Deleted reminders leave no document to scan, only their sync tombstone
+        deleted = db[TOMBSTONES].find(
+            {'deleted_at': {'$gt': since - self.SCAN_OVERLAP}, 'kind': 'reminder'}, {'object_id': 1}
+        )
+        for doc in deleted:
+            self.untrack(doc['object_id'])
+        self.stats['scans'] += 1
+
+    # Firing
+
+    def _pop_due(self, now: datetime) -> List[Reminder]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                trigger_at, reminder_id = heapq.heappop(self._heap)
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder.trigger_at != trigger_at:
+                    continue  # Stale entry for a dropped or moved reminder
+                self._drop(reminder_id)
+                due.append(reminder)
+        return due
+
+    def _fire(self, reminder: Reminder) -> None:
+        """Claim the reminder and deliver it if this worker won the claim."""
+        doc = get_db()[Reminder.collection_name].find_one_and_update(
+            {'_id': ObjectId(reminder.id), 'notified': False, 'completed': False},
+            {'$set': {'notified': True, 'updated_at': datetime.utcnow(), 'sync_seq': next_seq(reminder.user_id)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            self.stats['lost_race'] += 1
+            return
+
+        self.stats['fired'] += 1
+        fired = Reminder._from_db(doc)
+        for channel in self._channels:
+            try:
+                channel.deliver(fired)
+            except Exception:
+                logger.exception('Reminder delivery failed on %s', type(channel).__name__)
+
+    def _next_wait(self, now: datetime, deadline: datetime) -> float:
+        with self._lock:
+            if self._heap:
+                deadline = min(deadline, self._heap[0][0])
+        return max((deadline - now).total_seconds(), 0.0)
+
+    def _run(self, app, scan_interval: float, reload_interval: float) -> None:
+        next_reload = datetime.min
+        next_scan = datetime.min
+        last_scan = datetime.utcnow()
+
+        with app.app_context():
+            while not self._stopped.is_set():
+                self._wakeup.clear()
+                now = datetime.utcnow()
+                try:
+                    if now >= next_reload:
+                        self._reload(now)
+                        next_reload = now + timedelta(seconds=reload_interval)
+                        next_scan = now + timedelta(seconds=scan_interval)
+                        last_scan = now
+                    elif now >= next_scan:
+                        self._scan(last_scan)
+                        next_scan = now + timedelta(seconds=scan_interval)
+                        last_scan = now
+
+                    for reminder in self._pop_due(now):
+                        self._fire(reminder)
+                except Exception:
+                    logger.exception('Reminder scheduler iteration failed')
+
+                self._wakeup.wait(self._next_wait(datetime.utcnow(), next_scan))
+
+    # Queries
+
+    def upcoming(self, user_id: str, until: datetime, now: Optional[datetime] = None) -> List[Reminder]:
+        """A user's unfired reminders triggering between now and ``until``, earliest first."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            reminders = [self._reminders[rid] for rid in self._by_user.get(user_id, ())]
+        upcoming = [r for r in reminders if now <= r.trigger_at <= until]
+        upcoming.sort(key=lambda r: r.trigger_at)
+        return upcoming
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+def start_reminder_scheduler(app) -> None:
+    """Start this worker's scheduler if enabled."""
+    if app.config.get('REMINDER_SCHEDULER_ENABLED', True):
+        reminder_scheduler.start(app)
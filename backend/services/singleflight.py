@@ -0,0 +1,150 @@
+"""Request coalescing for identical in-flight AI calls.
+
+Concurrent calls that share a key wait on a single upstream call. Within a
+worker this is done with a thread event; across gunicorn workers a short
+Mongo lease in the ``ai_inflight`` collection elects one leader and the
+others poll for its result.
+
+Only callers that arrive while the call is running share its result; this
+is not a cache. A finished result stays in ``ai_inflight`` just long enough
+for the followers already polling to read it, and a caller that arrives
+after the call finished makes its own.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from flask import current_app, has_app_context
+from pymongo.errors import DuplicateKeyError
+
+from database import get_db
+
+
+class _Call:
+    """An in-flight call that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result."""
+
+    COLLECTION = 'ai_inflight'
+
+    # How often followers in other workers check for the leader's result
+    POLL_INTERVAL = 0.1
+
+    # How long a finished result stays readable by followers that were already polling
+    RESULT_TTL = timedelta(seconds=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'leader': 0, 'local_shared': 0, 'remote_shared': 0}
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        """Return fn()'s result, sharing it with concurrent callers of the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                is_leader = True
+            else:
+                is_leader = False
+
+        if not is_leader:
+            call.done.wait()
+            self._count('local_shared')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_leased(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _do_leased(self, key: str, fn: Callable[[], str]) -> str:
+        """Coalesce across workers through a Mongo lease."""
+        if not has_app_context() or not current_app.config.get('AI_COALESCE_ACROSS_WORKERS', True):
+            self._count('leader')
+            return fn()
+
+        db = get_db()
+        collection = db[self.COLLECTION]
+        owner = uuid.uuid4().hex
+        lease = timedelta(seconds=current_app.config.get('AI_COALESCE_LEASE_SECONDS', 60))
+        deadline = time.monotonic() + lease.total_seconds()
+        waited = False  # Whether we saw this call running, so its result is ours to share
+
+        while True:
+            now = datetime.utcnow()
+            try:
+                collection.insert_one({
+                    '_id': key,
+                    'owner': owner,
+                    'status': 'running',
+                    'expires_at': now + lease,
+                })
+                break  # We hold the lease
+            except DuplicateKeyError:
+                pass
+
+            doc = collection.find_one({'_id': key})
+            if doc is None:
+                continue  # Leader finished and the entry expired; race again
+
+            if doc['expires_at'] < now or (doc['status'] == 'done' and not waited):
+                # Stale lease from a crashed worker, or a result finished before we asked: take it over
+                taken = collection.find_one_and_update(
+                    {'_id': key, 'owner': doc['owner'], 'expires_at': doc['expires_at']},
+                    {'$set': {'owner': owner, 'status': 'running', 'expires_at': now + lease}}
+                )
+                if taken is not None:
+                    break
+                continue
+
+            if doc['status'] == 'done':
+                self._count('remote_shared')
+                return doc['result']
+
+            if time.monotonic() > deadline:
+                # Leader is alive but too slow; stop waiting and call upstream ourselves
+                self._count('leader')
+                return fn()
+            waited = True
+            time.sleep(self.POLL_INTERVAL)
+
+        self._count('leader')
+        try:
+            result = fn()
+        except Exception:
+            # Release the lease so a waiting worker retries instead of sharing the error
+            collection.delete_one({'_id': key, 'owner': owner})
+            raise
+
+        collection.update_one(
+            {'_id': key, 'owner': owner},
+            {'$set': {
+                'status': 'done',
+                'result': result,
+                'expires_at': datetime.utcnow() + self.RESULT_TTL,
+            }}
+        )
+        return result
@@ -0,0 +1,173 @@
+"""Note summarization with cached per-block digests.
+
+Large text blocks are condensed into digests once and stored by content hash,
+so re-summarizing a note only sends changed blocks to the AI provider before
+the final combine step.
+"""
+import hashlib
+import re
+from datetime import datetime
+from typing import Optional, List, Tuple
+
+from flask import current_app
+
+from database import get_db
+from .ai_metrics import usage_recorder
+from .ai_service import AIService
+
+
+class NoteSummarizer:
+    """Summarize canvas blocks incrementally for a single user."""
+
+    COLLECTION = 'summary_digests'
+
+    # Bump when the digest or summary prompts change so old entries are ignored
+    DIGEST_VERSION = 1
+
+    def __init__(self, user_id: str, provider: Optional[str] = None):
+        self.user_id = user_id
+        self.provider = provider
+        self.min_chars = current_app.config.get('SUMMARY_DIGEST_MIN_CHARS', 600)
+        self.stats = {'blocks': 0, 'digested': 0, 'cached': 0, 'summary_cached': False}
+        self._resolved = None  # (provider, model), resolved on first use
+
+    @staticmethod
+    def clean_html(content: str) -> str:
+        """Strip HTML tags and collapse whitespace."""
+        clean_content = re.sub(r'<[^>]+>', ' ', content or '')
+        return re.sub(r'\s+', ' ', clean_content).strip()
+
+    @staticmethod
+    def _sort_key(block: dict) -> Tuple[int, int]:
+        """Sort by position (top to bottom, left to right) for logical reading order."""
+        x = block.get('x', 0) or block.get('position', {}).get('x', 0)
+        y = block.get('y', 0) or block.get('position', {}).get('y', 0)
+        return (y // 100, x // 100)  # Group by approximate rows
+
+    def _provider_model(self) -> Tuple[str, str]:
+        """The provider and model this summarizer's calls go to."""
+        if self._resolved is None:
+            provider_name = AIService.resolve_provider_name(self.provider)
+            try:
+                model = AIService.get_provider(provider_name).model
+            except ValueError:
+                model = 'unknown'
+            self._resolved = (provider_name, model)
+        return self._resolved
+
+    def _key(self, kind: str, text: str) -> str:
+        """Content-addressed cache key for a digest or summary from this provider and model."""
+        provider_name, model = self._provider_model()
+        payload = f'{kind}:{self.DIGEST_VERSION}:{provider_name}:{model}:{text}'.encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _load_cached(self, keys: List[str]) -> dict:
+        """Fetch cached digests for the given keys in a single query."""
+        if not keys:
+            return {}
+        db = get_db()
+        cursor = db[self.COLLECTION].find(
+            {'user_id': self.user_id, 'key': {'$in': keys}},
+            {'key': 1, 'text': 1}
+        )
+        return {doc['key']: doc['text'] for doc in cursor}
+
+    def _store(self, key: str, kind: str, text: str) -> None:
+        """Persist a digest or summary under its content hash."""
+        db = get_db()
+        db[self.COLLECTION].update_one(
+            {'user_id': self.user_id, 'key': key},
+            {'$set': {'kind': kind, 'text': text, 'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    def _record_cache_hit(self, action: str) -> None:
+        """Count a digest or summary served from cache in the AI usage metrics."""
+        provider_name, model = self._provider_model()
+        usage_recorder.record(action=action, provider=provider_name, model=model, cache_hit=True)
+
+    def _digest_blocks(self, texts: List[str]) -> List[str]:
+        """Return a digest for each long block, reusing cached ones."""
+        keys = [self._key('digest', text) if len(text) >= self.min_chars else None for text in texts]
+        cached = self._load_cached([key for key in keys if key])
+
+        digests = []
+        for text, key in zip(texts, keys):
+            if key is None:
+                # Short blocks go into the combine step verbatim
+                digests.append(text)
+            elif key in cached:
+                self.stats['cached'] += 1
+                self._record_cache_hit('digest_block')
+                digests.append(cached[key])
+            else:
+                digest = AIService.transform(text, 'digest_block', None, self.provider)
+                self._store(key, 'digest', digest)
+                cached[key] = digest
+                self.stats['digested'] += 1
+                digests.append(digest)
+        return digests
+
+    def build_content(self, title: str, blocks: List[dict]) -> str:
+        """Build the structured combine-step input from canvas blocks."""
+        content_parts = [f"Note Title: {title}\n"]
+
+        # Separate text blocks and shapes
+        text_blocks = []
+        shapes = []
+        for block in blocks:
+            if block.get('type') == 'shape':
+                shapes.append(block)
+            else:
+                text_blocks.append(block)
+
+        text_blocks.sort(key=self._sort_key)
+        shapes.sort(key=self._sort_key)
+
+        # Add text block digests
+        texts = [self.clean_html(block.get('content', '')) for block in text_blocks]
+        texts = [text for text in texts if text]
+        self.stats['blocks'] = len(texts)
+        if texts:
+            content_parts.append("=== Text Content ===")
+            for i, digest in enumerate(self._digest_blocks(texts), 1):
+                content_parts.append(f"Text Block {i}: {digest}")
+
+        # Add shapes with labels
+        labeled_shapes = [s for s in shapes if s.get('text')]
+        if labeled_shapes:
+            content_parts.append("\n=== Diagram Elements ===")
+            for shape in labeled_shapes:
+                shape_type = shape.get('shapeType', 'shape')
+                label = shape.get('text', '')
+                content_parts.append(f"- {shape_type.capitalize()} labeled: \"{label}\"")
+
+        # Add shape connections context (arrows)
+        arrows = [s for s in shapes if s.get('shapeType') in ('line', 'arrow')]
+        if arrows:
+            content_parts.append(f"\n(Note: Contains {len(arrows)} connecting line(s)/arrow(s) between elements)")
+
+        return '\n'.join(content_parts)
+
+    def summarize(self, title: str, blocks: List[dict]) -> str:
+        """Summarize a note, re-digesting only blocks that changed."""
+        structured_content = self.build_content(title, blocks)
+
+        # An unchanged combine input means an unchanged summary
+        summary_key = self._key('summary', structured_content)
+        cached = self._load_cached([summary_key])
+        if summary_key in cached:
+            self.stats['summary_cached'] = True
+            self._record_cache_hit('summarize_note')
+            return cached[summary_key]
+
+        result = AIService.transform(structured_content, 'summarize_note', None, self.provider)
+
+        # Clean up any markdown code block wrappers the LLM might add
+        cleaned_result = result.strip()
+        cleaned_result = re.sub(r'^```(?:html)?\s*\n?', '', cleaned_result)
+        cleaned_result = re.sub(r'\n?```\s*$', '', cleaned_result)
+        cleaned_result = cleaned_result.strip()
+
+        self._store(summary_key, 'summary', cleaned_result)
+        return cleaned_result
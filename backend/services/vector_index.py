@@ -0,0 +1,62 @@
+"""In-memory vector index backed by a growable float32 matrix."""
+import threading
+from typing import List, Tuple
+
+import numpy as np
+
+
+class VectorIndex:
+    """Unit vectors stored row-wise with id lookup and batched cosine scoring."""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def upsert(self, item_id: str, vector: np.ndarray) -> None:
+        """Insert or replace the vector for an id."""
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                row = len(self._ids)
+                if row == self._matrix.shape[0]:
+                    grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._ids.append(item_id)
+                self._rows[item_id] = row
+            self._matrix[row] = vector
+
+    def remove(self, item_id: str) -> None:
+        """Remove an id by moving the last row into its slot."""
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return
+            last = len(self._ids) - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids.pop()
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (id, cosine score) pairs with positive scores, best first."""
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or k <= 0:
+                return []
+            scores = self._matrix[:size] @ query.astype(np.float32)
+            k = min(k, size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if scores[i] > 0]